@@ -0,0 +1,140 @@
+"""convert User.vector from pickle to compact float32 format
+
+Revision ID: a3c5e8f1b7d2
+Revises: e1369f771946
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+import pickle
+import struct
+from typing import Any, Sequence, Union
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c5e8f1b7d2'
+down_revision: Union[str, None] = 'e1369f771946'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Формат версии 1 из app.core.embedding, зафиксирован на момент миграции.
+magic = b'FV'
+header = struct.Struct('<2sBB16sHH')
+face_dtype = np.dtype([('area', '<i4', (8,)), ('confidence', '<f4')])
+# Типы значений, добавленные позже в формат версии 1: downgrade
+# восстанавливает float32 из любого из них.
+format_version = 1
+int8_dtype_code = 2
+value_dtypes = {0: np.dtype('<f4'), 1: np.dtype('<f2'), 2: np.dtype('i1')}
+scale_dtype = np.dtype('<f4')
+model_name = b'Facenet'
+batch_size = 1000
+
+users = sa.table(
+    'users',
+    sa.column('id', sa.Integer),
+    sa.column('vector', sa.LargeBinary),
+)
+
+
+def encode(vector: list[dict[str, Any]]) -> bytes:
+    vectors = np.asarray(
+        [face['embedding'] for face in vector], dtype='<f4',
+    )
+    faces = np.zeros(len(vector), dtype=face_dtype)
+    for index, face in enumerate(vector):
+        area = face.get('facial_area') or {}
+        coordinates = [area.get(key, 0) for key in ('x', 'y', 'w', 'h')]
+        for eye in ('left_eye', 'right_eye'):
+            coordinates.extend(area.get(eye) or (-1, -1))
+        faces[index]['area'] = coordinates
+        faces[index]['confidence'] = face.get('face_confidence') or 0
+    return b''.join((
+        header.pack(magic, 1, 0, model_name, *vectors.shape[::-1]),
+        faces.tobytes(),
+        vectors.tobytes(),
+    ))
+
+
+def decode(data: bytes) -> list[dict[str, Any]]:
+    _, version, dtype_code, _, dim, faces_count = header.unpack_from(data)
+    if version != format_version or dtype_code not in value_dtypes:
+        raise ValueError(f'unsupported vector format {version}.{dtype_code}')
+    faces = np.frombuffer(
+        data, dtype=face_dtype, count=faces_count, offset=header.size,
+    )
+    offset = header.size + faces.nbytes
+    scales = None
+    if dtype_code == int8_dtype_code:
+        scales = np.frombuffer(
+            data, dtype=scale_dtype, count=faces_count, offset=offset,
+        )
+        offset += scales.nbytes
+    vectors = np.frombuffer(
+        data,
+        dtype=value_dtypes[dtype_code],
+        count=faces_count * dim,
+        offset=offset,
+    ).reshape(faces_count, dim).astype(np.float32)
+    if scales is not None:
+        vectors = vectors * scales[:, np.newaxis]
+    result = []
+    for embedding, face in zip(vectors, faces):
+        x, y, w, h, *eyes = face['area'].tolist()
+        result.append({
+            'embedding': embedding.tolist(),
+            'facial_area': {
+                'x': x,
+                'y': y,
+                'w': w,
+                'h': h,
+                'left_eye': None if -1 in eyes[:2] else tuple(eyes[:2]),
+                'right_eye': None if -1 in eyes[2:] else tuple(eyes[2:]),
+            },
+            'face_confidence': float(face['confidence']),
+        })
+    return result
+
+
+def convert(is_source, converter) -> None:
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(users.c.id, users.c.vector)
+            .where(users.c.id > last_id, users.c.vector.isnot(None))
+            .order_by(users.c.id)
+            .limit(batch_size),
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        params = [
+            {'user_id': row.id, 'new_vector': converter(bytes(row.vector))}
+            for row in rows
+            if is_source(bytes(row.vector))
+        ]
+        if params:
+            connection.execute(
+                users.update()
+                .where(users.c.id == sa.bindparam('user_id'))
+                .values(vector=sa.bindparam('new_vector')),
+                params,
+            )
+
+
+def upgrade() -> None:
+    convert(
+        lambda data: not data.startswith(magic),
+        lambda data: encode(pickle.loads(data)),
+    )
+
+
+def downgrade() -> None:
+    convert(
+        lambda data: data.startswith(magic),
+        lambda data: pickle.dumps(decode(data)),
+    )
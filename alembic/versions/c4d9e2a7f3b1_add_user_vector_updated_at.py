@@ -0,0 +1,65 @@
+"""add User.vector_updated_at for search index catch-up
+
+Revision ID: c4d9e2a7f3b1
+Revises: a3c5e8f1b7d2
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d9e2a7f3b1'
+down_revision: Union[str, None] = 'a3c5e8f1b7d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Триггер отмечает изменения вектора и удаление пользователя,
+# в том числе сделанные другими сервисами.
+touch_function = """
+CREATE FUNCTION users_touch_vector_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.vector_updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+touch_trigger = """
+CREATE TRIGGER users_vector_updated_at
+BEFORE UPDATE OF vector, is_verified, is_deleted ON users
+FOR EACH ROW
+WHEN (
+    OLD.vector IS DISTINCT FROM NEW.vector
+    OR OLD.is_verified IS DISTINCT FROM NEW.is_verified
+    OR OLD.is_deleted IS DISTINCT FROM NEW.is_deleted
+)
+EXECUTE FUNCTION users_touch_vector_updated_at()
+"""
+
+
+def upgrade() -> None:
+    op.add_column(
+        'users',
+        sa.Column(
+            'vector_updated_at', sa.DateTime(timezone=True), nullable=True,
+        ),
+    )
+    op.execute(
+        'UPDATE users SET vector_updated_at = now() '
+        'WHERE vector IS NOT NULL',
+    )
+    op.create_index(
+        op.f('ix_users_vector_updated_at'), 'users', ['vector_updated_at'],
+    )
+    op.execute(touch_function)
+    op.execute(touch_trigger)
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER users_vector_updated_at ON users')
+    op.execute('DROP FUNCTION users_touch_vector_updated_at()')
+    op.drop_index(op.f('ix_users_vector_updated_at'), table_name='users')
+    op.drop_column('users', 'vector_updated_at')
@@ -0,0 +1,50 @@
+"""add user_embeddings with vectors of several face recognition models
+
+Revision ID: f2b8d6c1e9a4
+Revises: c4d9e2a7f3b1
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b8d6c1e9a4'
+down_revision: Union[str, None] = 'c4d9e2a7f3b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Вектора users.vector построены моделью Facenet.
+copy_facenet_vectors = """
+INSERT INTO user_embeddings (id_user, model_name, vector, updated_at)
+SELECT id, 'Facenet', vector, coalesce(vector_updated_at, now())
+FROM users
+WHERE vector IS NOT NULL
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_embeddings',
+        sa.Column('id_user', sa.Integer(), nullable=False),
+        sa.Column('model_name', sa.String(length=16), nullable=False),
+        sa.Column('vector', sa.LargeBinary(), nullable=False),
+        sa.Column(
+            'updated_at',
+            sa.DateTime(timezone=True),
+            server_default=sa.text('now()'),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ['id_user'], ['users.id'], ondelete='CASCADE',
+        ),
+        sa.PrimaryKeyConstraint('id_user', 'model_name'),
+    )
+    op.execute(copy_facenet_vectors)
+
+
+def downgrade() -> None:
+    op.drop_table('user_embeddings')
@@ -1,7 +1,26 @@
-from fastapi import APIRouter
+import logging
+import tempfile
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Annotated, AsyncIterator
+
+from fastapi import APIRouter, Query, Request, UploadFile
+
+from app.core.config import get_settings
+from app.core.errors import ImageError, ImageTooLargeError, ServerError
+from app.core.face_verification import (
+    DistanceMetric,
+    FaceVerificationService,
+    ModelName,
+)
+from app.core.models import Match, Verification
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+max_top_k = 100
+
 
 @router.get('/')
 async def root_handler() -> dict[str, str]:
@@ -12,3 +31,99 @@ async def root_handler() -> dict[str, str]:
     :rtype: dict[str, str]
     """
     return {'message': 'server is running'}
+
+
+@router.post('/identify')
+async def identify_handler(
+    request: Request,
+    image: UploadFile,
+    top_k: Annotated[int, Query(ge=1, le=max_top_k)] = 5,
+    metric: DistanceMetric = DistanceMetric.cosine,
+    approximate: bool = True,
+) -> list[Match]:
+    """
+    Ищет пользователей по изображению лица.
+
+    :param request: Запрос
+    :type request: Request
+    :param image: Изображение лица
+    :type image: UploadFile
+    :param top_k: Количество ближайших пользователей
+    :type top_k: int
+    :param metric: Метрика расстояния
+    :type metric: DistanceMetric
+    :param approximate: Разрешить приближенный поиск
+    :type approximate: bool
+    :return: Пользователи по возрастанию расстояния
+    :rtype: list[Match]
+    """
+    service = _get_service(request)
+    async with _save_image(image) as img_path:
+        return await service.identify(img_path, top_k, metric, approximate)
+
+
+@router.post('/verify/{username}')
+async def verify_handler(
+    request: Request,
+    username: str,
+    image: UploadFile,
+    metric: DistanceMetric = DistanceMetric.cosine,
+    model_name: ModelName = ModelName.facenet,
+) -> Verification:
+    """
+    Сравнивает изображение лица с сохраненным вектором пользователя.
+
+    Изображение и сохраненный вектор сравниваются в пространстве
+    модели model_name, модель должна быть включена в конфигурации.
+
+    :param request: Запрос
+    :type request: Request
+    :param username: Имя пользователя
+    :type username: str
+    :param image: Изображение лица
+    :type image: UploadFile
+    :param metric: Метрика расстояния
+    :type metric: DistanceMetric
+    :param model_name: Модель распознавания лиц
+    :type model_name: ModelName
+    :return: Расстояние, порог и решение
+    :rtype: Verification
+    """
+    service = _get_service(request)
+    async with _save_image(image) as img_path:
+        return await service.verify_against(
+            username, img_path, metric, model_name,
+        )
+
+
+def _get_service(request: Request) -> FaceVerificationService:
+    service: FaceVerificationService | None = getattr(
+        request.app.state, 'service', None,
+    )
+    if service is None:
+        logger.warning('service is not ready')
+        raise ServerError(detail='service is not ready')
+    return service
+
+
+@asynccontextmanager
+async def _save_image(image: UploadFile) -> AsyncIterator[str]:
+    settings = get_settings().api
+    suffix = Path(image.filename or '').suffix
+    with tempfile.NamedTemporaryFile(suffix=suffix) as img_file:
+        size = 0
+        while chunk := await image.read(settings.upload_chunk_size):
+            size += len(chunk)
+            if size > settings.max_upload_size:
+                logger.warning(
+                    f'{image.filename} is larger than '
+                    f'{settings.max_upload_size} bytes',
+                )
+                raise ImageTooLargeError(settings.max_upload_size)
+            img_file.write(chunk)
+        img_file.flush()
+        try:
+            yield img_file.name
+        except ValueError as error:
+            logger.warning(f"can't process {image.filename}: {error}")
+            raise ImageError(detail=str(error))
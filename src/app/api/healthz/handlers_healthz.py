@@ -1,6 +1,8 @@
 import logging
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
+
+from app.core.errors import ServerError
 
 logger = logging.getLogger(__name__)
 
@@ -22,11 +24,28 @@ async def up_check() -> dict[str, str]:
 
 
 @router.get('/ready')
-async def ready_check() -> dict[str, str]:
+async def ready_check(request: Request) -> dict[str, str]:
     """
     Healthcheck для зависимостей приложения.
 
+    Сервис готов, когда модели загружены во все процессы раннера
+    и ни одна фоновая задача не завершилась с ошибкой.
+
+    :param request: Запрос
+    :type request: Request
     :return: Сообщение о успехе.
     :rtype: dict[str, str]
+    :raises ServerError: Если раннер не готов к работе
+        или фоновая задача упала.
     """
+    runner = getattr(request.app.state, 'runner', None)
+    if runner is None or not runner.is_ready:
+        logger.warning('runner is not ready')
+        raise ServerError(detail='runner is not ready')
+    failed_tasks = getattr(request.app.state, 'failed_tasks', set())
+    if failed_tasks:
+        logger.warning(f'background tasks {failed_tasks} failed')
+        raise ServerError(
+            detail=f'background tasks {sorted(failed_tasks)} failed',
+        )
     return ready_message
@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+router = APIRouter(tags=['metrics'])
+
+
+@router.get('/metrics')
+async def get_metrics() -> Response:
+    """
+    Метрики сервиса в формате prometheus.
+
+    :return: Текущие значения метрик.
+    :rtype: Response
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
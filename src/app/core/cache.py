@@ -0,0 +1,331 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from functools import partial
+from pathlib import Path
+from typing import Any, Generic, Hashable, TypeVar
+
+from app.core.embedding import decode_vector, encode_vector
+
+logger = logging.getLogger(__name__)
+
+KeyT = TypeVar('KeyT', bound=Hashable)
+ValueT = TypeVar('ValueT')
+
+image_digest_size = 16
+disk_trim_ratio = 0.9
+
+
+class LRUCache(Generic[KeyT, ValueT]):
+    """
+    Кэш с вытеснением давно не использованных значений.
+
+    Хранит не более maxsize значений и считает попадания и промахи.
+    Не потокобезопасен, используется из event loop.
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        """
+        Метод инициализации.
+
+        :param maxsize: Максимальное количество значений
+        :type maxsize: int
+        """
+        self.maxsize = maxsize
+        self.hits: int = 0
+        self.misses: int = 0
+        self._values: OrderedDict[KeyT, ValueT] = OrderedDict()
+
+    def __len__(self) -> int:
+        """
+        Количество значений в кэше.
+
+        :return: Количество значений
+        :rtype: int
+        """
+        return len(self._values)
+
+    def get(self, key: KeyT) -> ValueT | None:
+        """
+        Получает значение и отмечает его использованным.
+
+        :param key: Ключ
+        :type key: KeyT
+        :return: Значение или None, если его нет в кэше
+        :rtype: ValueT | None
+        """
+        try:
+            self._values.move_to_end(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._values[key]
+
+    def put(self, key: KeyT, value: ValueT) -> None:
+        """
+        Сохраняет значение, вытесняя самое давно использованное.
+
+        :param key: Ключ
+        :type key: KeyT
+        :param value: Значение
+        :type value: ValueT
+        """
+        if self.maxsize < 1:
+            return
+        self._values[key] = value
+        self._values.move_to_end(key)
+        if len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+
+    def invalidate(self, key: KeyT) -> None:
+        """
+        Удаляет значение из кэша.
+
+        :param key: Ключ
+        :type key: KeyT
+        """
+        self._values.pop(key, None)
+
+    def clear(self) -> None:
+        """Удаляет все значения из кэша."""
+        self._values.clear()
+
+
+def hash_image(
+    img_path: str | Path, model_name: str, variant: str = '',
+) -> str:
+    """
+    Считает хэш содержимого изображения и названия модели.
+
+    Используется blake2b с дайджестом 128 бит, файл читается
+    без загрузки целиком в память.
+
+    :param img_path: Путь к файлу изображения
+    :type img_path: str | Path
+    :param model_name: Название модели
+    :type model_name: str
+    :param variant: Параметры обработки, меняющие представление
+    :type variant: str
+    :return: Хэш в шестнадцатеричном виде
+    :rtype: str
+    """
+    prefix = model_name.encode() + b'\0'
+    if variant:
+        prefix += variant.encode() + b'\0'
+    new_digest = partial(
+        hashlib.blake2b, prefix, digest_size=image_digest_size,
+    )
+    with open(img_path, 'rb') as image_file:
+        return hashlib.file_digest(image_file, new_digest).hexdigest()
+
+
+class DiskStore:
+    """
+    Хранилище байтов в файлах каталога.
+
+    Значение хранится в файле с именем ключа в подкаталоге по первым
+    двум символам ключа. Файл записывается рядом и атомарно
+    переименовывается, поэтому каталог можно разделять между
+    процессами. Чтение обновляет время изменения файла. Если файлов
+    больше maxsize, удаляются самые давно использованные,
+    пока их не останется disk_trim_ratio от maxsize.
+    """
+
+    def __init__(self, path: str | Path, maxsize: int = 100000) -> None:
+        """
+        Метод инициализации.
+
+        :param path: Путь к каталогу хранилища
+        :type path: str | Path
+        :param maxsize: Максимальное количество файлов
+        :type maxsize: int
+        """
+        self.path = Path(path)
+        self.maxsize = maxsize
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._count = len(self._list_files())
+
+    def __len__(self) -> int:
+        """
+        Количество значений в хранилище.
+
+        :return: Количество значений
+        :rtype: int
+        """
+        return self._count
+
+    def get(self, key: str) -> bytes | None:
+        """
+        Читает значение.
+
+        :param key: Ключ из букв и цифр
+        :type key: str
+        :return: Значение или None, если его нет
+        :rtype: bytes | None
+        """
+        file_path = self._get_path(key)
+        try:
+            value = file_path.read_bytes()
+            os.utime(file_path)
+        except FileNotFoundError:
+            return None
+        return value
+
+    def put(self, key: str, value: bytes) -> None:
+        """
+        Записывает значение.
+
+        :param key: Ключ из букв и цифр
+        :type key: str
+        :param value: Значение
+        :type value: bytes
+        """
+        file_path = self._get_path(key)
+        file_path.parent.mkdir(exist_ok=True)
+        is_new = not file_path.exists()
+        tmp_path = file_path.with_name(
+            f'{key}.{os.getpid()}.{threading.get_ident()}.tmp',
+        )
+        tmp_path.write_bytes(value)
+        os.replace(tmp_path, file_path)
+        if is_new:
+            self._count += 1
+        if self._count > self.maxsize:
+            self._trim()
+
+    def _get_path(self, key: str) -> Path:
+        return self.path / key[:2] / key
+
+    def _list_files(self) -> list[os.DirEntry]:
+        return [
+            entry
+            for directory in os.scandir(self.path) if directory.is_dir()
+            for entry in os.scandir(directory.path)
+            if entry.is_file() and not entry.name.endswith('.tmp')
+        ]
+
+    def _trim(self) -> None:
+        files = self._list_files()
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        removed = files[:len(files) - int(self.maxsize * disk_trim_ratio)]
+        for entry in removed:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                logger.debug(f'{entry.path} is already removed')
+        self._count = len(files) - len(removed)
+        logger.info(f'removed {len(removed)} files from {self.path}')
+
+
+class RepresentationCache:
+    """
+    Кэш представлений изображений по хэшу их содержимого.
+
+    Ключ - хэш содержимого изображения, названия модели и параметров
+    поиска лиц, поэтому повторно загруженное изображение
+    не обрабатывается моделью снова.
+    Представления хранятся в компактном формате app.core.embedding
+    в LRU кэше в памяти и, если задан path, в DiskStore, чтобы кэш
+    переживал перезапуск. Потокобезопасен: хэширование и чтение
+    с диска выполняются вне event loop.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        path: str | Path | None = None,
+        disk_maxsize: int = 100000,
+    ) -> None:
+        """
+        Метод инициализации.
+
+        :param maxsize: Максимальное количество представлений в памяти
+        :type maxsize: int
+        :param path: Путь к каталогу представлений на диске
+        :type path: str | Path | None
+        :param disk_maxsize: Максимальное количество представлений
+            на диске
+        :type disk_maxsize: int
+        """
+        self.hits: int = 0
+        self.misses: int = 0
+        self._memory: LRUCache[str, bytes] = LRUCache(maxsize)
+        self._disk = DiskStore(path, disk_maxsize) if path else None
+        self._lock = threading.Lock()
+
+    def lookup(
+        self, img_path: str | Path, model_name: str, variant: str = '',
+    ) -> tuple[str | None, list[dict[str, Any]] | None]:
+        """
+        Ищет представление изображения.
+
+        :param img_path: Путь к файлу изображения
+        :type img_path: str | Path
+        :param model_name: Название модели
+        :type model_name: str
+        :param variant: Параметры обработки, меняющие представление
+        :type variant: str
+        :return: Ключ изображения или None, если файл не прочитан,
+            и представление или None, если его нет в кэше
+        :rtype: tuple[str | None, list[dict[str, Any]] | None]
+        """
+        try:
+            key = hash_image(img_path, model_name, variant)
+        except OSError as error:
+            logger.warning(f"can't hash {img_path}: {error}")
+            return None, None
+        with self._lock:
+            data = self._memory.get(key)
+        if data is None and self._disk is not None:
+            data = self._disk.get(key)
+            if data is not None:
+                with self._lock:
+                    self._memory.put(key, data)
+        vector = self._decode(key, data)
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return key, vector
+
+    def put(
+        self, key: str, vector: list[dict[str, Any]], model_name: str,
+    ) -> None:
+        """
+        Сохраняет представление изображения.
+
+        Пустые представления не сохраняются.
+
+        :param key: Ключ изображения из lookup
+        :type key: str
+        :param vector: Представление изображения
+        :type vector: list[dict[str, Any]]
+        :param model_name: Название модели
+        :type model_name: str
+        """
+        try:
+            data = encode_vector(vector, model_name)
+        except (ValueError, KeyError, TypeError) as error:
+            logger.debug(f"can't cache representation {key}: {error}")
+            return
+        with self._lock:
+            self._memory.put(key, data)
+        if self._disk is not None:
+            self._disk.put(key, data)
+
+    def _decode(
+        self, key: str, data: bytes | None,
+    ) -> list[dict[str, Any]] | None:
+        if data is None:
+            return None
+        try:
+            return decode_vector(data).to_vector()
+        except ValueError:
+            logger.warning(f'cached representation {key} is broken')
+            with self._lock:
+                self._memory.invalidate(key)
+            return None
@@ -2,7 +2,7 @@ import logging
 import os
 from functools import lru_cache
 from pathlib import Path
-from typing import Self
+from typing import Literal, Self
 
 import yaml
 from pydantic import Field, PostgresDsn
@@ -12,9 +12,21 @@ from app.core.errors import ConfigError
 
 logger = logging.getLogger(__name__)
 
+# Названия моделей из app.core.face_verification.ModelName.
+ModelNameValue = Literal['Facenet', 'Facenet512', 'ArcFace', 'SFace']
+
 
 class KafkaSettings(BaseSettings):
-    """Конфигурация kafka producer."""
+    """
+    Конфигурация kafka producer.
+
+    При batch_size больше 1 сообщения читаются пакетами до batch_size
+    сообщений за linger_ms миллисекунд. Пакет делится на микропакеты
+    по micro_batch_size изображений, одновременно в раннере
+    обрабатывается не более max_in_flight микропакетов.
+    При выключенном enable_auto_commit смещения коммитятся
+    только после успешной обработки сообщений.
+    """
 
     host: str
     port: int
@@ -22,6 +34,13 @@ class KafkaSettings(BaseSettings):
     file_compression_quality: int = 1
     storage_path: str
     topics: str
+    batch_size: int = 1
+    micro_batch_size: int = 8
+    linger_ms: int = 100
+    max_in_flight: int = 2
+    group_id: str = 'face-verification'
+    enable_auto_commit: bool = False
+    retry_backoff_ms: int = 1000
 
     @property
     def instance(self) -> str:
@@ -35,7 +54,13 @@ class KafkaSettings(BaseSettings):
 
 
 class PostgresSettings(BaseSettings):
-    """Конфигурация postgres."""
+    """
+    Конфигурация postgres.
+
+    Новые вектора сохраняются в типе vector_dtype: float16 или int8
+    уменьшают размер вектора в 2 или 4 раза ценой точности.
+    Сохраненные ранее вектора читаются в своем типе.
+    """
 
     pg_dns: PostgresDsn = Field(
         'postgresql+psycopg2://myuser:mysecretpassword@db:5432/mydatabase',
@@ -43,6 +68,128 @@ class PostgresSettings(BaseSettings):
     )
     pool_size: int = 10
     max_overflow: int = 20
+    pool_timeout: int = 30
+    vector_dtype: Literal['float32', 'float16', 'int8'] = 'float32'
+
+
+class RunnerSettings(BaseSettings):
+    """
+    Конфигурация раннера.
+
+    kind выбирает пул процессов, где каждый процесс загружает свою
+    копию TensorFlow и модели, или пул потоков с одной моделью
+    в процессе сервиса. max_tasks_per_child применяется только к пулу
+    процессов. intra_op_threads и inter_op_threads задают потоки
+    TensorFlow в каждом процессе раннера, 0 - значение по умолчанию.
+    Пул процессов возвращает матрицы векторов пакетов изображений через
+    shared_memory_slots слотов разделяемой памяти размером
+    shared_memory_slot_size байт вместо pipe, 0 слотов отключает
+    разделяемую память.
+    """
+
+    kind: Literal['process', 'thread'] = 'process'
+    max_workers: int = 2
+    max_tasks_per_child: int | None = 200
+    intra_op_threads: int = 0
+    inter_op_threads: int = 0
+    shared_memory_slots: int = 0
+    shared_memory_slot_size: int = 1048576
+
+
+class CacheSettings(BaseSettings):
+    """
+    Конфигурация кэшей сервиса.
+
+    Кэш представлений изображений хранит representations_size
+    представлений в памяти и, если задан representations_path,
+    до representations_disk_size представлений на диске.
+    """
+
+    embeddings_size: int = 10000
+    representations_size: int = 10000
+    representations_path: str | None = None
+    representations_disk_size: int = 100000
+
+
+class IndexSettings(BaseSettings):
+    """
+    Конфигурация индекса поиска пользователей.
+
+    Индекс exact ищет точно по всем векторам. Индекс ivf делит
+    вектора на nlist списков и при приближенном поиске просматривает
+    nprobe ближайших списков. Изменения векторов из базы данных
+    применяются к индексу и переносятся в основную часть индекса
+    каждые compact_interval_s секунд. Если задан snapshot_path,
+    индекс загружается из снимка и сохраняется в него
+    каждые snapshot_interval_s секунд. Вектора индекса хранятся
+    в типе dtype: float32, float16 или int8.
+    """
+
+    kind: Literal['exact', 'ivf'] = 'exact'
+    dtype: Literal['float32', 'float16', 'int8'] = 'float32'
+    nlist: int = 1024
+    nprobe: int = 16
+    train_iterations: int = 20
+    compact_interval_s: float = 60
+    snapshot_path: str | None = None
+    snapshot_interval_s: float = 600
+
+
+class PreprocessingSettings(BaseSettings):
+    """
+    Конфигурация загрузки изображений перед поиском лиц.
+
+    Изображение уменьшается до max_side пикселей по большей стороне
+    и, если включен exif_orientation, поворачивается по тегу EXIF.
+    """
+
+    max_side: int = 1280
+    exif_orientation: bool = True
+
+
+class DetectionSettings(BaseSettings):
+    """
+    Конфигурация поиска лиц.
+
+    Если задан batch_detector_backend, пакетная обработка сообщений
+    kafka использует его вместо detector_backend, например быстрый
+    детектор opencv или ssd для большого потока изображений.
+    """
+
+    detector_backend: str = 'opencv'
+    batch_detector_backend: str | None = None
+    enforce_detection: bool = True
+    align: bool = True
+
+
+class ModelsSettings(BaseSettings):
+    """
+    Конфигурация моделей распознавания лиц.
+
+    Для каждой модели из enabled запускается отдельный пул раннера
+    из workers[модель] исполнителей, по умолчанию runner.max_workers.
+    Сообщения kafka верифицируются моделью Facenet, а вектора моделей
+    из shadow дополнительно сохраняются для перехода на другую модель.
+    Неизвестное название модели вызывает ошибку при загрузке
+    конфигурации, а не при запуске раннера.
+    """
+
+    enabled: list[ModelNameValue] = ['Facenet']
+    shadow: list[ModelNameValue] = []
+    workers: dict[ModelNameValue, int] = {}
+
+
+class ApiSettings(BaseSettings):
+    """
+    Конфигурация HTTP API.
+
+    Изображение из запроса записывается во временный файл частями
+    по upload_chunk_size байт, изображение больше max_upload_size
+    байт отклоняется с кодом 413.
+    """
+
+    max_upload_size: int = 10485760
+    upload_chunk_size: int = 65536
 
 
 class Settings(BaseSettings):
@@ -50,6 +197,15 @@ class Settings(BaseSettings):
 
     kafka: KafkaSettings
     postgres: PostgresSettings
+    runner: RunnerSettings = Field(default_factory=RunnerSettings)
+    cache: CacheSettings = Field(default_factory=CacheSettings)
+    index: IndexSettings = Field(default_factory=IndexSettings)
+    preprocessing: PreprocessingSettings = Field(
+        default_factory=PreprocessingSettings,
+    )
+    detection: DetectionSettings = Field(default_factory=DetectionSettings)
+    models: ModelsSettings = Field(default_factory=ModelsSettings)
+    api: ApiSettings = Field(default_factory=ApiSettings)
 
     @classmethod
     def from_yaml(cls, config_path: str) -> Self:
@@ -0,0 +1,283 @@
+"""
+Компактный бинарный формат векторов лиц.
+
+Формат версии 1, все значения little-endian:
+
+- заголовок ``<2sBB16sHH``: сигнатура ``FV``, версия формата,
+  тип значений вектора, имя модели, размерность вектора,
+  количество лиц;
+- для каждого лица 8 значений int32 области лица
+  (x, y, w, h, left_eye, right_eye) и уверенность float32;
+- для типа int8 масштаб float32 каждого вектора;
+- матрица векторов лиц размера количество лиц x размерность
+  в типе float32, float16 или int8.
+
+Вектор int8 квантуется симметрично со своим масштабом:
+значение равно масштабу, умноженному на число int8, а масштаб
+выбирается так, чтобы наибольшее по модулю значение стало 127.
+
+Декодирование не копирует данные, вектора читаются как
+массив numpy поверх исходного буфера.
+"""
+import struct
+from enum import StrEnum
+from typing import Any, NamedTuple
+
+import numpy as np
+
+magic = b'FV'
+format_version = 1
+float32_dtype_code = 0
+float16_dtype_code = 1
+int8_dtype_code = 2
+int8_max = 127
+
+_header = struct.Struct('<2sBB16sHH')
+_face_dtype = np.dtype([('area', '<i4', (8,)), ('confidence', '<f4')])
+_embedding_dtype = np.dtype('<f4')
+_scale_dtype = np.dtype('<f4')
+_missing_coordinate = -1
+
+
+class VectorDtype(StrEnum):
+    """Типы значений хранимых векторов."""
+
+    float32 = 'float32'
+    float16 = 'float16'
+    int8 = 'int8'
+
+
+_dtype_codes = {
+    VectorDtype.float32: float32_dtype_code,
+    VectorDtype.float16: float16_dtype_code,
+    VectorDtype.int8: int8_dtype_code,
+}
+_value_dtypes = {
+    float32_dtype_code: _embedding_dtype,
+    float16_dtype_code: np.dtype('<f2'),
+    int8_dtype_code: np.dtype('i1'),
+}
+
+
+class Embeddings(NamedTuple):
+    """Декодированные вектора лиц одного изображения."""
+
+    model_name: str
+    vectors: np.ndarray
+    faces: np.ndarray
+    scales: np.ndarray | None = None
+
+    @property
+    def dim(self) -> int:
+        """
+        Размерность векторов.
+
+        :return: Размерность векторов
+        :rtype: int
+        """
+        return int(self.vectors.shape[1])
+
+    def to_float32(self) -> np.ndarray:
+        """
+        Восстанавливает вектора float32.
+
+        Вектора float32 возвращаются без копирования.
+
+        :return: Матрица векторов float32
+        :rtype: np.ndarray
+        """
+        return dequantize(self.vectors, self.scales)
+
+    def to_vector(self) -> list[dict[str, Any]]:
+        """
+        Преобразует вектора в формат результата DeepFace.represent.
+
+        :return: Список вложенных векторов
+        :rtype: list[dict[str, Any]]
+        """
+        return [
+            {
+                'embedding': embedding.tolist(),
+                'facial_area': _facial_area_to_dict(face['area']),
+                'face_confidence': float(face['confidence']),
+            }
+            for embedding, face in zip(self.to_float32(), self.faces)
+        ]
+
+
+def encode_vector(
+    vector: list[dict[str, Any]],
+    model_name: str,
+    dtype: VectorDtype | str = VectorDtype.float32,
+) -> bytes:
+    """
+    Кодирует результат DeepFace.represent в бинарный формат.
+
+    :param vector: Список вложенных векторов
+    :type vector: list[dict[str, Any]]
+    :param model_name: Название модели, построившей вектора
+    :type model_name: str
+    :param dtype: Тип значений векторов
+    :type dtype: VectorDtype | str
+    :return: Закодированные вектора
+    :rtype: bytes
+    :raises ValueError: Если нет векторов или они разной размерности
+    """
+    vectors = np.asarray(
+        [face['embedding'] for face in vector], dtype=_embedding_dtype,
+    )
+    if vectors.ndim != 2 or not vectors.size:
+        raise ValueError('embeddings must be a non-empty matrix')
+    faces = np.zeros(len(vector), dtype=_face_dtype)
+    for index, face in enumerate(vector):
+        faces[index]['area'] = _facial_area_to_array(
+            face.get('facial_area') or {},
+        )
+        faces[index]['confidence'] = face.get('face_confidence') or 0
+    dtype_code = _dtype_codes[VectorDtype(dtype)]
+    values, scales = quantize(vectors, dtype)
+    header = _header.pack(
+        magic,
+        format_version,
+        dtype_code,
+        model_name.encode(),
+        vectors.shape[1],
+        vectors.shape[0],
+    )
+    parts = [header, faces.tobytes()]
+    if dtype_code == int8_dtype_code:
+        parts.append(scales.astype(_scale_dtype, copy=False).tobytes())
+    parts.append(values.tobytes())
+    return b''.join(parts)
+
+
+def decode_vector(data: bytes | memoryview) -> Embeddings:
+    """
+    Декодирует вектора из бинарного формата без копирования.
+
+    :param data: Закодированные вектора
+    :type data: bytes | memoryview
+    :return: Декодированные вектора
+    :rtype: Embeddings
+    :raises ValueError: Если данные не в формате векторов или обрезаны
+    """
+    if not is_encoded(data):
+        raise ValueError('data is not an encoded vector')
+    _, version, dtype_code, model_name, dim, faces_count = (
+        _header.unpack_from(data)
+    )
+    if version != format_version or dtype_code not in _value_dtypes:
+        raise ValueError(f'unsupported vector format {version}.{dtype_code}')
+    size = _header.size + faces_count * (
+        _face_dtype.itemsize + dim * _value_dtypes[dtype_code].itemsize
+    )
+    if dtype_code == int8_dtype_code:
+        size += faces_count * _scale_dtype.itemsize
+    if len(data) < size:
+        raise ValueError(f'vector data is truncated: {len(data)} < {size}')
+    faces = np.ndarray(
+        (faces_count,), dtype=_face_dtype, buffer=data, offset=_header.size,
+    )
+    offset = _header.size + faces.nbytes
+    scales = None
+    if dtype_code == int8_dtype_code:
+        scales = np.ndarray(
+            (faces_count,), dtype=_scale_dtype, buffer=data, offset=offset,
+        )
+        offset += scales.nbytes
+    vectors = np.ndarray(
+        (faces_count, dim),
+        dtype=_value_dtypes[dtype_code],
+        buffer=data,
+        offset=offset,
+    )
+    return Embeddings(
+        model_name=model_name.rstrip(b'\0').decode(),
+        vectors=vectors,
+        faces=faces,
+        scales=scales,
+    )
+
+
+def quantize(
+    vectors: np.ndarray, dtype: VectorDtype | str,
+) -> tuple[np.ndarray, np.ndarray | None]:
+    """
+    Переводит матрицу векторов в тип dtype.
+
+    :param vectors: Матрица векторов
+    :type vectors: np.ndarray
+    :param dtype: Тип значений векторов
+    :type dtype: VectorDtype | str
+    :return: Матрица значений и масштабы векторов int8 или None
+    :rtype: tuple[np.ndarray, np.ndarray | None]
+    """
+    dtype = VectorDtype(dtype)
+    if dtype != VectorDtype.int8:
+        return vectors.astype(dtype.value, copy=False), None
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.max(np.abs(vectors), axis=-1, initial=0) / int8_max
+    scales = np.where(scales == 0, 1, scales).astype(np.float32)
+    values = np.rint(vectors / scales[..., np.newaxis]).astype(np.int8)
+    return values, scales
+
+
+def dequantize(
+    values: np.ndarray, scales: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    Восстанавливает вектора float32 из значений и масштабов.
+
+    Вектора float32 без масштабов возвращаются без копирования.
+
+    :param values: Матрица значений
+    :type values: np.ndarray
+    :param scales: Масштабы векторов int8
+    :type scales: np.ndarray | None
+    :return: Матрица векторов float32
+    :rtype: np.ndarray
+    """
+    vectors = values.astype(np.float32, copy=False)
+    if scales is None:
+        return vectors
+    return vectors * scales[..., np.newaxis]
+
+
+def is_encoded(data: bytes | memoryview) -> bool:
+    """
+    Проверяет что данные в бинарном формате векторов.
+
+    :param data: Данные
+    :type data: bytes | memoryview
+    :return: True если данные в бинарном формате векторов
+    :rtype: bool
+    """
+    return len(data) >= _header.size and data[:len(magic)] == magic
+
+
+def _facial_area_to_array(facial_area: dict[str, Any]) -> list[int]:
+    coordinates = [facial_area.get(key, 0) for key in ('x', 'y', 'w', 'h')]
+    for eye in ('left_eye', 'right_eye'):
+        coordinates.extend(
+            facial_area.get(eye) or (_missing_coordinate, _missing_coordinate),
+        )
+    return coordinates
+
+
+def _facial_area_to_dict(area: np.ndarray) -> dict[str, Any]:
+    x, y, width, height, *eyes = area.tolist()
+    left_eye, right_eye = eyes[:2], eyes[2:]
+    return {
+        'x': x,
+        'y': y,
+        'w': width,
+        'h': height,
+        'left_eye': _eye_to_tuple(left_eye),
+        'right_eye': _eye_to_tuple(right_eye),
+    }
+
+
+def _eye_to_tuple(eye: list[int]) -> tuple[int, int] | None:
+    if _missing_coordinate in eye:
+        return None
+    return eye[0], eye[1]
@@ -37,3 +37,68 @@ class ConfigError(ServerError):
     Импортировать в имплементации репозитория данных,
     для вызова исключения при ошибке доступа к данным.
     """
+
+
+class NotFoundError(ServerError):
+    """Ошибка при отсутствии запрошенных данных."""
+
+    def __init__(self, detail: str = 'Данные не найдены'):
+        """
+        Метод инициализации NotFoundError.
+
+        :param detail: Сообщение
+        :type detail: str
+        """
+        super().__init__(status_code=status.HTTP_404_NOT_FOUND, detail=detail)
+
+
+class ImageError(ServerError):
+    """Ошибка при обработке изображения из запроса."""
+
+    def __init__(self, detail: str = 'Лицо на изображении не найдено'):
+        """
+        Метод инициализации ImageError.
+
+        :param detail: Сообщение
+        :type detail: str
+        """
+        super().__init__(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=detail,
+        )
+
+
+class ImageTooLargeError(ServerError):
+    """Ошибка при изображении из запроса больше допустимого размера."""
+
+    def __init__(self, max_size: int):
+        """
+        Метод инициализации ImageTooLargeError.
+
+        :param max_size: Допустимый размер изображения в байтах
+        :type max_size: int
+        """
+        super().__init__(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f'Изображение больше {max_size} байт',
+        )
+
+
+class ModelNotEnabledError(ServerError, LookupError):
+    """
+    Ошибка при запросе модели, для которой не запущен раннер.
+
+    Это ошибка выбора модели или конфигурации сервиса, а не ошибка
+    изображения, поэтому она не преобразуется в ImageError.
+    """
+
+    def __init__(self, model_name: str):
+        """
+        Метод инициализации ModelNotEnabledError.
+
+        :param model_name: Название модели
+        :type model_name: str
+        """
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"model {model_name} isn't enabled",
+        )
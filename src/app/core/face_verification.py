@@ -1,21 +1,72 @@
 import asyncio
 import logging
+from datetime import datetime, timedelta
 from enum import StrEnum
 from pathlib import Path
-from typing import Any, Callable, Protocol
+from typing import Any, Callable, NamedTuple, Protocol
 
+import numpy as np
+import tensorflow as tf
 from deepface import DeepFace
+from deepface.detectors import DetectorWrapper
+from deepface.models.FacialRecognition import FacialRecognition
+from deepface.modules import detection, preprocessing, verification
 
-from app.core.errors import StorageError
-from app.core.models import User
+from app.core.cache import LRUCache, RepresentationCache
+from app.core.errors import (
+    ModelNotEnabledError,
+    NotFoundError,
+    ServerError,
+    StorageError,
+)
+from app.core.models import (
+    Match,
+    Message,
+    Representation,
+    User,
+    Verification,
+)
+from app.core.preprocessing import (
+    ImageLoader,
+    LoadedImage,
+    restore_facial_area,
+)
+from app.metrics import pipeline as metrics
+from app.system.shared_memory import SharedArray, share_array
 
 logger: logging.Logger = logging.getLogger(__name__)
 
+catch_up_overlap = timedelta(seconds=60)
+
+
+class ModelName(StrEnum):
+    """
+    Названия поддерживаемых моделей распознавания лиц.
+
+    Индекс поиска и поле users.vector используют вектора Facenet,
+    вектора остальных моделей хранятся отдельно по пользователю и модели.
+    """
+
+    facenet = 'Facenet'
+    facenet512 = 'Facenet512'
+    arcface = 'ArcFace'
+    sface = 'SFace'
+
 
 class Runner(Protocol):
     """Класс запуска функций в различных режимах."""
 
-    async def run(self, func: Callable[[str, str], Any], **kwargs) -> Any:
+    is_ready: bool
+
+    async def start(self) -> None:
+        """Запускает ресурсы раннера."""
+        ...  # noqa: WPS428 default Protocol syntax
+
+    async def stop(self) -> None:
+        """Освобождает ресурсы раннера."""
+        ...  # noqa: WPS428 default Protocol syntax
+
+    async def run(self, func: Callable[..., Any], **kwargs) -> Any:
         """
         Метод запуска функции.
 
@@ -27,6 +78,45 @@ class Runner(Protocol):
         ...  # noqa: WPS428 default Protocol syntax
 
 
+class EmbeddingChanges(NamedTuple):
+    """Измененные вектора пользователей и время начала их чтения."""
+
+    embeddings: list[tuple[str, np.ndarray]]
+    removed: list[str]
+    watermark: datetime
+
+
+class RepresentedImages(NamedTuple):
+    """
+    Представления изображений и длительности этапов их получения.
+
+    Вектора лиц передаются из процесса раннера одной матрицей embeddings
+    в порядке лиц в results, чтобы раннер мог вернуть ее через
+    разделяемую память, и подставляются в представления get_results.
+    """
+
+    results: list[tuple[list[dict[str, Any]] | None, str | None]]
+    stage_durations: dict[str, float]
+    embeddings: np.ndarray | SharedArray | None = None
+
+    def get_results(
+        self,
+    ) -> list[tuple[list[dict[str, Any]] | None, str | None]]:
+        """
+        Подставляет вектора лиц из матрицы embeddings в представления.
+
+        :return: Представления изображений и ошибки
+        :rtype: list[tuple[list[dict[str, Any]] | None, str | None]]
+        """
+        if not isinstance(self.embeddings, np.ndarray):
+            return self.results
+        rows = iter(self.embeddings.tolist())
+        for vector, _ in self.results:
+            for face in vector or ():
+                face['embedding'] = next(rows)
+        return self.results
+
+
 class Storage(Protocol):
     """
     Интерфейс для работы с хранилищами данных.
@@ -35,8 +125,11 @@ class Storage(Protocol):
     Служит для уменьшения связности компонентов сервиса.
     """
 
-    def update_user(
-        self, vector: list[dict[str, Any]], username: str,
+    async def update_user(
+        self,
+        vector: list[dict[str, Any]],
+        username: str,
+        model_name: str = ModelName.facenet,
     ) -> User | None:
         """
         Абстрактный метод обновления пользователя.
@@ -45,19 +138,191 @@ class Storage(Protocol):
         :type username: str
         :param vector: Вектор лица пользователя
         :type vector: list[dict[str, Any]]
+        :param model_name: Модель, построившая вектор
+        :type model_name: str
         """
         ...  # noqa: WPS428 default Protocol syntax
 
+    async def update_users_bulk(
+        self,
+        users: list[tuple[str, list[dict[str, Any]]]],
+        model_name: str = ModelName.facenet,
+    ) -> list[str]:
+        """
+        Абстрактный метод обновления нескольких пользователей.
 
-class ModelName(StrEnum):
+        :param users: Имена пользователей и вектора их лиц
+        :type users: list[tuple[str, list[dict[str, Any]]]]
+        :param model_name: Модель, построившая вектора
+        :type model_name: str
+        :return: Имена не найденных или удаленных пользователей
+        :rtype: list[str]
+        """
+        ...  # noqa: WPS428 default Protocol syntax
+
+    async def get_embedding(
+        self, username: str, model_name: str = ModelName.facenet,
+    ) -> np.ndarray | None:
+        """
+        Абстрактный метод получения вектора лица пользователя.
+
+        :param username: Имя пользователя
+        :type username: str
+        :param model_name: Модель, построившая вектор
+        :type model_name: str
+        :return: Вектор первого лица или None, если вектора нет
+        :rtype: np.ndarray | None
+        """
+        ...  # noqa: WPS428 default Protocol syntax
+
+    async def get_embeddings(
+        self, since: datetime | None = None,
+    ) -> EmbeddingChanges:
+        """
+        Абстрактный метод получения векторов верифицированных пользователей.
+
+        :param since: Вернуть только изменения после этого времени
+        :type since: datetime | None
+        :return: Вектора пользователей и водяной знак
+        :rtype: EmbeddingChanges
+        """
+        ...  # noqa: WPS428 default Protocol syntax
+
+    async def close(self) -> None:
+        """Освобождает ресурсы хранилища."""
+        ...  # noqa: WPS428 default Protocol syntax
+
+
+class DistanceMetric(StrEnum):
+    """Метрики расстояния между векторами лиц."""
+
+    cosine = 'cosine'
+    euclidean = 'euclidean'
+    euclidean_l2 = 'euclidean_l2'
+
+
+class SearchIndex(Protocol):
+    """Интерфейс поиска пользователей по вектору лица."""
+
+    is_built: bool
+
+    def build(self, embeddings: list[tuple[str, np.ndarray]]) -> None:
+        """
+        Строит индекс по векторам пользователей.
+
+        :param embeddings: Имена пользователей и вектора их лиц
+        :type embeddings: list[tuple[str, np.ndarray]]
+        """
+        ...  # noqa: WPS428 default Protocol syntax
+
+    def search(
+        self,
+        vector: np.ndarray,
+        top_k: int,
+        metric: DistanceMetric,
+        approximate: bool,
+    ) -> list[Match]:
+        """
+        Ищет пользователей с ближайшими векторами.
+
+        :param vector: Вектор лица
+        :type vector: np.ndarray
+        :param top_k: Количество ближайших пользователей
+        :type top_k: int
+        :param metric: Метрика расстояния
+        :type metric: DistanceMetric
+        :param approximate: Разрешить приближенный поиск
+        :type approximate: bool
+        """
+        ...  # noqa: WPS428 default Protocol syntax
+
+    def upsert(self, username: str, vector: np.ndarray) -> None:
+        """
+        Добавляет или заменяет вектор пользователя.
+
+        :param username: Имя пользователя
+        :type username: str
+        :param vector: Вектор лица
+        :type vector: np.ndarray
+        """
+        ...  # noqa: WPS428 default Protocol syntax
+
+    def remove(self, username: str) -> None:
+        """
+        Удаляет вектор пользователя.
+
+        :param username: Имя пользователя
+        :type username: str
+        """
+        ...  # noqa: WPS428 default Protocol syntax
+
+    def compact(self) -> None:
+        """Переносит накопленные изменения в основную часть индекса."""
+        ...  # noqa: WPS428 default Protocol syntax
+
+    def save_snapshot(self, path: str | Path, watermark: datetime) -> None:
+        """
+        Сохраняет основную часть индекса в файл снимка.
+
+        :param path: Путь к файлу снимка
+        :type path: str | Path
+        :param watermark: Время, до которого изменения есть в снимке
+        :type watermark: datetime
+        """
+        ...  # noqa: WPS428 default Protocol syntax
+
+    def load_snapshot(self, path: str | Path) -> datetime | None:
+        """
+        Загружает основную часть индекса из файла снимка.
+
+        :param path: Путь к файлу снимка
+        :type path: str | Path
+        :return: Водяной знак снимка или None, если снимок не загружен
+        :rtype: datetime | None
+        """
+        ...  # noqa: WPS428 default Protocol syntax
+
+
+class DetectorBackend(StrEnum):
     """
-    Названия поддерживаемых моделей распознавания лиц.
+    Названия поддерживаемых детекторов лиц.
 
-    Attributes:
-        attribute_name: type and description.
+    opencv и ssd - быстрые детекторы для большого потока изображений,
+    skip - изображение целиком считается лицом.
     """
 
-    facenet = 'Facenet'
+    opencv = 'opencv'
+    ssd = 'ssd'
+    dlib = 'dlib'
+    mtcnn = 'mtcnn'
+    fastmtcnn = 'fastmtcnn'
+    retinaface = 'retinaface'
+    mediapipe = 'mediapipe'
+    yolov8 = 'yolov8'
+    yunet = 'yunet'
+    centerface = 'centerface'
+    skip = 'skip'
+
+
+class DetectionOptions(NamedTuple):
+    """Параметры поиска лиц DeepFace."""
+
+    detector_backend: str = DetectorBackend.opencv
+    enforce_detection: bool = True
+    align: bool = True
+
+    @property
+    def cache_variant(self) -> str:
+        """
+        Часть ключа кэша представлений, зависящая от поиска лиц.
+
+        :return: Параметры поиска лиц одной строкой
+        :rtype: str
+        """
+        return (
+            f'{self.detector_backend}:'
+            + f'{int(self.enforce_detection)}:{int(self.align)}'
+        )
 
 
 class Validator:
@@ -87,6 +352,20 @@ class Validator:
             logger.error(f"model {model_name} isn\'t supported")
             raise ValueError(f"model {model_name} isn\'t supported")
 
+    def validate_detector_backend(
+        self, detector_backend: DetectorBackend | str,
+    ) -> None:
+        """
+        Валидирует название детектора лиц.
+
+        :param detector_backend: Название детектора лиц.
+        :type detector_backend: DetectorBackend | str
+        :raises ValueError: При ошибке названия детектора
+        """
+        if detector_backend not in set(DetectorBackend):
+            logger.error(f"detector {detector_backend} isn\'t supported")
+            raise ValueError(f"detector {detector_backend} isn\'t supported")
+
     def _is_path(self, path: str | Path) -> bool:
         if isinstance(path, str):
             path = Path(path)
@@ -99,11 +378,206 @@ class Validator:
         return model_name.value in model_name_values
 
 
-def _represent(img_path: str, model_name: str) -> Any:
-    return DeepFace.represent(
-        img_path=img_path,
-        model_name=model_name,
+def set_inference_threads(
+    intra_op_threads: int = 0, inter_op_threads: int = 0,
+) -> None:
+    """
+    Задает количество потоков TensorFlow в процессе.
+
+    Количество потоков можно задать только до первого вычисления
+    TensorFlow в процессе, 0 оставляет значение по умолчанию.
+
+    :param intra_op_threads: Потоки внутри одной операции
+    :type intra_op_threads: int
+    :param inter_op_threads: Потоки для независимых операций
+    :type inter_op_threads: int
+    """
+    try:
+        if intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(
+                intra_op_threads,
+            )
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(
+                inter_op_threads,
+            )
+    except RuntimeError:
+        logger.warning(
+            'tensorflow is already initialized, threads are not changed',
+        )
+
+
+def preload_model(
+    model_name: str, intra_op_threads: int = 0, inter_op_threads: int = 0,
+) -> None:
+    """
+    Загружает и прогревает модель в процессе раннера.
+
+    Задает количество потоков TensorFlow, строит модель один раз
+    на процесс и выполняет пробное вычисление вектора, чтобы первый
+    запрос не тратил время на построение графа.
+
+    :param model_name: Название модели
+    :type model_name: str
+    :param intra_op_threads: Потоки внутри одной операции TensorFlow
+    :type intra_op_threads: int
+    :param inter_op_threads: Потоки для независимых операций TensorFlow
+    :type inter_op_threads: int
+    """
+    set_inference_threads(intra_op_threads, inter_op_threads)
+    model = DeepFace.build_model(model_name)
+    width, height = model.input_shape
+    model.forward(np.zeros((1, height, width, 3), dtype=np.float32))
+    logger.info(f'model {model_name} is loaded in process')
+
+
+def _represent(
+    img_path: str,
+    model_name: str,
+    loader: ImageLoader,
+    detection_options: DetectionOptions,
+) -> RepresentedImages:
+    model: FacialRecognition = DeepFace.build_model(model_name)
+    stopwatch = metrics.Stopwatch()
+    image = loader.load(img_path)
+    stopwatch.lap('decode')
+    faces, vector = _detect_faces(image, model, detection_options)
+    stopwatch.lap('detect')
+    if faces:
+        embeddings = _embed_faces(np.concatenate(faces), model).tolist()
+        for face, embedding in zip(vector, embeddings):
+            face['embedding'] = embedding
+        stopwatch.lap('embed')
+    return RepresentedImages([(vector, None)], stopwatch.durations)
+
+
+def _represent_many(
+    img_paths: list[str],
+    model_name: str,
+    loader: ImageLoader,
+    detection_options: DetectionOptions,
+) -> RepresentedImages:
+    model: FacialRecognition = DeepFace.build_model(model_name)
+    stopwatch = metrics.Stopwatch()
+    results: list[tuple[list[dict[str, Any]] | None, str | None]] = []
+    faces: list[np.ndarray] = []
+    for img_path in img_paths:
+        try:
+            image = loader.load(img_path)
+            stopwatch.lap('decode')
+            image_faces, vector = _detect_faces(
+                image, model, detection_options,
+            )
+        except ValueError as error:
+            results.append((None, str(error)))
+            stopwatch.lap('detect')
+            continue
+        except Exception as error:
+            logger.exception(f"can't represent image {img_path}")
+            results.append((None, repr(error)))
+            stopwatch.lap('detect')
+            continue
+        faces.extend(image_faces)
+        results.append((vector, None))
+        stopwatch.lap('detect')
+    if not faces:
+        return RepresentedImages(results, stopwatch.durations)
+    embeddings = _embed_faces(np.concatenate(faces), model)
+    stopwatch.lap('embed')
+    return RepresentedImages(
+        results, stopwatch.durations, share_array(embeddings),
+    )
+
+
+def _detect_faces(
+    image: LoadedImage,
+    model: FacialRecognition,
+    detection_options: DetectionOptions,
+) -> tuple[list[np.ndarray], list[dict[str, Any]]]:
+    face_objs = detection.extract_faces(
+        img_path=image.pixels, **detection_options._asdict(),
     )
+    faces = [
+        _preprocess_face(face_obj['face'], model) for face_obj in face_objs
+    ]
+    vector = [
+        {
+            'embedding': [],
+            'facial_area': restore_facial_area(
+                face_obj['facial_area'], image.scale,
+            ),
+            'face_confidence': face_obj['confidence'],
+        }
+        for face_obj in face_objs
+    ]
+    return faces, vector
+
+
+def _embed_facial_areas(
+    img_path: str,
+    facial_areas: list[dict[str, Any]],
+    model_name: str,
+    loader: ImageLoader,
+    align: bool,
+) -> list[dict[str, Any]]:
+    model: FacialRecognition = DeepFace.build_model(model_name)
+    image = loader.load(img_path)
+    faces = [
+        _preprocess_face(
+            _crop_face(
+                image.pixels,
+                restore_facial_area(facial_area, 1 / image.scale),
+                align,
+            ),
+            model,
+        )
+        for facial_area in facial_areas
+    ]
+    if not faces:
+        return []
+    embeddings = _embed_faces(np.concatenate(faces), model).tolist()
+    return [
+        {'embedding': embedding, 'facial_area': facial_area}
+        for embedding, facial_area in zip(embeddings, facial_areas)
+    ]
+
+
+def _crop_face(
+    pixels: np.ndarray, facial_area: dict[str, Any], align: bool,
+) -> np.ndarray:
+    x, y, w, h = (int(facial_area[name]) for name in ('x', 'y', 'w', 'h'))
+    left_eye = facial_area.get('left_eye')
+    right_eye = facial_area.get('right_eye')
+    box = (x, y, x + w, y + h)
+    if align and left_eye is not None and right_eye is not None:
+        # поворот как при поиске лиц, чтобы вектора совпадали
+        pixels, angle = detection.align_face(
+            img=pixels, left_eye=left_eye, right_eye=right_eye,
+        )
+        box = DetectorWrapper.rotate_facial_area(
+            facial_area=box, angle=angle, size=pixels.shape[:2],
+        )
+    x1, y1, x2, y2 = (max(int(coordinate), 0) for coordinate in box)
+    return pixels[y1:y2, x1:x2, ::-1] / 255
+
+
+def _preprocess_face(face: np.ndarray, model: FacialRecognition) -> Any:
+    width, height = model.input_shape
+    face = preprocessing.resize_image(
+        img=face[:, :, ::-1], target_size=(height, width),
+    )
+    return preprocessing.normalize_input(img=face)
+
+
+def _embed_faces(faces: np.ndarray, model: FacialRecognition) -> np.ndarray:
+    if type(model).forward is not FacialRecognition.forward:
+        # модель без keras, вектора считаются по одному
+        return np.array([model.forward(face[np.newaxis]) for face in faces])
+    return model.model(faces, training=False).numpy()
+
+
+def _embedding_key(username: str, model_name: str) -> str:
+    return f'{model_name}:{username}'
 
 
 class FaceVerificationService:
@@ -113,8 +587,19 @@ class FaceVerificationService:
     Служит для вызова функций библиотеки распознавания лица DeepFace.
     """
 
-    def __init__(
-        self, storage: Storage, runner: Runner, library: type = DeepFace,
+    def __init__(  # noqa: WPS211 service dependencies
+        self,
+        storage: Storage,
+        runner: Runner,
+        library: type = DeepFace,
+        index: SearchIndex | None = None,
+        embeddings_cache: LRUCache[str, np.ndarray] | None = None,
+        index_snapshot_path: str | Path | None = None,
+        representation_cache: RepresentationCache | None = None,
+        image_loader: ImageLoader | None = None,
+        detection_options: DetectionOptions | None = None,
+        batch_detection_options: DetectionOptions | None = None,
+        shadow_models: tuple[str, ...] = (),
     ) -> None:
         """
         Функция инициализации.
@@ -125,11 +610,47 @@ class FaceVerificationService:
         :type runner: Runner
         :param library: Библиотека для распознавания лиц, defaults to DeepFace.
         :type library: type
+        :param index: Индекс поиска пользователей, defaults to None.
+        :type index: SearchIndex | None
+        :param embeddings_cache: Кэш векторов пользователей.
+        :type embeddings_cache: LRUCache[str, np.ndarray] | None
+        :param index_snapshot_path: Путь к файлу снимка индекса.
+        :type index_snapshot_path: str | Path | None
+        :param representation_cache: Кэш представлений изображений.
+        :type representation_cache: RepresentationCache | None
+        :param image_loader: Загрузчик изображений в процессах раннера.
+        :type image_loader: ImageLoader | None
+        :param detection_options: Параметры поиска лиц.
+        :type detection_options: DetectionOptions | None
+        :param batch_detection_options: Параметры поиска лиц
+            при пакетной обработке, по умолчанию detection_options.
+        :type batch_detection_options: DetectionOptions | None
+        :param shadow_models: Модели, вектора которых сохраняются
+            при верификации вместе с векторами Facenet.
+        :type shadow_models: tuple[str, ...]
+        :raises ValueError: При ошибке названия детектора лиц или модели
         """
         self.storage = storage
         self.library = library
         self.validator = Validator()
         self.runner = runner
+        self.index = index
+        self.embeddings_cache: LRUCache[str, np.ndarray] = (
+            embeddings_cache or LRUCache()
+        )
+        self.index_snapshot_path = index_snapshot_path
+        self.index_watermark: datetime | None = None
+        self.representation_cache = representation_cache
+        self.image_loader = image_loader or ImageLoader()
+        self.detection_options = detection_options or DetectionOptions()
+        self.batch_detection_options = (
+            batch_detection_options or self.detection_options
+        )
+        for options in (self.detection_options, self.batch_detection_options):
+            self.validator.validate_detector_backend(options.detector_backend)
+        self.shadow_models = shadow_models
+        for model_name in self.shadow_models:
+            self.validator.validate_model_name(model_name)
 
     async def verify(self, username: str, img_path: str) -> None:
         """
@@ -137,7 +658,15 @@ class FaceVerificationService:
 
         Получает вектор изображения пользователя.
         Верифицирует пользователя.
+        Сохраняет вектора теневых моделей.
         Удаляет использованное изображение пользователя.
+        Любая ошибка получения вектора, как и при пакетной обработке,
+        считается ошибкой изображения: изображение удаляется,
+        и сообщение не обрабатывается повторно. Если модель
+        не включена в конфигурации, изображение сохраняется.
+        При ошибке хранилища, кроме отсутствия пользователя,
+        изображение не удаляется, чтобы сообщение можно было
+        обработать повторно.
 
         :param username: Имя пользователя
         :type username: str
@@ -146,20 +675,268 @@ class FaceVerificationService:
         """
         try:
             vector = await self.represent(img_path=img_path)
-        except ValueError:
-            logger.error(f"can't get vector for {username}")
+        except ModelNotEnabledError:
+            raise
+        except Exception as error:
+            if isinstance(error, ValueError):
+                logger.error(f"can't get vector for {username}")
+            else:
+                logger.exception(f"failed to get vector for {username}")
+            metrics.count_error('represent', error)
             task = asyncio.create_task(self._delete_path(img_path))
             await task
             return
-        logger.info(f'got vector {vector} for {username}')
-        delete_task = asyncio.create_task(self._delete_path(img_path))
-        update_user_task = asyncio.create_task(
-            self.update_user(vector, username),
+        await self._save_vector(vector, username, img_path)
+
+    async def verify_many(self, messages: list[Message]) -> None:
+        """
+        Верифицирует пользователей из нескольких сообщений.
+
+        Получает вектора изображений одним пакетом.
+        Верифицирует пользователей одним запросом к хранилищу.
+        Сохраняет вектора теневых моделей.
+        Удаляет использованные изображения пользователей.
+        При ошибке хранилища изображения не удаляются,
+        чтобы сообщения можно было обработать повторно.
+
+        :param messages: Сообщения с изображениями пользователей
+        :type messages: list[Message]
+        """
+        representations = await self.represent_many(
+            [message.path for message in messages],
         )
-        try:
-            await asyncio.gather(delete_task, update_user_task)
-        except Exception:
-            logger.error(f"can't update {username}")
+        users: list[tuple[str, list[dict[str, Any]]]] = []
+        verified_images: list[tuple[str, str, list[dict[str, Any]]]] = []
+        for message, representation in zip(messages, representations):
+            if representation.vector is None:
+                logger.error(f"can't get vector for {message.username}")
+            else:
+                logger.info(
+                    f'got vector {representation.vector} '
+                    f'for {message.username}',
+                )
+                users.append((message.username, representation.vector))
+                verified_images.append((
+                    message.username, str(message.path), representation.vector,
+                ))
+        if users:
+            await self.update_users(users)
+            await self._save_shadow_vectors(
+                verified_images, self.batch_detection_options,
+            )
+        await asyncio.gather(*[
+            self._delete_path(str(message.path)) for message in messages
+        ])
+
+    async def verify_against(
+        self,
+        username: str,
+        img_path: str | Path,
+        metric: DistanceMetric = DistanceMetric.cosine,
+        model_name: str = ModelName.facenet,
+    ) -> Verification:
+        """
+        Сравнивает изображение лица с сохраненным вектором пользователя.
+
+        Вектор пользователя берется из кэша, при промахе загружается
+        из хранилища. Пользователь подтвержден, если расстояние
+        не больше порога DeepFace для модели и метрики.
+
+        :param username: Имя пользователя
+        :type username: str
+        :param img_path: путь к файлу изображения
+        :type img_path: str | pathlib.Path
+        :param metric: Метрика расстояния
+        :type metric: DistanceMetric
+        :param model_name: ModelName, название модели анализа изображения
+        :type model_name: str
+        :return: Расстояние, порог и решение
+        :rtype: Verification
+        :raises NotFoundError: Если у пользователя нет вектора
+        """
+        embedding = await self.get_embedding(username, model_name)
+        if embedding is None:
+            logger.error(f'{model_name} vector for {username} is not found')
+            raise NotFoundError(
+                detail=f'{model_name} vector for {username} is not found',
+            )
+        vector = await self.represent(img_path=img_path, model_name=model_name)
+        distance = float(verification.find_distance(
+            embedding, np.asarray(vector[0]['embedding']), metric,
+        ))
+        threshold = verification.find_threshold(model_name, metric)
+        return Verification(
+            username=username,
+            verified=distance <= threshold,
+            distance=distance,
+            threshold=threshold,
+            model_name=model_name,
+            metric=metric,
+        )
+
+    async def get_embedding(
+        self, username: str, model_name: str = ModelName.facenet,
+    ) -> np.ndarray | None:
+        """
+        Получает вектор лица пользователя из кэша или хранилища.
+
+        :param username: Имя пользователя
+        :type username: str
+        :param model_name: Модель, построившая вектор
+        :type model_name: str
+        :return: Вектор первого лица или None, если вектора нет
+        :rtype: np.ndarray | None
+        """
+        key = _embedding_key(username, model_name)
+        embedding = self.embeddings_cache.get(key)
+        if embedding is None:
+            embedding = await self.storage.get_embedding(username, model_name)
+            if embedding is None and model_name == ModelName.facenet:
+                self._remove_from_index(username)
+            elif embedding is not None:
+                self.embeddings_cache.put(key, embedding)
+        return embedding
+
+    async def identify(
+        self,
+        img_path: str | Path,
+        top_k: int = 5,
+        metric: DistanceMetric = DistanceMetric.cosine,
+        approximate: bool = True,
+    ) -> list[Match]:
+        """
+        Ищет пользователей по изображению лица.
+
+        Получает вектор первого лица на изображении и ищет
+        пользователей с ближайшими векторами в индексе.
+
+        :param img_path: путь к файлу изображения
+        :type img_path: str | pathlib.Path
+        :param top_k: Количество ближайших пользователей
+        :type top_k: int
+        :param metric: Метрика расстояния
+        :type metric: DistanceMetric
+        :param approximate: Разрешить приближенный поиск, если индекс
+            его поддерживает
+        :type approximate: bool
+        :return: Пользователи по возрастанию расстояния
+        :rtype: list[Match]
+        :raises ServerError: Если индекс не построен
+        """
+        if self.index is None or not self.index.is_built:
+            logger.error('search index is not ready')
+            raise ServerError(detail='search index is not ready')
+        vector = await self.represent(img_path=img_path)
+        embedding = np.asarray(vector[0]['embedding'], dtype=np.float32)
+        return await asyncio.to_thread(
+            self.index.search, embedding, top_k, metric, approximate,
+        )
+
+    async def load_index(self) -> None:
+        """
+        Загружает индекс поиска.
+
+        Если есть снимок индекса, индекс загружается из него,
+        и из хранилища читаются только изменения после водяного знака
+        снимка. Иначе индекс строится по всем векторам хранилища
+        и сохраняется в новый снимок. Индекс строится в отдельном
+        потоке, чтобы не блокировать event loop.
+        """
+        if self.index is None:
+            return
+        if self.index_snapshot_path is not None:
+            self.index_watermark = await asyncio.to_thread(
+                self.index.load_snapshot, self.index_snapshot_path,
+            )
+        if self.index_watermark is not None:
+            await self.catch_up_index()
+            return
+        changes = await self.storage.get_embeddings()
+        await asyncio.to_thread(self.index.build, changes.embeddings)
+        self.index_watermark = changes.watermark
+        logger.info(
+            f'search index is loaded with {len(changes.embeddings)} users',
+        )
+        await self.save_index_snapshot()
+
+    async def catch_up_index(self) -> None:
+        """
+        Применяет к индексу изменения векторов из хранилища.
+
+        Читаются изменения после водяного знака индекса с запасом
+        catch_up_overlap, чтобы не пропустить транзакции,
+        зафиксированные позже начала предыдущего чтения.
+        Изменения других процессов сервиса попадают в индекс
+        и сбрасывают кэш векторов пользователя всех моделей,
+        включая теневые.
+        """
+        if self.index is None or self.index_watermark is None:
+            return
+        changes = await self.storage.get_embeddings(
+            since=self.index_watermark - catch_up_overlap,
+        )
+        changed_usernames = [username for username, _ in changes.embeddings]
+        for changed_username in (*changed_usernames, *changes.removed):
+            for model_name in ModelName:
+                self.embeddings_cache.invalidate(
+                    _embedding_key(changed_username, model_name),
+                )
+        await asyncio.to_thread(self._apply_changes, self.index, changes)
+        self.index_watermark = changes.watermark
+        if changes.embeddings or changes.removed:
+            logger.info(
+                f'search index caught up with {len(changes.embeddings)} '
+                + f'updated and {len(changes.removed)} removed users',
+            )
+
+    async def compact_index(self) -> None:
+        """Сжимает индекс поиска в отдельном потоке."""
+        if self.index is not None and self.index.is_built:
+            await asyncio.to_thread(self.index.compact)
+
+    async def save_index_snapshot(self) -> None:
+        """
+        Сжимает индекс и сохраняет его в файл снимка.
+
+        Водяной знак запоминается до сжатия: все изменения до него
+        уже применены к индексу и попадают в снимок.
+        """
+        watermark = self.index_watermark
+        if self.index is None or self.index_snapshot_path is None:
+            return
+        if watermark is None or not self.index.is_built:
+            return
+        await self.compact_index()
+        await asyncio.to_thread(
+            self.index.save_snapshot, self.index_snapshot_path, watermark,
+        )
+
+    async def maintain_index(
+        self, interval: float, snapshot_interval: float,
+    ) -> None:
+        """
+        Периодически обновляет, сжимает и сохраняет индекс поиска.
+
+        Ошибка обслуживания не останавливает обслуживание индекса.
+
+        :param interval: Интервал между обновлениями в секундах
+        :type interval: float
+        :param snapshot_interval: Интервал между снимками в секундах
+        :type snapshot_interval: float
+        """
+        loop = asyncio.get_running_loop()
+        snapshot_at = loop.time() + snapshot_interval
+        while True:  # noqa: WPS457 periodic maintenance
+            await asyncio.sleep(interval)
+            try:
+                await self.catch_up_index()
+                if loop.time() < snapshot_at:
+                    await self.compact_index()
+                    continue
+                await self.save_index_snapshot()
+                snapshot_at = loop.time() + snapshot_interval
+            except Exception:
+                logger.exception("can't maintain search index")
 
     async def represent(
         self, img_path: str | Path, model_name: str = ModelName.facenet,
@@ -167,7 +944,9 @@ class FaceVerificationService:
         """
         Служит для получения представления изображения в виде списка векторов.
 
-        Возвращает список вложенных векторов.
+        Возвращает список вложенных векторов. Если задан кэш
+        представлений, изображение с тем же содержимым повторно
+        не обрабатывается моделью.
 
         :param img_path: путь к файлу изображения
         :type img_path: str | pathlib.Path
@@ -176,35 +955,317 @@ class FaceVerificationService:
         :return: Список вложенных векторов
         :rtype: list[dict[str, Any]]
         """
-        self.validator.validate_path(img_path)
-        self.validator.validate_model_name(model_name)
+        with metrics.stage_seconds.labels('validate').time():
+            self.validator.validate_path(img_path)
+            self.validator.validate_model_name(model_name)
         img_path = str(img_path)
-        return await self.runner.run(
-            _represent, img_path=img_path, model_name=model_name,
+        key, vector = await self._lookup_representation(
+            img_path, model_name, self.detection_options,
         )
+        if vector is not None:
+            return vector
+        with metrics.stage_seconds.labels('represent').time():
+            represented = await self.runner.run(
+                _represent,
+                img_path=img_path,
+                model_name=model_name,
+                loader=self.image_loader,
+                detection_options=self.detection_options,
+            )
+        metrics.observe_stages(represented.stage_durations)
+        vector = represented.get_results()[0][0]
+        await self._cache_representation(key, vector, model_name)
+        return vector
+
+    async def reembed(
+        self,
+        img_path: str | Path,
+        model_name: str,
+        source_model_name: str = ModelName.facenet,
+    ) -> list[dict[str, Any]]:
+        """
+        Вычисляет вектора лиц другой моделью без повторного поиска лиц.
+
+        Области лиц берутся из представления изображения моделью
+        source_model_name, которое обычно уже есть в кэше представлений.
+
+        :param img_path: путь к файлу изображения
+        :type img_path: str | pathlib.Path
+        :param model_name: ModelName, название модели для новых векторов
+        :type model_name: str
+        :param source_model_name: ModelName, модель, представление
+            которой содержит области лиц
+        :type source_model_name: str
+        :return: Список вложенных векторов модели model_name
+        :rtype: list[dict[str, Any]]
+        """
+        source_vector = await self.represent(img_path, source_model_name)
+        self.validator.validate_model_name(model_name)
+        if model_name == source_model_name:
+            return source_vector
+        return await self._reembed(
+            str(img_path), model_name, source_vector, self.detection_options,
+        )
+
+    async def represent_many(
+        self,
+        img_paths: list[str | Path],
+        model_name: str = ModelName.facenet,
+    ) -> list[Representation]:
+        """
+        Служит для получения представлений нескольких изображений.
+
+        Лица всех изображений передаются в модель одним пакетом.
+        Ошибка обработки изображения не прерывает обработку остальных,
+        а сохраняется в представлении этого изображения. Представления
+        из кэша в модель не передаются.
+
+        :param img_paths: пути к файлам изображений
+        :type img_paths: list[str | pathlib.Path]
+        :param model_name: ModelName, название модели анализа изображения
+        :type model_name: str
+        :return: Представления изображений в порядке путей
+        :rtype: list[Representation]
+        """
+        self.validator.validate_model_name(model_name)
+        representations = [Representation(path=path) for path in img_paths]
+        valid_representations: list[Representation] = []
+        with metrics.stage_seconds.labels('validate').time():
+            for representation in representations:
+                try:
+                    self.validator.validate_path(representation.path)
+                except ValueError as error:
+                    representation.error = str(error)
+                    metrics.count_error('validate', error)
+                else:
+                    valid_representations.append(representation)
+        pending: list[tuple[Representation, str | None]] = []
+        for representation in valid_representations:
+            key, vector = await self._lookup_representation(
+                str(representation.path),
+                model_name,
+                self.batch_detection_options,
+            )
+            representation.vector = vector
+            if vector is None:
+                pending.append((representation, key))
+        if not pending:
+            return representations
+        metrics.batch_size.labels('images').observe(len(pending))
+        with metrics.stage_seconds.labels('represent').time():
+            represented = await self.runner.run(
+                _represent_many,
+                img_paths=[str(rep.path) for rep, _ in pending],
+                model_name=model_name,
+                loader=self.image_loader,
+                detection_options=self.batch_detection_options,
+            )
+        metrics.observe_stages(represented.stage_durations)
+        for (representation, key), (vector, error) in zip(
+            pending, represented.get_results(),
+        ):
+            representation.vector = vector
+            representation.error = error
+            if error is None:
+                await self._cache_representation(key, vector, model_name)
+            else:
+                metrics.count_error('detect', ValueError.__name__)
+        return representations
 
     async def update_user(
-        self, vector: list[dict[str, Any]], username: str,
+        self,
+        vector: list[dict[str, Any]],
+        username: str,
+        model_name: str = ModelName.facenet,
     ) -> None:
         """
         Обновляет данные пользователя в базе данных.
 
+        Индекс поиска обновляется только векторами Facenet.
+
         :param vector: Вектор лица пользователя
         :type vector: list[dict[str, Any]]
         :param username: Имя пользователя
         :type username: str
+        :param model_name: Модель, построившая вектор
+        :type model_name: str
         :raises StorageError: При ошибке в базе данных
         """
-        user: User | None = self.storage.update_user(vector, username)
+        with metrics.stage_seconds.labels('db_write').time():
+            user: User | None = await self.storage.update_user(
+                vector, username, model_name,
+            )
+        self.embeddings_cache.invalidate(_embedding_key(username, model_name))
         if not user:
+            self._remove_from_index(username)
+            metrics.count_error('db_write', StorageError.__name__)
             logger.error('StorageError: user is not updated')
             raise StorageError(detail='error in storage, user is not updated')
+        if model_name == ModelName.facenet:
+            self._add_to_index(username, vector)
 
-    async def _delete_path(self, img_path: str) -> None:
-        path = Path(img_path)
+    async def update_users(
+        self,
+        users: list[tuple[str, list[dict[str, Any]]]],
+        model_name: str = ModelName.facenet,
+    ) -> None:
+        """
+        Обновляет данные нескольких пользователей в базе данных.
+
+        Пользователи, которых нет в базе данных, пропускаются
+        и удаляются из индекса поиска. Индекс поиска обновляется
+        только векторами Facenet.
+
+        :param users: Имена пользователей и вектора их лиц
+        :type users: list[tuple[str, list[dict[str, Any]]]]
+        :param model_name: Модель, построившая вектора
+        :type model_name: str
+        """
+        metrics.batch_size.labels('users').observe(len(users))
+        with metrics.stage_seconds.labels('db_write').time():
+            missing_usernames = set(
+                await self.storage.update_users_bulk(users, model_name),
+            )
+        for updated_username, vector in users:
+            self.embeddings_cache.invalidate(
+                _embedding_key(updated_username, model_name),
+            )
+            is_indexed = model_name == ModelName.facenet
+            if is_indexed and updated_username not in missing_usernames:
+                self._add_to_index(updated_username, vector)
+        for username in missing_usernames:
+            self._remove_from_index(username)
+            metrics.count_error('db_write', NotFoundError.__name__)
+            logger.error(f"can't update {username}, user is not found")
+
+    async def _lookup_representation(
+        self,
+        img_path: str,
+        model_name: str,
+        detection_options: DetectionOptions,
+    ) -> tuple[str | None, list[dict[str, Any]] | None]:
+        if self.representation_cache is None:
+            return None, None
+        return await asyncio.to_thread(
+            self.representation_cache.lookup,
+            img_path,
+            model_name,
+            f'{detection_options.cache_variant}:'
+            + self.image_loader.cache_variant,
+        )
+
+    async def _cache_representation(
+        self,
+        key: str | None,
+        vector: list[dict[str, Any]] | None,
+        model_name: str,
+    ) -> None:
+        if self.representation_cache is None or key is None or not vector:
+            return
+        await asyncio.to_thread(
+            self.representation_cache.put, key, vector, model_name,
+        )
+
+    async def _reembed(
+        self,
+        img_path: str,
+        model_name: str,
+        source_vector: list[dict[str, Any]],
+        detection_options: DetectionOptions,
+    ) -> list[dict[str, Any]]:
+        key, vector = await self._lookup_representation(
+            img_path, model_name, detection_options,
+        )
+        if vector is not None:
+            return vector
+        with metrics.stage_seconds.labels('represent').time():
+            embedded = await self.runner.run(
+                _embed_facial_areas,
+                img_path=img_path,
+                facial_areas=[face['facial_area'] for face in source_vector],
+                model_name=model_name,
+                loader=self.image_loader,
+                align=detection_options.align,
+            )
+        vector = [
+            {**face, 'face_confidence': source_face.get('face_confidence')}
+            for face, source_face in zip(embedded, source_vector)
+        ]
+        await self._cache_representation(key, vector, model_name)
+        return vector
+
+    def _add_to_index(
+        self, username: str, vector: list[dict[str, Any]],
+    ) -> None:
+        if self.index is None or not vector:
+            return
         try:
-            self.validator.validate_path(img_path)
-        except ValueError:
-            logger.warning(f'{img_path} not found, can not remove')
+            self.index.upsert(username, np.asarray(vector[0]['embedding']))
+        except ValueError as error:
+            logger.error(f"can't add {username} to search index: {error}")
+
+    def _remove_from_index(self, username: str) -> None:
+        if self.index is not None:
+            self.index.remove(username)
+
+    def _apply_changes(
+        self, index: SearchIndex, changes: EmbeddingChanges,
+    ) -> None:
+        for username, vector in changes.embeddings:
+            try:
+                index.upsert(username, vector)
+            except ValueError as error:
+                logger.error(f"can't add {username} to search index: {error}")
+        for removed_username in changes.removed:
+            index.remove(removed_username)
+
+    async def _save_vector(
+        self, vector: list[dict[str, Any]], username: str, img_path: str,
+    ) -> None:
+        logger.info(f'got vector {vector} for {username}')
+        try:
+            await self.update_user(vector, username)
+        except StorageError:
+            logger.error(f"can't update {username}")
         else:
-            path.unlink()
+            await self._save_shadow_vectors(
+                [(username, img_path, vector)], self.detection_options,
+            )
+        await self._delete_path(img_path)
+
+    async def _save_shadow_vectors(
+        self,
+        images: list[tuple[str, str, list[dict[str, Any]]]],
+        detection_options: DetectionOptions,
+    ) -> None:
+        for model_name in self.shadow_models:
+            vectors = await asyncio.gather(*[
+                self._reembed(
+                    img_path, model_name, source_vector, detection_options,
+                )
+                for _, img_path, source_vector in images
+            ], return_exceptions=True)
+            users: list[tuple[str, list[dict[str, Any]]]] = []
+            for (username, _, _), vector in zip(images, vectors):
+                if isinstance(vector, Exception):
+                    logger.error(
+                        f"can't get {model_name} vector for {username}: "
+                        + f'{vector}',
+                    )
+                    metrics.count_error('shadow', vector)
+                else:
+                    users.append((username, vector))
+            if users:
+                await self.update_users(users, model_name)
+
+    async def _delete_path(self, img_path: str) -> None:
+        path = Path(img_path)
+        with metrics.stage_seconds.labels('file_delete').time():
+            try:
+                self.validator.validate_path(img_path)
+            except ValueError as error:
+                logger.warning(f'{img_path} not found, can not remove')
+                metrics.count_error('file_delete', error)
+            else:
+                path.unlink()
+
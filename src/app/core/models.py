@@ -18,3 +18,29 @@ class User(BaseModel):
     is_verified: bool
     vector: list[dict[str, Any]] | None = None
     user_id: int | None = None
+
+
+class Representation(BaseModel):
+    """Представление изображения лица или ошибка его получения."""
+
+    path: Path | str
+    vector: list[dict[str, Any]] | None = None
+    error: str | None = None
+
+
+class Match(BaseModel):
+    """Пользователь, найденный по изображению лица."""
+
+    username: str
+    distance: float
+
+
+class Verification(BaseModel):
+    """Результат сравнения изображения лица с вектором пользователя."""
+
+    username: str
+    verified: bool
+    distance: float
+    threshold: float
+    model_name: str
+    metric: str
@@ -0,0 +1,142 @@
+"""
+Загрузка изображений перед поиском лиц.
+
+Фотографии с телефонов декодируются в полном разрешении дольше,
+чем ищутся лица, а детектору полное разрешение не нужно.
+Изображение декодируется один раз с уменьшением, JPEG - сразу
+в 2, 4 или 8 раз меньшего размера масштабированием DCT,
+и передается в DeepFace массивом NumPy вместо пути к файлу.
+Области лиц пересчитываются в координаты исходного изображения.
+"""
+import logging
+from typing import Any, NamedTuple
+
+import cv2
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+max_image_side = 1280
+
+_reduced_flags = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+_facial_area_points = ('left_eye', 'right_eye')
+
+
+class LoadedImage(NamedTuple):
+    """Декодированное изображение и его уменьшение."""
+
+    pixels: np.ndarray
+    scale: float
+
+
+class ImageLoader:
+    """
+    Загрузчик изображений для детектора лиц.
+
+    Загрузчик передается в процессы раннера, поэтому хранит
+    только настройки.
+
+    Attributes:
+        max_side: int - наибольшая сторона декодированного изображения.
+        exif_orientation: bool - поворачивать изображение по EXIF.
+    """
+
+    def __init__(
+        self, max_side: int = max_image_side, exif_orientation: bool = True,
+    ) -> None:
+        """
+        Метод инициализации.
+
+        :param max_side: Наибольшая сторона изображения в пикселях
+        :type max_side: int
+        :param exif_orientation: Поворачивать изображение по EXIF
+        :type exif_orientation: bool
+        """
+        self.max_side = max_side
+        self.exif_orientation = exif_orientation
+
+    @property
+    def cache_variant(self) -> str:
+        """
+        Часть ключа кэша представлений, зависящая от загрузки изображения.
+
+        :return: Настройки загрузки одной строкой
+        :rtype: str
+        """
+        return f'{self.max_side}:{int(self.exif_orientation)}'
+
+    def load(self, img_path: str) -> LoadedImage:
+        """
+        Декодирует изображение не больше max_side по большей стороне.
+
+        :param img_path: Путь к файлу изображения
+        :type img_path: str
+        :return: Изображение BGR и во сколько раз оно уменьшено
+        :rtype: LoadedImage
+        :raises ValueError: Если файл не является изображением
+        """
+        try:
+            with Image.open(img_path) as image:
+                original_side = max(image.size)
+        except (OSError, UnidentifiedImageError):
+            raise ValueError(f'{img_path} is not an image')
+        reduction, flags = self._get_decode_flags(original_side)
+        pixels = cv2.imread(img_path, flags)
+        if pixels is None:
+            raise ValueError(f'{img_path} is not an image')
+        side = max(pixels.shape[:2])
+        if side > self.max_side:
+            resize = self.max_side / side
+            pixels = cv2.resize(
+                pixels, None, fx=resize, fy=resize,
+                interpolation=cv2.INTER_AREA,
+            )
+        scale = original_side / max(pixels.shape[:2])
+        logger.debug(
+            f'decoded {img_path} reduced by {reduction} scaled by {scale}',
+        )
+        return LoadedImage(pixels=pixels, scale=scale)
+
+    def _get_decode_flags(self, original_side: int) -> tuple[int, int]:
+        flags = cv2.IMREAD_COLOR
+        reduction = 1
+        for factor, reduced_flag in _reduced_flags:
+            if original_side // factor >= self.max_side:
+                flags, reduction = reduced_flag, factor
+                break
+        if not self.exif_orientation:
+            flags |= cv2.IMREAD_IGNORE_ORIENTATION
+        return reduction, flags
+
+
+def restore_facial_area(
+    facial_area: dict[str, Any], scale: float,
+) -> dict[str, Any]:
+    """
+    Пересчитывает область лица в координаты исходного изображения.
+
+    :param facial_area: Область лица на уменьшенном изображении
+    :type facial_area: dict[str, Any]
+    :param scale: Во сколько раз изображение было уменьшено
+    :type scale: float
+    :return: Область лица на исходном изображении
+    :rtype: dict[str, Any]
+    """
+    if scale == 1:
+        return facial_area
+    restored = dict(facial_area)
+    for name in ('x', 'y', 'w', 'h'):
+        if name in restored:
+            restored[name] = round(restored[name] * scale)
+    for point_name in _facial_area_points:
+        point = restored.get(point_name)
+        if point is not None:
+            restored[point_name] = tuple(
+                round(coordinate * scale) for coordinate in point
+            )
+    return restored
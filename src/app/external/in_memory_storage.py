@@ -1,66 +1,211 @@
 import logging
+from datetime import datetime, timezone
 from typing import Any
 
-from app.core.models import User
+import numpy as np
+
+from app.core.embedding import VectorDtype, dequantize, quantize
+from app.core.face_verification import (
+    DistanceMetric,
+    EmbeddingChanges,
+    ModelName,
+)
+from app.core.models import Match, User
+from app.external.index.search import (
+    get_distances,
+    get_similarities,
+    min_norm,
+    normalize_query,
+    to_matches,
+)
 
 logger = logging.getLogger(__name__)
 
+initial_capacity = 1024
+
 
 class InMemoryStorage:
     """
     Имплементация хранилища данных в оперативной памяти.
 
     Сохраняет данные только на время работы программы.
-    Для хранения данных использует списки python.
+    Пользователи хранятся в словарях по имени и по id, поэтому
+    получение и обновление пользователя не зависят от их количества.
+    Вектора первых лиц хранятся строками непрерывной матрицы типа
+    dtype, емкость которой удваивается при заполнении, поэтому
+    ближайшие пользователи ищутся одним матричным умножением.
+    Вектора моделей кроме Facenet в поиске не участвуют и хранятся
+    в словаре по имени пользователя и модели.
 
     Attributes:
-        users: list[User] - созданные пользователи.
+        users: dict[str, User] - пользователи по имени.
+        users_by_id: dict[int, User] - пользователи по id.
         users_count: int - счетчик созданных пользователей.
-        tokens: list[Token] - созданные токены.
-        tokens_count: int - счетчик созданных токенов.
+        model_embeddings: dict[tuple[str, str], np.ndarray] - вектора
+            первых лиц других моделей по имени пользователя и модели.
     """
 
-    def __init__(self) -> None:
-        """Метод инициализации."""
-        self.users: list[User] = []
+    def __init__(self, dtype: VectorDtype | str = VectorDtype.float32) -> None:
+        """
+        Метод инициализации.
+
+        :param dtype: Тип значений матрицы векторов
+        :type dtype: VectorDtype | str
+        """
+        self.dtype = VectorDtype(dtype)
+        self.users: dict[str, User] = {}
+        self.users_by_id: dict[int, User] = {}
         self.users_count: int = 0
+        self.model_embeddings: dict[tuple[str, str], np.ndarray] = {}
+        self._rows: dict[str, int] = {}
+        self._usernames = np.empty(0, dtype=object)
+        self._vectors = np.empty((0, 0), dtype=self.dtype.value)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._scales = np.empty(0, dtype=np.float32)
 
-    def update_user(
-        self, vector: list[dict[str, Any]], username: str,
+    async def update_user(
+        self,
+        vector: list[dict[str, Any]],
+        username: str,
+        model_name: str = ModelName.facenet,
     ) -> User | None:
         """
-        Создает пользователя в базе данных.
+        Обновляет пользователя в базе данных.
 
-        Создает, сохраняет в базе данных
-        и возвращает индексированную запись о пользователе.
+        Не найденный пользователь создается.
 
         :param username: Имя пользователя
         :type username: str
         :param vector: Вектор лица пользователя
         :type vector: list[dict[str, Any]]
+        :param model_name: Модель, построившая вектор
+        :type model_name: str
         :return: индексированная запись о пользователе.
         :rtype: User
         """
+        user_in_db = self.users.get(username)
+        if user_in_db is None:
+            user_in_db = self.create_user(
+                User(username=username, is_verified=True),
+            )
+        if model_name != ModelName.facenet:
+            return self._save_model_embedding(user_in_db, vector, model_name)
         user = User(
             username=username,
             is_verified=True,
             vector=vector,
+            user_id=user_in_db.user_id,
         )
-        user_in_db = self.get_user(user)
-
-        if user_in_db is None:
-            user_in_db = self.create_user(user)
-            self.users.append(user_in_db)
-            self.users_count += 1
-            logger.info(f'Created user {user_in_db}')
-            return user_in_db
-
-        user_position = self.users.index(user_in_db)
-        user.user_id = user_in_db.user_id
-        self.users[user_position] = user
+        self._save_user(user)
+        self._save_embedding(username, vector)
         logger.info(f'Updated {user}')
         return user
 
+    async def update_users_bulk(
+        self,
+        users: list[tuple[str, list[dict[str, Any]]]],
+        model_name: str = ModelName.facenet,
+    ) -> list[str]:
+        """
+        Обновляет нескольких пользователей в базе данных.
+
+        Не найденные пользователи создаются.
+
+        :param users: Имена пользователей и вектора их лиц
+        :type users: list[tuple[str, list[dict[str, Any]]]]
+        :param model_name: Модель, построившая вектора
+        :type model_name: str
+        :return: Имена не обновленных пользователей
+        :rtype: list[str]
+        """
+        for username, vector in users:
+            await self.update_user(vector, username, model_name)
+        return []
+
+    async def get_embedding(
+        self, username: str, model_name: str = ModelName.facenet,
+    ) -> np.ndarray | None:
+        """
+        Получает вектор первого лица пользователя.
+
+        :param username: Имя пользователя
+        :type username: str
+        :param model_name: Модель, построившая вектор
+        :type model_name: str
+        :return: Вектор первого лица или None, если вектора нет
+        :rtype: np.ndarray | None
+        """
+        if model_name != ModelName.facenet:
+            embedding = self.model_embeddings.get((username, model_name))
+            return None if embedding is None else embedding.copy()
+        row = self._rows.get(username)
+        if row is None:
+            return None
+        return dequantize(
+            self._vectors[row], self._get_scales(slice(row, row + 1)),
+        ).ravel().copy()
+
+    async def get_embeddings(
+        self, since: datetime | None = None,
+    ) -> EmbeddingChanges:
+        """
+        Получает вектора первых лиц верифицированных пользователей.
+
+        Время изменения пользователей не хранится, поэтому
+        всегда возвращаются все вектора.
+
+        :param since: Не используется
+        :type since: datetime | None
+        :return: Вектора пользователей и водяной знак
+        :rtype: EmbeddingChanges
+        """
+        size = len(self._rows)
+        vectors = dequantize(
+            self._vectors[:size], self._get_scales(slice(size)),
+        )
+        return EmbeddingChanges(
+            embeddings=list(zip(
+                self._usernames[:size].tolist(), vectors.copy(),
+            )),
+            removed=[],
+            watermark=datetime.now(timezone.utc),
+        )
+
+    async def close(self) -> None:
+        """Закрывает хранилище, данные в памяти не требуют закрытия."""
+
+    def search(
+        self,
+        vector: np.ndarray,
+        top_k: int = 5,
+        metric: DistanceMetric = DistanceMetric.cosine,
+    ) -> list[Match]:
+        """
+        Ищет пользователей с ближайшими векторами точным перебором.
+
+        :param vector: Вектор лица
+        :type vector: np.ndarray
+        :param top_k: Количество ближайших пользователей
+        :type top_k: int
+        :param metric: Метрика расстояния
+        :type metric: DistanceMetric
+        :return: Пользователи по возрастанию расстояния
+        :rtype: list[Match]
+        """
+        size = len(self._rows)
+        if not size:
+            return []
+        query, query_norm = normalize_query(vector)
+        norms = self._norms[:size]
+        similarities = get_similarities(
+            self._vectors[:size], self._scales[:size], query,
+        ) / np.maximum(norms, min_norm)
+        return to_matches(
+            self._usernames[:size],
+            get_distances(similarities, norms, query_norm, metric),
+            top_k,
+        )
+
     def create_user(self, user: User) -> User:
         """
         Создает пользователя в базе данных.
@@ -78,7 +223,7 @@ class InMemoryStorage:
             is_verified=True,
             user_id=self.users_count,
         )
-        self.users.append(indexed_user)
+        self._save_user(indexed_user)
         self.users_count += 1
         logger.info(f'Created user {indexed_user}')
         return indexed_user
@@ -94,15 +239,110 @@ class InMemoryStorage:
         :return: индексированная запись о пользователе.
         :rtype: User
         """
-        try:
-            in_db_user = [
-                member for member in self.users if (
-                    member.username == user.username
-                )
-            ][0]
-        except IndexError:
+        in_db_user = self.users.get(user.username)
+        if in_db_user is None:
             logger.warning(f'{user} is not found')
             return None
-
         logger.info(f'got {in_db_user}')
         return in_db_user
+
+    def get_user_by_id(self, user_id: int) -> User | None:
+        """
+        Получает пользователя по id.
+
+        :param user_id: id пользователя
+        :type user_id: int
+        :return: индексированная запись о пользователе.
+        :rtype: User | None
+        """
+        return self.users_by_id.get(user_id)
+
+    def _save_user(self, user: User) -> None:
+        previous_user = self.users.get(user.username)
+        if previous_user is not None and previous_user.user_id is not None:
+            self.users_by_id.pop(previous_user.user_id, None)
+        self.users[user.username] = user
+        if user.user_id is not None:
+            self.users_by_id[user.user_id] = user
+
+    def _save_model_embedding(
+        self, user: User, vector: list[dict[str, Any]], model_name: str,
+    ) -> User:
+        embedding = _get_first_embedding(vector)
+        if embedding is None:
+            self.model_embeddings.pop((user.username, model_name), None)
+        else:
+            self.model_embeddings[(user.username, model_name)] = embedding
+        verified_user = user.model_copy(update={'is_verified': True})
+        self._save_user(verified_user)
+        logger.info(f'Updated {model_name} vector of {verified_user}')
+        return verified_user
+
+    def _save_embedding(
+        self, username: str, vector: list[dict[str, Any]],
+    ) -> None:
+        embedding = _get_first_embedding(vector)
+        if embedding is not None and self._rows and (
+            len(embedding) != self._vectors.shape[1]
+        ):
+            logger.warning(
+                f'{username} vector dimension {len(embedding)} '
+                + f'!= {self._vectors.shape[1]}',
+            )
+            embedding = None
+        if embedding is None:
+            self._remove_row(username)
+            return
+        row = self._rows.get(username)
+        if row is None:
+            row = len(self._rows)
+            self._reserve(row + 1, len(embedding))
+            self._rows[username] = row
+            self._usernames[row] = username
+        values, scales = quantize(embedding, self.dtype)
+        self._vectors[row] = values
+        self._scales[row] = 1 if scales is None else scales
+        self._norms[row] = np.linalg.norm(embedding)
+
+    def _remove_row(self, username: str) -> None:
+        row = self._rows.pop(username, None)
+        if row is None:
+            return
+        last_row = len(self._rows)
+        if row != last_row:
+            last_username = self._usernames[last_row]
+            self._usernames[row] = last_username
+            self._vectors[row] = self._vectors[last_row]
+            self._norms[row] = self._norms[last_row]
+            self._scales[row] = self._scales[last_row]
+            self._rows[last_username] = row
+        self._usernames[last_row] = None
+
+    def _reserve(self, size: int, dim: int) -> None:
+        capacity = len(self._norms)
+        if size <= capacity and dim == self._vectors.shape[1]:
+            return
+        capacity = max(initial_capacity, capacity * 2)
+        used = len(self._rows)
+        vectors = np.empty((capacity, dim), dtype=self.dtype.value)
+        norms = np.empty(capacity, dtype=np.float32)
+        scales = np.empty(capacity, dtype=np.float32)
+        usernames = np.empty(capacity, dtype=object)
+        if used:
+            vectors[:used] = self._vectors[:used]
+            norms[:used] = self._norms[:used]
+            scales[:used] = self._scales[:used]
+            usernames[:used] = self._usernames[:used]
+        self._vectors, self._norms, self._usernames = vectors, norms, usernames
+        self._scales = scales
+
+    def _get_scales(self, rows: slice) -> np.ndarray | None:
+        if self.dtype != VectorDtype.int8:
+            return None
+        return self._scales[rows]
+
+
+def _get_first_embedding(vector: list[dict[str, Any]]) -> np.ndarray | None:
+    if not vector or 'embedding' not in vector[0]:
+        return None
+    return np.asarray(vector[0]['embedding'], dtype=np.float32).ravel()
@@ -0,0 +1 @@
+"""Пакет поисковых индексов векторов лиц."""
@@ -0,0 +1,381 @@
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Generic, NamedTuple, Protocol, TypeVar
+
+import numpy as np
+
+from app.core.embedding import VectorDtype, dequantize, quantize
+from app.core.face_verification import DistanceMetric
+from app.core.models import Match
+from app.external.index.search import (
+    get_distances,
+    normalize,
+    normalize_query,
+    stack_embeddings,
+    to_matches,
+)
+from app.external.index.snapshot import read_snapshot, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+class Segment(Protocol):
+    """
+    Неизменяемая часть индекса с нормированными векторами.
+
+    Вектора хранятся в типе индекса, масштабы векторов int8
+    хранятся в scales, для других типов масштабы равны единице.
+    """
+
+    usernames: np.ndarray
+    vectors: np.ndarray
+    norms: np.ndarray
+    scales: np.ndarray
+
+    def _asdict(self) -> dict[str, np.ndarray]:
+        ...  # noqa: WPS428 default Protocol syntax
+
+
+class _Delta(NamedTuple):
+    usernames: np.ndarray
+    vectors: np.ndarray
+    norms: np.ndarray
+
+
+SegmentT = TypeVar('SegmentT', bound=Segment)
+Rows = slice | np.ndarray
+
+
+class BaseIndex(Generic[SegmentT]):
+    """
+    Индекс векторов лиц с инкрементальными изменениями.
+
+    Основные вектора хранятся в неизменяемом сегменте. Новые
+    и измененные вектора добавляются в небольшой буфер, который
+    просматривается при каждом поиске полностью, а прежние строки
+    сегмента помечаются удаленными. Сжатие в фоне строит новый сегмент
+    из живых строк и буфера. Изменения, пришедшие во время сжатия,
+    записываются в журнал и применяются к новому сегменту,
+    поэтому сжатие не теряет изменений и не блокирует поиск.
+
+    Изменения после последнего сжатия считаются новее векторов,
+    переданных в build, поэтому изменения, пришедшие во время
+    загрузки векторов из хранилища, не теряются.
+
+    Сегмент можно сохранить в файл снимка и загрузить из него через
+    memmap: процессы, загрузившие один снимок, разделяют страницы
+    сегмента через кэш ОС.
+
+    Вектора сегмента хранятся в типе dtype: float16 занимает вдвое,
+    int8 со своим масштабом для каждого вектора - вчетверо меньше
+    памяти, чем float32. Буфер изменений хранится во float32.
+    """
+
+    def __init__(self, dtype: VectorDtype | str = VectorDtype.float32) -> None:
+        """
+        Метод инициализации.
+
+        :param dtype: Тип значений векторов сегмента
+        :type dtype: VectorDtype | str
+        """
+        self.dtype = VectorDtype(dtype)
+        self.is_built: bool = False
+        self._lock = threading.Lock()
+        self._maintenance_lock = threading.Lock()
+        self._dim: int | None = None
+        self._segment: SegmentT = self._create_segment(
+            np.empty(0, dtype=object),
+            np.empty((0, 0), dtype=np.float32),
+            np.empty(0, dtype=np.float32),
+        )
+        self._positions: dict[str, int] = {}
+        self._tombstones = np.zeros(0, dtype=bool)
+        self._tombstones_count = 0
+        self._delta_vectors: dict[str, np.ndarray] = {}
+        self._delta: _Delta | None = None
+        self._removed: set[str] = set()
+        self._journal: set[str] | None = None
+
+    def __len__(self) -> int:
+        """
+        Количество живых векторов в индексе.
+
+        :return: Количество векторов
+        :rtype: int
+        """
+        return (
+            len(self._segment.usernames)
+            - self._tombstones_count
+            + len(self._delta_vectors)
+        )
+
+    @property
+    def needs_compaction(self) -> bool:
+        """
+        Есть изменения, которые еще не перенесены в сегмент.
+
+        :return: True если сжатие изменит индекс
+        :rtype: bool
+        """
+        return bool(
+            self._delta_vectors or self._tombstones_count or self._removed,
+        )
+
+    def build(self, embeddings: list[tuple[str, np.ndarray]]) -> None:
+        """
+        Строит индекс по векторам пользователей.
+
+        :param embeddings: Имена пользователей и вектора их лиц
+        :type embeddings: list[tuple[str, np.ndarray]]
+        :raises ValueError: Если вектора разной размерности
+        """
+        usernames, vectors = stack_embeddings(embeddings)
+        vectors, norms = normalize(vectors)
+        with self._maintenance_lock:
+            self._swap(
+                self._create_segment(usernames, vectors, norms),
+                lambda: set(self._delta_vectors) | self._removed,
+            )
+        self.is_built = True
+        logger.info(f'index is built with {len(usernames)} vectors')
+
+    def upsert(self, username: str, vector: np.ndarray) -> None:
+        """
+        Добавляет или заменяет вектор пользователя.
+
+        :param username: Имя пользователя
+        :type username: str
+        :param vector: Вектор лица
+        :type vector: np.ndarray
+        :raises ValueError: Если размерность вектора не совпадает
+        """
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        with self._lock:
+            if self._dim is None:
+                self._dim = len(vector)
+            elif len(vector) != self._dim:
+                raise ValueError(
+                    f'vector dimension {len(vector)} != {self._dim}',
+                )
+            self._tombstone(username)
+            self._delta_vectors[username] = vector
+            self._removed.discard(username)
+            self._record(username)
+
+    def remove(self, username: str) -> None:
+        """
+        Удаляет вектор пользователя.
+
+        :param username: Имя пользователя
+        :type username: str
+        """
+        with self._lock:
+            self._tombstone(username)
+            self._delta_vectors.pop(username, None)
+            self._removed.add(username)
+            self._record(username)
+
+    def compact(self) -> None:
+        """
+        Переносит изменения в новый сегмент.
+
+        Новый сегмент строится без блокировки поиска и изменений.
+        """
+        with self._maintenance_lock:
+            with self._lock:
+                if not self.needs_compaction:
+                    return
+                segment = self._segment
+                live = ~self._tombstones
+                delta = self._get_delta()
+                self._journal = set()
+            parts = [delta]
+            if live.any():
+                parts.insert(0, _Delta(
+                    usernames=segment.usernames[live],
+                    vectors=dequantize(
+                        segment.vectors[live], segment.scales[live],
+                    ),
+                    norms=segment.norms[live],
+                ))
+            new_segment = self._create_segment(*[
+                np.concatenate(arrays) for arrays in zip(*parts)
+            ])
+            self._swap(new_segment, lambda: self._journal or set())
+        logger.info(f'index is compacted to {len(new_segment.usernames)}')
+
+    def save_snapshot(self, path: str | Path, watermark: datetime) -> None:
+        """
+        Сохраняет сегмент индекса в файл снимка.
+
+        Изменения, еще не перенесенные в сегмент, в снимок не попадают,
+        поэтому перед сохранением индекс нужно сжать. После записи
+        сегмент читается из записанного файла, и его память
+        освобождается в пользу кэша ОС.
+
+        :param path: Путь к файлу снимка
+        :type path: str | Path
+        :param watermark: Время, до которого изменения есть в сегменте
+        :type watermark: datetime
+        """
+        with self._maintenance_lock:
+            segment = self._segment
+            snapshot = write_snapshot(path, segment._asdict(), watermark)
+            mapped_segment = self._restore_segment(snapshot.arrays)
+            with self._lock:
+                if self._segment is segment:
+                    self._segment = mapped_segment
+        logger.info(f'index snapshot is saved to {path}')
+
+    def load_snapshot(self, path: str | Path) -> datetime | None:
+        """
+        Загружает сегмент индекса из файла снимка без копирования.
+
+        Отсутствующий или поврежденный файл пропускается,
+        индекс остается прежним.
+
+        :param path: Путь к файлу снимка
+        :type path: str | Path
+        :return: Водяной знак снимка или None, если снимок не загружен
+        :rtype: datetime | None
+        """
+        try:
+            snapshot = read_snapshot(path)
+            segment = self._restore_segment(snapshot.arrays)
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            logger.warning(f"can't load index snapshot from {path}: {error}")
+            return None
+        with self._maintenance_lock:
+            self._swap(
+                segment, lambda: set(self._delta_vectors) | self._removed,
+            )
+        self.is_built = True
+        logger.info(
+            f'index snapshot is loaded with {len(segment.usernames)} vectors',
+        )
+        return snapshot.watermark
+
+    def search(
+        self,
+        vector: np.ndarray,
+        top_k: int = 5,
+        metric: DistanceMetric = DistanceMetric.cosine,
+        approximate: bool = True,
+    ) -> list[Match]:
+        """
+        Ищет пользователей с ближайшими векторами.
+
+        :param vector: Вектор лица
+        :type vector: np.ndarray
+        :param top_k: Количество ближайших пользователей
+        :type top_k: int
+        :param metric: Метрика расстояния
+        :type metric: DistanceMetric
+        :param approximate: Разрешить приближенный поиск, если индекс
+            его поддерживает
+        :type approximate: bool
+        :return: Пользователи по возрастанию расстояния
+        :rtype: list[Match]
+        """
+        with self._lock:
+            segment, tombstones = self._segment, self._tombstones
+            delta = self._get_delta()
+        query, query_norm = normalize_query(vector)
+        matches: list[Match] = []
+        if len(delta.usernames):
+            matches = to_matches(
+                delta.usernames,
+                get_distances(
+                    delta.vectors @ query, delta.norms, query_norm, metric,
+                ),
+                top_k,
+            )
+        if len(segment.usernames):
+            rows, distances = self._search_segment(
+                segment, query, query_norm, metric, approximate,
+            )
+            distances[tombstones[rows]] = np.inf
+            matches.extend(
+                to_matches(segment.usernames[rows], distances, top_k),
+            )
+        matches.sort(key=lambda match: match.distance)
+        return matches[:top_k]
+
+    def _create_segment(
+        self, usernames: np.ndarray, vectors: np.ndarray, norms: np.ndarray,
+    ) -> SegmentT:
+        raise NotImplementedError
+
+    def _quantize(self, vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        values, scales = quantize(vectors, self.dtype)
+        if scales is None:
+            scales = np.ones(len(values), dtype=np.float32)
+        return values, scales
+
+    def _restore_segment(self, arrays: dict[str, np.ndarray]) -> SegmentT:
+        raise NotImplementedError
+
+    def _search_segment(  # noqa: WPS211 search arguments
+        self,
+        segment: SegmentT,
+        query: np.ndarray,
+        query_norm: float,
+        metric: DistanceMetric,
+        approximate: bool,
+    ) -> tuple[Rows, np.ndarray]:
+        raise NotImplementedError
+
+    def _swap(
+        self, segment: SegmentT, get_changed: Callable[[], set[str]],
+    ) -> None:
+        positions = {
+            username: position
+            for position, username in enumerate(segment.usernames.tolist())
+        }
+        with self._lock:
+            changed = get_changed()
+            tombstones = np.zeros(len(positions), dtype=bool)
+            for username in changed:
+                position = positions.get(username)
+                if position is not None:
+                    tombstones[position] = True
+            self._segment = segment
+            self._positions = positions
+            self._tombstones = tombstones
+            self._tombstones_count = int(tombstones.sum())
+            self._delta_vectors = {
+                username: vector
+                for username, vector in self._delta_vectors.items()
+                if username in changed
+            }
+            self._delta = None
+            self._removed = set()
+            self._journal = None
+            if len(positions):
+                self._dim = segment.vectors.shape[1]
+
+    def _tombstone(self, username: str) -> None:
+        position = self._positions.get(username)
+        if position is not None and not self._tombstones[position]:
+            self._tombstones[position] = True
+            self._tombstones_count += 1
+
+    def _record(self, username: str) -> None:
+        self._delta = None
+        if self._journal is not None:
+            self._journal.add(username)
+
+    def _get_delta(self) -> _Delta:
+        if self._delta is None:
+            usernames, vectors = stack_embeddings(
+                list(self._delta_vectors.items()),
+            )
+            vectors, norms = normalize(vectors)
+            self._delta = _Delta(
+                usernames=usernames,
+                vectors=vectors.reshape(len(vectors), self._dim or 0),
+                norms=norms,
+            )
+        return self._delta
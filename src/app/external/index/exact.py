@@ -0,0 +1,51 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from app.core.face_verification import DistanceMetric
+from app.external.index.base import BaseIndex, Rows
+from app.external.index.search import get_distances, get_similarities
+
+
+class _ExactSegment(NamedTuple):
+    usernames: np.ndarray
+    vectors: np.ndarray
+    norms: np.ndarray
+    scales: np.ndarray
+
+
+class ExactIndex(BaseIndex[_ExactSegment]):
+    """
+    Точный поиск ближайших векторов лиц.
+
+    Хранит нормированные вектора пользователей в одной матрице
+    типа индекса и их нормы. Расстояния до всех векторов считаются
+    матричным умножением, ближайшие вектора выбираются через
+    np.argpartition. Параметр approximate при поиске не используется.
+    """
+
+    def _create_segment(
+        self, usernames: np.ndarray, vectors: np.ndarray, norms: np.ndarray,
+    ) -> _ExactSegment:
+        values, scales = self._quantize(vectors)
+        return _ExactSegment(
+            usernames=usernames, vectors=values, norms=norms, scales=scales,
+        )
+
+    def _restore_segment(
+        self, arrays: dict[str, np.ndarray],
+    ) -> _ExactSegment:
+        return _ExactSegment(**arrays)
+
+    def _search_segment(  # noqa: WPS211 search arguments
+        self,
+        segment: _ExactSegment,
+        query: np.ndarray,
+        query_norm: float,
+        metric: DistanceMetric,
+        approximate: bool,
+    ) -> tuple[Rows, np.ndarray]:
+        similarities = get_similarities(segment.vectors, segment.scales, query)
+        return slice(None), get_distances(
+            similarities, segment.norms, query_norm, metric,
+        )
@@ -0,0 +1,183 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from app.core.embedding import VectorDtype
+from app.core.face_verification import DistanceMetric
+from app.external.index.base import BaseIndex, Rows
+from app.external.index.search import (
+    get_distances,
+    get_similarities,
+    normalize,
+    select_nearest,
+)
+
+points_per_centroid = 256
+assign_chunk_size = 8192
+
+
+class _IVFSegment(NamedTuple):
+    usernames: np.ndarray
+    vectors: np.ndarray
+    norms: np.ndarray
+    scales: np.ndarray
+    centroids: np.ndarray
+    offsets: np.ndarray
+
+
+class IVFIndex(BaseIndex[_IVFSegment]):
+    """
+    Приближенный поиск ближайших векторов лиц IVF-flat.
+
+    Нормированные вектора делятся на nlist списков по ближайшему
+    центроиду, центроиды обучаются сферическим k-means на выборке
+    до nlist * points_per_centroid векторов. Вектора хранятся
+    отсортированными по спискам, поэтому каждый список является
+    непрерывным срезом матрицы. При приближенном поиске
+    просматриваются nprobe списков с ближайшими центроидами:
+    больший nprobe повышает полноту ценой задержки.
+    Поиск без приближения просматривает все списки.
+
+    Обученные центроиды сохраняются в снимке индекса
+    и переиспользуются при следующих построениях и сжатиях.
+    """
+
+    def __init__(
+        self,
+        nlist: int = 1024,
+        nprobe: int = 16,
+        train_iterations: int = 20,
+        seed: int = 0,
+        dtype: VectorDtype | str = VectorDtype.float32,
+    ) -> None:
+        """
+        Метод инициализации.
+
+        :param nlist: Количество списков
+        :type nlist: int
+        :param nprobe: Количество просматриваемых списков
+        :type nprobe: int
+        :param train_iterations: Количество итераций k-means
+        :type train_iterations: int
+        :param seed: Начальное значение генератора случайных чисел
+        :type seed: int
+        :param dtype: Тип значений векторов сегмента
+        :type dtype: VectorDtype | str
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iterations = train_iterations
+        self._rng = np.random.default_rng(seed)
+        self._centroids = np.empty((0, 0), dtype=np.float32)
+        self._retrain = False
+        super().__init__(dtype)
+
+    def build(
+        self, embeddings: list[tuple[str, np.ndarray]], retrain: bool = False,
+    ) -> None:
+        """
+        Строит индекс по векторам пользователей.
+
+        :param embeddings: Имена пользователей и вектора их лиц
+        :type embeddings: list[tuple[str, np.ndarray]]
+        :param retrain: Обучить центроиды заново
+        :type retrain: bool
+        """
+        self._retrain = retrain
+        try:
+            super().build(embeddings)
+        finally:
+            self._retrain = False
+
+    def _create_segment(
+        self, usernames: np.ndarray, vectors: np.ndarray, norms: np.ndarray,
+    ) -> _IVFSegment:
+        nlist = min(self.nlist, len(vectors))
+        centroids = self._centroids
+        if self._retrain or centroids.shape != (nlist, vectors.shape[1]):
+            centroids = self._train(vectors, nlist)
+            self._centroids = centroids
+        assignment = _assign(vectors, centroids)
+        order = np.argsort(assignment, kind='stable')
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(assignment, minlength=len(centroids)),
+            out=offsets[1:],
+        )
+        values, scales = self._quantize(vectors[order])
+        return _IVFSegment(
+            usernames=usernames[order],
+            vectors=values,
+            norms=norms[order],
+            scales=scales,
+            centroids=centroids,
+            offsets=offsets,
+        )
+
+    def _restore_segment(self, arrays: dict[str, np.ndarray]) -> _IVFSegment:
+        segment = _IVFSegment(**arrays)
+        self._centroids = segment.centroids
+        return segment
+
+    def _search_segment(  # noqa: WPS211 search arguments
+        self,
+        segment: _IVFSegment,
+        query: np.ndarray,
+        query_norm: float,
+        metric: DistanceMetric,
+        approximate: bool,
+    ) -> tuple[Rows, np.ndarray]:
+        if not approximate or self.nprobe >= len(segment.centroids):
+            return slice(None), get_distances(
+                get_similarities(segment.vectors, segment.scales, query),
+                segment.norms,
+                query_norm,
+                metric,
+            )
+        offsets = segment.offsets
+        lists = select_nearest(-(segment.centroids @ query), self.nprobe)
+        rows = np.concatenate([
+            np.arange(offsets[index], offsets[index + 1]) for index in lists
+        ])
+        similarities = np.concatenate([
+            get_similarities(
+                segment.vectors[offsets[index]:offsets[index + 1]],
+                segment.scales[offsets[index]:offsets[index + 1]],
+                query,
+            )
+            for index in lists
+        ])
+        return rows, get_distances(
+            similarities, segment.norms[rows], query_norm, metric,
+        )
+
+    def _train(self, vectors: np.ndarray, nlist: int) -> np.ndarray:
+        if not nlist:
+            return np.empty((0, vectors.shape[1]), dtype=np.float32)
+        sample_size = min(len(vectors), nlist * points_per_centroid)
+        sample = vectors[
+            self._rng.choice(len(vectors), sample_size, replace=False)
+        ]
+        centroids = sample[
+            self._rng.choice(sample_size, nlist, replace=False)
+        ].copy()
+        for _ in range(self.train_iterations):
+            assignment = _assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = np.bincount(assignment, minlength=nlist) == 0
+            sums[empty] = sample[
+                self._rng.choice(sample_size, int(empty.sum()))
+            ]
+            centroids, _ = normalize(sums)
+        return centroids
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assignment = np.empty(len(vectors), dtype=np.intp)
+    for start in range(0, len(vectors), assign_chunk_size):
+        chunk = vectors[start:start + assign_chunk_size]
+        assignment[start:start + assign_chunk_size] = np.argmax(
+            chunk @ centroids.T, axis=1,
+        )
+    return assignment
@@ -0,0 +1,169 @@
+import numpy as np
+
+from app.core.face_verification import DistanceMetric
+from app.core.models import Match
+
+min_norm = 1e-10
+similarity_chunk_size = 16384
+
+
+def normalize(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Нормирует вектора на месте.
+
+    :param vectors: Матрица векторов float32
+    :type vectors: np.ndarray
+    :return: Нормированная матрица и нормы исходных векторов
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    norms = np.linalg.norm(vectors, axis=1)
+    vectors /= np.maximum(norms, min_norm)[:, np.newaxis]
+    return vectors, norms
+
+
+def normalize_query(vector: np.ndarray) -> tuple[np.ndarray, float]:
+    """
+    Нормирует вектор запроса.
+
+    :param vector: Вектор лица
+    :type vector: np.ndarray
+    :return: Нормированный вектор float32 и норма исходного вектора
+    :rtype: tuple[np.ndarray, float]
+    """
+    query = np.asarray(vector, dtype=np.float32).ravel()
+    query_norm = float(np.linalg.norm(query))
+    return query / max(query_norm, min_norm), query_norm
+
+
+def get_similarities(
+    vectors: np.ndarray, scales: np.ndarray, query: np.ndarray,
+) -> np.ndarray:
+    """
+    Считает скалярные произведения векторов с вектором запроса.
+
+    Матрица float32 умножается на запрос целиком. Матрицы float16
+    и int8 переводятся во float32 частями по similarity_chunk_size
+    строк, поэтому восстановленная копия матрицы не создается,
+    а масштабы векторов int8 умножаются на готовые произведения.
+
+    :param vectors: Матрица векторов float32, float16 или int8
+    :type vectors: np.ndarray
+    :param scales: Масштабы векторов, для int8 не равны единице
+    :type scales: np.ndarray
+    :param query: Вектор запроса float32
+    :type query: np.ndarray
+    :return: Скалярные произведения float32
+    :rtype: np.ndarray
+    """
+    if vectors.dtype == np.float32:
+        return vectors @ query
+    similarities = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), similarity_chunk_size):
+        stop = start + similarity_chunk_size
+        np.matmul(
+            vectors[start:stop].astype(np.float32),
+            query,
+            out=similarities[start:stop],
+        )
+    if vectors.dtype == np.int8:
+        similarities *= scales
+    return similarities
+
+
+def get_distances(
+    similarities: np.ndarray,
+    norms: np.ndarray,
+    query_norm: float,
+    metric: DistanceMetric,
+) -> np.ndarray:
+    """
+    Считает расстояния по косинусному сходству и нормам векторов.
+
+    Евклидово расстояние восстанавливается из сходства и норм,
+    поэтому все метрики считаются по одному матричному умножению.
+
+    :param similarities: Косинусное сходство с вектором запроса
+    :type similarities: np.ndarray
+    :param norms: Нормы векторов
+    :type norms: np.ndarray
+    :param query_norm: Норма вектора запроса
+    :type query_norm: float
+    :param metric: Метрика расстояния
+    :type metric: DistanceMetric
+    :return: Расстояния до вектора запроса
+    :rtype: np.ndarray
+    """
+    if metric == DistanceMetric.cosine:
+        return 1 - similarities
+    if metric == DistanceMetric.euclidean_l2:
+        return np.sqrt(np.maximum(2 - 2 * similarities, 0))
+    squared = (
+        norms ** 2 + query_norm ** 2 - 2 * query_norm * norms * similarities
+    )
+    return np.sqrt(np.maximum(squared, 0))
+
+
+def select_nearest(distances: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    Выбирает индексы top_k наименьших расстояний.
+
+    :param distances: Расстояния
+    :type distances: np.ndarray
+    :param top_k: Количество ближайших векторов
+    :type top_k: int
+    :return: Индексы по возрастанию расстояния
+    :rtype: np.ndarray
+    """
+    top_k = min(top_k, len(distances))
+    if top_k < 1:
+        return np.empty(0, dtype=np.intp)
+    nearest = np.argpartition(distances, top_k - 1)[:top_k]
+    return nearest[np.argsort(distances[nearest])]
+
+
+def stack_embeddings(
+    embeddings: list[tuple[str, np.ndarray]],
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Собирает имена пользователей и вектора в массивы.
+
+    :param embeddings: Имена пользователей и вектора их лиц
+    :type embeddings: list[tuple[str, np.ndarray]]
+    :return: Массив имен и матрица векторов float32
+    :rtype: tuple[np.ndarray, np.ndarray]
+    :raises ValueError: Если вектора разной размерности
+    """
+    if not embeddings:
+        return np.empty(0, dtype=object), np.empty((0, 0), dtype=np.float32)
+    usernames, vectors = zip(*embeddings)
+    matrix = np.stack(vectors).astype(np.float32, copy=False)
+    if matrix.ndim != 2:
+        raise ValueError('embeddings must be vectors')
+    return np.array(usernames, dtype=object), matrix
+
+
+def to_matches(
+    usernames: np.ndarray, distances: np.ndarray, top_k: int,
+) -> list[Match]:
+    """
+    Выбирает top_k ближайших пользователей.
+
+    Удаленные вектора с бесконечным расстоянием пропускаются.
+
+    :param usernames: Имена пользователей
+    :type usernames: np.ndarray
+    :param distances: Расстояния до векторов пользователей
+    :type distances: np.ndarray
+    :param top_k: Количество ближайших пользователей
+    :type top_k: int
+    :return: Пользователи по возрастанию расстояния
+    :rtype: list[Match]
+    """
+    nearest = select_nearest(distances, top_k)
+    nearest = nearest[np.isfinite(distances[nearest])]
+    return [
+        Match(username=username, distance=distance)
+        for username, distance in zip(
+            usernames[nearest].tolist(), distances[nearest].tolist(),
+        )
+    ]
@@ -0,0 +1,122 @@
+"""
+Файл снимка индекса векторов лиц.
+
+Формат версии 1, все значения little-endian:
+
+- заголовок ``<4sHHd``: сигнатура ``FVIS``, версия формата,
+  количество массивов, водяной знак в секундах unix time;
+- для каждого массива описание ``<16s16sBQQQ``: имя, dtype,
+  количество измерений, размеры и смещение данных от начала файла;
+- данные массивов, выровненные по 64 байта.
+
+Массивы читаются через ``numpy.memmap`` без копирования, поэтому
+процессы, открывшие один файл, разделяют страницы через кэш ОС.
+Массивы строк python хранятся как строки фиксированной длины.
+"""
+import os
+import struct
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+magic = b'FVIS'
+format_version = 1
+alignment = 64
+
+_header = struct.Struct('<4sHHd')
+_array_header = struct.Struct('<16s16sBQQQ')
+_max_ndim = 2
+
+
+class Snapshot(NamedTuple):
+    """Массивы снимка индекса и его водяной знак."""
+
+    arrays: dict[str, np.ndarray]
+    watermark: datetime
+
+
+def write_snapshot(
+    path: str | Path, arrays: dict[str, np.ndarray], watermark: datetime,
+) -> Snapshot:
+    """
+    Записывает снимок и открывает записанный файл.
+
+    Файл записывается рядом и атомарно заменяет прежний снимок.
+    Возвращаемые массивы отображают именно записанный файл,
+    даже если другой процесс успел заменить снимок.
+
+    :param path: Путь к файлу снимка
+    :type path: str | Path
+    :param arrays: Массивы не более чем двух измерений
+    :type arrays: dict[str, np.ndarray]
+    :param watermark: Время, до которого изменения есть в снимке
+    :type watermark: datetime
+    :return: Снимок, открытый через memmap
+    :rtype: Snapshot
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    arrays = {
+        name: array.astype(str) if array.dtype == object else array
+        for name, array in arrays.items()
+    }
+    offset = _align(_header.size + _array_header.size * len(arrays))
+    descriptions = []
+    for name, array in arrays.items():
+        shape = (*array.shape, 0)[:_max_ndim]
+        descriptions.append(_array_header.pack(
+            name.encode(), array.dtype.str.encode(), array.ndim, *shape, offset,
+        ))
+        offset = _align(offset + array.nbytes)
+    with open(tmp_path, 'wb') as snapshot_file:
+        snapshot_file.write(_header.pack(
+            magic, format_version, len(arrays), watermark.timestamp(),
+        ))
+        snapshot_file.write(b''.join(descriptions))
+        for description, array in zip(descriptions, arrays.values()):
+            snapshot_file.seek(_array_header.unpack(description)[-1])
+            snapshot_file.write(np.ascontiguousarray(array).tobytes())
+        snapshot_file.truncate(offset)
+    snapshot = read_snapshot(tmp_path)
+    os.replace(tmp_path, path)
+    return snapshot
+
+
+def read_snapshot(path: str | Path) -> Snapshot:
+    """
+    Открывает снимок через memmap без копирования данных.
+
+    :param path: Путь к файлу снимка
+    :type path: str | Path
+    :return: Снимок с массивами только для чтения
+    :rtype: Snapshot
+    :raises ValueError: Если файл не является снимком
+    """
+    buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    if len(buffer) < _header.size:
+        raise ValueError(f'{path} is not an index snapshot')
+    file_magic, version, arrays_count, timestamp = _header.unpack_from(buffer)
+    if file_magic != magic or version != format_version:
+        raise ValueError(f'{path} is not an index snapshot')
+    arrays = {}
+    for index in range(arrays_count):
+        name, dtype, ndim, *shape, offset = _array_header.unpack_from(
+            buffer, _header.size + index * _array_header.size,
+        )
+        arrays[name.rstrip(b'\0').decode()] = np.ndarray(
+            tuple(shape[:ndim]),
+            dtype=np.dtype(dtype.rstrip(b'\0').decode()),
+            buffer=buffer,
+            offset=offset,
+        )
+    return Snapshot(
+        arrays=arrays,
+        watermark=datetime.fromtimestamp(timestamp, tz=timezone.utc),
+    )
+
+
+def _align(offset: int) -> int:
+    return -(-offset // alignment) * alignment
@@ -1,44 +1,270 @@
+import asyncio
 import json
 import logging
+from collections import defaultdict
 from datetime import datetime
 from pathlib import Path
+from typing import NamedTuple
 
-from aiokafka import AIOKafkaConsumer
+from aiokafka import (
+    AIOKafkaConsumer,
+    ConsumerRebalanceListener,
+    ConsumerRecord,
+    TopicPartition,
+)
+from aiokafka.errors import CommitFailedError, IllegalStateError
 
 from app.core.config import get_settings
 from app.core.face_verification import FaceVerificationService
+from app.core.models import Message
+from app.metrics import pipeline as metrics
 
 logger = logging.getLogger(__name__)
 
 
+class ConsumedMessage(NamedTuple):
+    """Сообщение с его положением в партиции."""
+
+    partition: TopicPartition
+    offset: int
+    message: Message
+
+
+class OffsetTracker:
+    """
+    Отслеживает обработку сообщений в партициях.
+
+    Сообщения завершают обработку не по порядку, поэтому для каждой
+    партиции коммитится только смещение, до которого все сообщения
+    обработаны успешно.
+    """
+
+    def __init__(self) -> None:
+        """Метод инициализации."""
+        self._in_flight: defaultdict[TopicPartition, set[int]] = (
+            defaultdict(set)
+        )
+        self._completed: dict[TopicPartition, int] = {}
+        self._failed: dict[TopicPartition, int] = {}
+        self._committed: dict[TopicPartition, int] = {}
+
+    def add(self, partition: TopicPartition, offset: int) -> None:
+        """
+        Добавляет сообщение в обработку.
+
+        :param partition: Партиция
+        :type partition: TopicPartition
+        :param offset: Смещение сообщения
+        :type offset: int
+        """
+        self._in_flight[partition].add(offset)
+
+    def complete(self, partition: TopicPartition, offset: int) -> None:
+        """
+        Отмечает сообщение обработанным.
+
+        :param partition: Партиция
+        :type partition: TopicPartition
+        :param offset: Смещение сообщения
+        :type offset: int
+        """
+        self._in_flight[partition].discard(offset)
+        self._completed[partition] = max(
+            self._completed.get(partition, 0), offset + 1,
+        )
+
+    def fail(self, partition: TopicPartition, offset: int) -> None:
+        """
+        Отмечает сообщение не обработанным.
+
+        :param partition: Партиция
+        :type partition: TopicPartition
+        :param offset: Смещение сообщения
+        :type offset: int
+        """
+        self._in_flight[partition].discard(offset)
+        self._failed[partition] = min(
+            self._failed.get(partition, offset), offset,
+        )
+
+    def committable(self) -> dict[TopicPartition, int]:
+        """
+        Возвращает смещения партиций, которые можно закоммитить.
+
+        :return: Следующее смещение для чтения по партициям
+        :rtype: dict[TopicPartition, int]
+        """
+        offsets = {}
+        for partition, completed in self._completed.items():
+            watermark = min(
+                completed,
+                *self._in_flight[partition],
+                self._failed.get(partition, completed),
+            )
+            if watermark > self._committed.get(partition, -1):
+                offsets[partition] = watermark
+        return offsets
+
+    def commit(self, offsets: dict[TopicPartition, int]) -> None:
+        """
+        Сохраняет закоммиченные смещения.
+
+        :param offsets: Закоммиченные смещения по партициям
+        :type offsets: dict[TopicPartition, int]
+        """
+        self._committed.update(offsets)
+
+    def pop_failed(self) -> dict[TopicPartition, int]:
+        """
+        Возвращает смещения первых не обработанных сообщений.
+
+        Сообщения партиции после не обработанного сообщения
+        будут прочитаны повторно, поэтому их состояние сбрасывается.
+
+        :return: Смещения для повторного чтения по партициям
+        :rtype: dict[TopicPartition, int]
+        """
+        failed, self._failed = self._failed, {}
+        for partition, offset in failed.items():
+            self._in_flight[partition].clear()
+            self._completed[partition] = offset
+        return failed
+
+    def revoke(self, partitions: set[TopicPartition]) -> None:
+        """
+        Удаляет состояние партиций, отозванных у consumer.
+
+        :param partitions: Отозванные партиции
+        :type partitions: set[TopicPartition]
+        """
+        for partition in partitions:
+            self._in_flight.pop(partition, None)
+            self._completed.pop(partition, None)
+            self._failed.pop(partition, None)
+            self._committed.pop(partition, None)
+
+
+class RebalanceListener(ConsumerRebalanceListener):
+    """
+    Слушатель перебалансировки группы consumer.
+
+    Перед отзывом партиций коммитит обработанные смещения
+    и удаляет состояние отозванных партиций.
+    """
+
+    def __init__(self, consumer: 'KafkaConsumer') -> None:
+        """
+        Метод инициализации.
+
+        :param consumer: Очередь сообщений, у которой отзываются партиции
+        :type consumer: KafkaConsumer
+        """
+        self.consumer = consumer
+
+    async def on_partitions_revoked(
+        self, revoked: set[TopicPartition],
+    ) -> None:
+        """
+        Коммитит смещения и удаляет состояние отозванных партиций.
+
+        :param revoked: Отозванные партиции
+        :type revoked: set[TopicPartition]
+        """
+        await self.consumer.revoke(revoked)
+
+    async def on_partitions_assigned(
+        self, assigned: set[TopicPartition],
+    ) -> None:
+        """
+        Логирует назначенные партиции.
+
+        :param assigned: Назначенные партиции
+        :type assigned: set[TopicPartition]
+        """
+        logger.info(f'assigned partitions {assigned}')
+
+
 class KafkaConsumer:
     """Очередь сообщений кафка."""
 
-    def __init__(self, service: FaceVerificationService) -> None:
+    def __init__(
+        self,
+        service: FaceVerificationService,
+        client: AIOKafkaConsumer | None = None,
+    ) -> None:
         """
         Метод инициализации.
 
         :param service: Сервис верификации изображения.
         :type service: FaceVerificationService
+        :param client: Клиент kafka, по умолчанию создается по конфигурации.
+        :type client: AIOKafkaConsumer | None
         """
         self.service = service
+        self.tracker = OffsetTracker()
 
-        self.consumer = AIOKafkaConsumer(
-            get_settings().kafka.topics,
-            bootstrap_servers=get_settings().kafka.host,
-            value_deserializer=self.deserializer,
-        )
+        if client is None:
+            client = AIOKafkaConsumer(
+                bootstrap_servers=get_settings().kafka.host,
+                group_id=get_settings().kafka.group_id,
+                enable_auto_commit=get_settings().kafka.enable_auto_commit,
+                value_deserializer=self.deserializer,
+            )
+            client.subscribe(
+                [get_settings().kafka.topics],
+                listener=RebalanceListener(self),
+            )
+        self.consumer = client
 
         self._init_storage_path()
 
     async def consume(self) -> None:
-        """Функция для обработки сообщений kafka."""
+        """
+        Функция для обработки сообщений kafka.
+
+        Если в конфигурации batch_size больше 1,
+        сообщения обрабатываются микропакетами.
+        Смещение сообщения коммитится после его обработки,
+        при ошибке сообщение читается повторно.
+        """
+        if get_settings().kafka.batch_size > 1:
+            await self.consume_batches()
+            return
         while True:  # noqa: WPS457 kafka running
             async for msg in self.consumer:
-                message: dict[str, str] = msg.value
-                username = message.get('username', '')
-                img_path = message.get('file_path', '')
-                await self.service.verify(username=username, img_path=img_path)
+                consumed = self._get_consumed_message(msg)
+                self._observe_lag([consumed])
+                self.tracker.add(consumed.partition, consumed.offset)
+                await self._verify(consumed)
+                await self._commit()
+                await self._seek_failed()
+
+    async def consume_batches(self) -> None:
+        """
+        Функция для обработки сообщений kafka микропакетами.
+
+        Читает пакет до batch_size сообщений, накопленный за linger_ms,
+        и обрабатывает его микропакетами с ограничением
+        количества одновременно обрабатываемых микропакетов.
+        Сообщения одного пользователя обрабатываются по порядку.
+        Смещения коммитятся после обработки каждой волны сообщений,
+        при ошибке сообщения партиции читаются повторно.
+        """
+        settings = get_settings().kafka
+        semaphore = asyncio.Semaphore(settings.max_in_flight)
+        while True:  # noqa: WPS457 kafka running
+            records = await self._get_batch(
+                settings.batch_size, settings.linger_ms,
+            )
+            consumed_messages = [
+                self._get_consumed_message(record) for record in records
+            ]
+            self._observe_lag(consumed_messages)
+            metrics.batch_size.labels('messages').observe(
+                len(consumed_messages),
+            )
+            await self._process_batch(consumed_messages, semaphore)
+            await self._seek_failed()
 
     async def start(self) -> None:
         """Запускает consumer."""
@@ -48,6 +274,21 @@ class KafkaConsumer:
         """Останавливает consumer."""
         await self.consumer.stop()
 
+    async def revoke(self, partitions: set[TopicPartition]) -> None:
+        """
+        Коммитит обработанные смещения и забывает отозванные партиции.
+
+        Сообщения отозванных партиций, которые еще обрабатываются,
+        после перебалансировки не коммитятся и не читаются повторно
+        этим consumer.
+
+        :param partitions: Отозванные партиции
+        :type partitions: set[TopicPartition]
+        """
+        logger.info(f'revoking partitions {partitions}')
+        await self._commit()
+        self.tracker.revoke(partitions)
+
     def deserializer(self, serialized: bytes) -> dict[str, str]:
         """
         Десериализирует сообщение после получения в kafra.
@@ -59,6 +300,152 @@ class KafkaConsumer:
         """
         return json.loads(serialized)  # type: ignore
 
+    async def _get_batch(
+        self, batch_size: int, linger_ms: int,
+    ) -> list[ConsumerRecord]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + linger_ms / 1000
+        records: list[ConsumerRecord] = []
+        while len(records) < batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            fetched = await self.consumer.getmany(
+                timeout_ms=int(timeout * 1000),
+                max_records=batch_size - len(records),
+            )
+            records.extend(
+                record
+                for partition_records in fetched.values()
+                for record in partition_records
+            )
+        return records
+
+    async def _process_batch(
+        self,
+        consumed_messages: list[ConsumedMessage],
+        semaphore: asyncio.Semaphore,
+    ) -> None:
+        micro_batch_size = get_settings().kafka.micro_batch_size
+        for consumed in consumed_messages:
+            self.tracker.add(consumed.partition, consumed.offset)
+        for wave in self._split_by_user(consumed_messages):
+            await asyncio.gather(*[
+                self._verify_micro_batch(
+                    wave[start:start + micro_batch_size], semaphore,
+                )
+                for start in range(0, len(wave), micro_batch_size)
+            ])
+            await self._commit()
+
+    async def _verify(self, consumed: ConsumedMessage) -> None:
+        try:
+            await self.service.verify(
+                username=consumed.message.username,
+                img_path=str(consumed.message.path),
+            )
+        except Exception as error:
+            logger.exception(f'failed to process offset {consumed.offset}')
+            metrics.count_error('verify', error)
+            self.tracker.fail(consumed.partition, consumed.offset)
+        else:
+            self.tracker.complete(consumed.partition, consumed.offset)
+
+    async def _verify_micro_batch(
+        self,
+        consumed_messages: list[ConsumedMessage],
+        semaphore: asyncio.Semaphore,
+    ) -> None:
+        async with semaphore:
+            try:
+                await self.service.verify_many(
+                    [consumed.message for consumed in consumed_messages],
+                )
+            except Exception as error:
+                logger.exception('failed to process micro batch')
+                metrics.count_error('verify', error)
+                mark = self.tracker.fail
+            else:
+                mark = self.tracker.complete
+        for consumed in consumed_messages:
+            mark(consumed.partition, consumed.offset)
+
+    async def _commit(self) -> None:
+        assignment = self.consumer.assignment()
+        offsets = {
+            partition: offset
+            for partition, offset in self.tracker.committable().items()
+            if partition in assignment
+        }
+        if not offsets or get_settings().kafka.enable_auto_commit:
+            return
+        try:
+            await self.consumer.commit(offsets)
+        except (CommitFailedError, IllegalStateError) as error:
+            logger.warning(f'failed to commit offsets {offsets}')
+            metrics.count_error('commit', error)
+            return
+        self.tracker.commit(offsets)
+
+    async def _seek_failed(self) -> None:
+        failed = self.tracker.pop_failed()
+        assignment = self.consumer.assignment()
+        for partition, offset in failed.items():
+            if partition not in assignment:
+                logger.info(f'skipping retry of revoked {partition}')
+                continue
+            logger.warning(f'retrying {partition} from offset {offset}')
+            self.consumer.seek(partition, offset)
+        if failed:
+            await asyncio.sleep(get_settings().kafka.retry_backoff_ms / 1000)
+
+    def _observe_lag(self, consumed_messages: list[ConsumedMessage]) -> None:
+        last_offsets = {
+            consumed.partition: consumed.offset
+            for consumed in consumed_messages
+        }
+        for partition, offset in last_offsets.items():
+            highwater = self.consumer.highwater(partition)
+            if highwater is None:
+                continue
+            metrics.kafka_lag.labels(
+                topic=partition.topic, partition=partition.partition,
+            ).set(max(highwater - offset - 1, 0))
+
+    def _split_by_user(
+        self, consumed_messages: list[ConsumedMessage],
+    ) -> list[list[ConsumedMessage]]:
+        """
+        Делит сообщения на волны с одним сообщением пользователя в каждой.
+
+        N-ое сообщение пользователя попадает в N-ую волну,
+        поэтому при последовательной обработке волн
+        сохраняется порядок сообщений каждого пользователя.
+        """
+        waves: list[list[ConsumedMessage]] = []
+        user_messages_count: defaultdict[str, int] = defaultdict(int)
+        for consumed in consumed_messages:
+            username = consumed.message.username
+            wave_index = user_messages_count[username]
+            user_messages_count[username] += 1
+            if wave_index == len(waves):
+                waves.append([])
+            waves[wave_index].append(consumed)
+        return waves
+
+    def _get_consumed_message(self, record: ConsumerRecord) -> ConsumedMessage:
+        return ConsumedMessage(
+            partition=TopicPartition(record.topic, record.partition),
+            offset=record.offset,
+            message=self._get_message(record.value),
+        )
+
+    def _get_message(self, message_value: dict[str, str]) -> Message:
+        return Message(
+            username=message_value.get('username', ''),
+            path=message_value.get('file_path', ''),
+        )
+
     def _init_storage_path(self) -> None:
         path = Path(get_settings().kafka.storage_path)
         try:
@@ -1,11 +1,21 @@
 from datetime import datetime
 from typing import List
 
-from sqlalchemy import Column, ForeignKey, Integer, String, Table
+from sqlalchemy import (
+    Column,
+    DateTime,
+    ForeignKey,
+    Integer,
+    LargeBinary,
+    String,
+    Table,
+    func,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 username_max_len = 200
 hash_max_len = 1000
+model_name_max_len = 16
 
 
 class Base(DeclarativeBase):
@@ -28,6 +38,26 @@ class User(Base):
     )
     reports: Mapped[List['Report']] = relationship(back_populates='user')
     vector: Mapped[bytes] = mapped_column(nullable=True)
+    vector_updated_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), index=True,
+    )
+
+
+class UserEmbedding(Base):
+    """Вектор лица пользователя, построенный одной моделью."""
+
+    __tablename__ = 'user_embeddings'
+
+    id_user: Mapped[int] = mapped_column(
+        ForeignKey('users.id', ondelete='CASCADE'), primary_key=True,
+    )
+    model_name: Mapped[str] = mapped_column(
+        String(model_name_max_len), primary_key=True,
+    )
+    vector: Mapped[bytes] = mapped_column(LargeBinary)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(),
+    )
 
 
 class Transaction(Base):
@@ -1,16 +1,67 @@
+import asyncio
 import logging
-import pickle  # noqa: S403 considered
-from typing import Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, TypeVar
 
-from sqlalchemy import Engine, create_engine, select
-from sqlalchemy.orm import Session
+import numpy as np
+from sqlalchemy import (
+    Engine,
+    LargeBinary,
+    String,
+    bindparam,
+    column,
+    create_engine,
+    func,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert
 
 from app.core import models as srv
 from app.core.config import get_settings
+from app.core.embedding import VectorDtype, decode_vector, encode_vector
+from app.core.errors import StorageError
+from app.core.face_verification import EmbeddingChanges, ModelName
 from app.external.postgres import models as db
+from app.metrics import pipeline as metrics
 
 logger = logging.getLogger(__name__)
 
+ResultT = TypeVar('ResultT')
+
+embeddings_batch_size = 10000
+
+# Запрос создается один раз, поэтому sqlalchemy берет его
+# скомпилированную форму из кэша, а не собирает запрос заново.
+update_user_statement = update(db.User).where(
+    db.User.username == bindparam('target_username'),
+    db.User.is_deleted.is_(False),
+).values(
+    is_verified=True,
+    vector=bindparam('vector'),
+    vector_updated_at=func.now(),
+).returning(db.User.id, db.User.username, db.User.is_verified)
+# Вектора моделей кроме Facenet не меняют users.vector,
+# который используется индексом поиска.
+verify_user_statement = update(db.User).where(
+    db.User.username == bindparam('target_username'),
+    db.User.is_deleted.is_(False),
+).values(
+    is_verified=True,
+).returning(db.User.id, db.User.username, db.User.is_verified)
+_embedding_insert = insert(db.UserEmbedding)
+upsert_embedding_statement = _embedding_insert.on_conflict_do_update(
+    index_elements=[db.UserEmbedding.id_user, db.UserEmbedding.model_name],
+    set_={
+        'vector': _embedding_insert.excluded.vector,
+        'updated_at': func.now(),
+    },
+)
+
 
 def create_pool() -> Engine:
     """
@@ -20,11 +71,14 @@ def create_pool() -> Engine:
     :rtype: Engine
     """
     settings = get_settings()
-    return create_engine(
+    engine = create_engine(
         str(settings.postgres.pg_dns),
         pool_size=settings.postgres.pool_size,
         max_overflow=settings.postgres.max_overflow,
+        pool_timeout=settings.postgres.pool_timeout,
     )
+    metrics.instrument_pool(engine)
+    return engine
 
 
 def create_all_tables() -> None:
@@ -34,53 +88,278 @@ def create_all_tables() -> None:
 
 
 class DBStorage:
-    """База данных."""
+    """
+    База данных.
+
+    Запросы выполняются синхронным драйвером в отдельном пуле потоков,
+    размер которого равен максимальному количеству соединений пула,
+    поэтому запросы не блокируют event loop. Запрос ждет свободный
+    поток, а не соединение, время этого ожидания публикуется в метриках.
+    Вектора сохраняются в типе vector_dtype, а читаются во float32.
+    """
+
+    def __init__(
+        self,
+        pool: Engine | None = None,
+        vector_dtype: VectorDtype | str | None = None,
+    ) -> None:
+        """
+        Метод инициализации.
 
-    def __init__(self) -> None:
-        """Метод инициализации."""
-        self.pool = create_pool()
+        :param pool: sqlalchemy engine, по умолчанию создается по конфигурации.
+        :type pool: Engine | None
+        :param vector_dtype: Тип значений сохраняемых векторов,
+            по умолчанию из конфигурации.
+        :type vector_dtype: VectorDtype | str | None
+        """
+        settings = get_settings().postgres
+        self.pool = pool or create_pool()
+        self.vector_dtype = VectorDtype(vector_dtype or settings.vector_dtype)
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.pool_size + settings.max_overflow,
+            thread_name_prefix='db-storage',
+        )
 
-    def update_user(
-        self, vector: list[dict[str, Any]], username: str,
+    async def update_user(
+        self,
+        vector: list[dict[str, Any]],
+        username: str,
+        model_name: str = ModelName.facenet,
     ) -> srv.User | None:
         """
         Метод обновления пользователя.
 
-        Устанавливает поле is_verified на true.
+        Устанавливает поле is_verified на true запросом
+        UPDATE ... RETURNING без загрузки пользователя и в той же
+        транзакции сохраняет вектор в user_embeddings. Вектор Facenet
+        также сохраняется в users.vector для индекса поиска.
 
         :param username: Имя пользователя
         :type username: str
         :param vector: Вектор лица пользователя
         :type vector: list[dict[str, Any]]
+        :param model_name: Модель, построившая вектор
+        :type model_name: str
         :return: Обновленный пользователь.
         :rtype: srv.User | None
         """
-        with Session(self.pool) as session:
-            user = self._get_user(username, session)
-            if not user or user.is_deleted is True:
-                logger.error(f'{username} not found')
-                return None
-            user.is_verified = True
-            user.vector = self._pickle_vector(vector)
-            logger.info(f'{username}.is_verified set to True')
-            srv_user = self._get_srv_user(user, vector)
-            session.commit()
-        return srv_user
-
-    def _get_user(self, username, session: Session) -> db.User | None:
-        return session.scalars(
-            select(db.User).where(db.User.username == username),
-        ).first()
-
-    def _get_srv_user(
-        self, db_user: db.User, vector: list[dict[str, Any]] | None = None,  # noqa: WPS221, E501
-    ) -> srv.User:
+        return await self._run(self._update_user, vector, username, model_name)
+
+    async def update_users_bulk(
+        self,
+        users: list[tuple[str, list[dict[str, Any]]]],
+        model_name: str = ModelName.facenet,
+    ) -> list[str]:
+        """
+        Метод обновления нескольких пользователей одним запросом.
+
+        Устанавливает поле is_verified на true запросом
+        UPDATE ... FROM (VALUES ...) и сохраняет вектора
+        в user_embeddings в одной транзакции. Вектора Facenet
+        также сохраняются в users.vector для индекса поиска.
+        Если имя пользователя повторяется, сохраняется последний вектор.
+
+        :param users: Имена пользователей и вектора их лиц
+        :type users: list[tuple[str, list[dict[str, Any]]]]
+        :param model_name: Модель, построившая вектора
+        :type model_name: str
+        :return: Имена не найденных или удаленных пользователей
+        :rtype: list[str]
+        """
+        return await self._run(self._update_users_bulk, users, model_name)
+
+    async def get_embedding(
+        self, username: str, model_name: str = ModelName.facenet,
+    ) -> np.ndarray | None:
+        """
+        Метод получения вектора лица пользователя.
+
+        :param username: Имя пользователя
+        :type username: str
+        :param model_name: Модель, построившая вектор
+        :type model_name: str
+        :return: Вектор первого лица или None, если вектора нет
+        :rtype: np.ndarray | None
+        :raises StorageError: Если вектор в базе данных не читается
+        """
+        return await self._run(self._get_embedding, username, model_name)
+
+    async def get_embeddings(
+        self, since: datetime | None = None,
+    ) -> EmbeddingChanges:
+        """
+        Метод получения векторов верифицированных пользователей.
+
+        Вектора читаются серверным курсором пачками
+        по embeddings_batch_size записей. Для каждого пользователя
+        возвращается вектор первого лица. Если задан since, читаются
+        только пользователи с vector_updated_at позже since,
+        а удаленные и неверифицированные из них возвращаются в removed.
+        Пользователь с нечитаемым вектором пропускается, а при чтении
+        изменений возвращается в removed, чтобы его старый вектор
+        не остался в индексе.
+        Водяной знак - время начала транзакции базы данных.
+
+        :param since: Вернуть только изменения после этого времени
+        :type since: datetime | None
+        :return: Вектора пользователей и водяной знак
+        :rtype: EmbeddingChanges
+        """
+        return await self._run(self._get_embeddings, since)
+
+    async def close(self) -> None:
+        """Закрывает пул потоков и соединения с базой данных."""
+        await asyncio.to_thread(self._executor.shutdown, wait=True)
+        self.pool.dispose()
+
+    async def _run(
+        self, func: Callable[..., ResultT], *args: Any,
+    ) -> ResultT:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            partial(_observe_wait, time.perf_counter(), func, *args),
+        )
+
+    def _update_user(
+        self,
+        vector: list[dict[str, Any]],
+        username: str,
+        model_name: str = ModelName.facenet,
+    ) -> srv.User | None:
+        encoded_vector = encode_vector(vector, model_name, self.vector_dtype)
+        # Параметр с именем колонки sqlalchemy добавляет в SET,
+        # поэтому вектор передается только в запрос Facenet.
+        statement = verify_user_statement
+        parameters: dict[str, Any] = {'target_username': username}
+        if model_name == ModelName.facenet:
+            statement = update_user_statement
+            parameters['vector'] = encoded_vector
+        with self.pool.begin() as connection:
+            updated_user = connection.execute(statement, parameters).first()
+            if updated_user is not None:
+                connection.execute(upsert_embedding_statement, {
+                    'id_user': updated_user.id,
+                    'model_name': model_name,
+                    'vector': encoded_vector,
+                })
+        if updated_user is None:
+            logger.error(f'{username} not found')
+            return None
+        logger.info(f'{username}.is_verified set to True')
         return srv.User(
-            username=db_user.username,
-            is_verified=db_user.is_verified,
-            user_id=db_user.id,
+            username=updated_user.username,
+            is_verified=updated_user.is_verified,
+            user_id=updated_user.id,
             vector=vector,
         )
 
-    def _pickle_vector(self, vector: list[dict[str, Any]]) -> bytes:
-        return pickle.dumps(vector)
+    def _update_users_bulk(
+        self,
+        users: list[tuple[str, list[dict[str, Any]]]],
+        model_name: str = ModelName.facenet,
+    ) -> list[str]:
+        vectors = {
+            username: encode_vector(vector, model_name, self.vector_dtype)
+            for username, vector in users
+        }
+        if not vectors:
+            return []
+        new_vectors = values(
+            column('username', String),
+            column('vector', LargeBinary),
+            name='new_vectors',
+        ).data(list(vectors.items()))
+        user_values: dict[str, Any] = {'is_verified': True}
+        if model_name == ModelName.facenet:
+            user_values.update(
+                vector=new_vectors.c.vector, vector_updated_at=func.now(),
+            )
+        statement = update(db.User).where(
+            db.User.username == new_vectors.c.username,
+            db.User.is_deleted.is_(False),
+        ).values(user_values).returning(db.User.id, db.User.username)
+        with self.pool.begin() as connection:
+            updated_users = connection.execute(statement).all()
+            if updated_users:
+                connection.execute(upsert_embedding_statement, [
+                    {
+                        'id_user': user_id,
+                        'model_name': model_name,
+                        'vector': vectors[username],
+                    }
+                    for user_id, username in updated_users
+                ])
+        updated_usernames = {username for _, username in updated_users}
+        logger.info(f'{len(updated_usernames)} users set is_verified to True')
+        return [
+            username for username in vectors
+            if username not in updated_usernames
+        ]
+
+    def _get_embedding(
+        self, username: str, model_name: str = ModelName.facenet,
+    ) -> np.ndarray | None:
+        statement = select(db.User.vector).where(
+            db.User.username == username,
+            db.User.is_deleted.is_(False),
+            db.User.vector.isnot(None),
+        )
+        if model_name != ModelName.facenet:
+            statement = select(db.UserEmbedding.vector).join(db.User).where(
+                db.User.username == username,
+                db.User.is_deleted.is_(False),
+                db.UserEmbedding.model_name == model_name,
+            )
+        with self.pool.connect() as connection:
+            vector = connection.scalar(statement)
+        if vector is None:
+            logger.warning(f'{model_name} vector for {username} not found')
+            return None
+        try:
+            return decode_vector(vector).to_float32()[0]
+        except ValueError as error:
+            logger.error(f"can't decode {model_name} vector of {username}")
+            metrics.count_error('db_read', error)
+            raise StorageError(detail=f"can't read vector of {username}")
+
+    def _get_embeddings(self, since: datetime | None) -> EmbeddingChanges:
+        is_live = db.User.is_verified.is_(True) & db.User.is_deleted.is_(False)
+        statement = select(db.User.username, db.User.vector, is_live)
+        if since is None:
+            statement = statement.where(is_live, db.User.vector.isnot(None))
+        else:
+            statement = statement.where(db.User.vector_updated_at > since)
+        statement = statement.execution_options(
+            yield_per=embeddings_batch_size,
+        )
+        embeddings: list[tuple[str, np.ndarray]] = []
+        removed: list[str] = []
+        with self.pool.connect() as connection:
+            watermark = connection.scalar(select(func.now()))
+            for username, vector, live in connection.execute(statement):
+                if not live or vector is None:
+                    removed.append(username)
+                    continue
+                try:
+                    embeddings.append(
+                        (username, decode_vector(vector).to_float32()[0]),
+                    )
+                except ValueError as error:
+                    logger.error(f"can't decode vector of {username}: {error}")
+                    metrics.count_error('db_read', error)
+                    if since is not None:
+                        removed.append(username)
+        logger.info(
+            f'got {len(embeddings)} vectors and {len(removed)} removed users',
+        )
+        return EmbeddingChanges(
+            embeddings=embeddings, removed=removed, watermark=watermark,
+        )
+
+
+def _observe_wait(
+    submitted: float, func: Callable[..., ResultT], *args: Any,
+) -> ResultT:
+    metrics.db_pool_wait_seconds.observe(time.perf_counter() - submitted)
+    return func(*args)
@@ -0,0 +1,135 @@
+"""
+Метрики prometheus конвейера верификации.
+
+Этапы конвейера:
+
+- validate - проверка пути к изображению и названия модели;
+- decode - декодирование и уменьшение изображений в процессе раннера;
+- detect - поиск лиц на изображениях в процессе раннера;
+- embed - вычисление векторов лиц в процессе раннера;
+- represent - получение представлений изображений от раннера целиком;
+- db_write - сохранение векторов в хранилище;
+- shadow - получение векторов теневых моделей;
+- file_delete - удаление обработанных изображений.
+"""
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import Engine, event
+
+batch_size_buckets = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+stage_seconds = Histogram(
+    'face_verification_stage_seconds',
+    'Latency of verification pipeline stages',
+    ['stage'],
+)
+errors = Counter(
+    'face_verification_errors',
+    'Verification pipeline errors by stage and type',
+    ['stage', 'error'],
+)
+batch_size = Histogram(
+    'face_verification_batch_size',
+    'Sizes of processed batches',
+    ['kind'],
+    buckets=batch_size_buckets,
+)
+kafka_lag = Gauge(
+    'face_verification_kafka_lag',
+    'Messages between the consumed offset and the partition highwater',
+    ['topic', 'partition'],
+)
+runner_in_flight = Gauge(
+    'face_verification_runner_in_flight',
+    'Tasks submitted to the runner and not finished yet',
+    ['runner'],
+)
+runner_queue_depth = Gauge(
+    'face_verification_runner_queue_depth',
+    'Runner tasks waiting for a free worker process',
+    ['runner'],
+)
+background_task_failures = Counter(
+    'face_verification_background_task_failures',
+    'Background tasks of the service that stopped with an error',
+    ['task'],
+)
+db_pool_checkouts = Counter(
+    'face_verification_db_pool_checkouts',
+    'Connections checked out from the database pool',
+)
+db_pool_checked_out = Gauge(
+    'face_verification_db_pool_checked_out',
+    'Connections currently checked out from the database pool',
+)
+db_pool_wait_seconds = Histogram(
+    'face_verification_db_pool_wait_seconds',
+    'Time a storage query waits for a database thread and connection',
+)
+
+
+def count_error(stage: str, error: BaseException | str) -> None:
+    """
+    Считает ошибку этапа конвейера.
+
+    :param stage: Этап конвейера
+    :type stage: str
+    :param error: Исключение или название типа ошибки
+    :type error: BaseException | str
+    """
+    error_type = error if isinstance(error, str) else type(error).__name__
+    errors.labels(stage=stage, error=error_type).inc()
+
+
+def observe_stages(stage_durations: dict[str, float]) -> None:
+    """
+    Сохраняет длительности этапов, измеренные в другом процессе.
+
+    :param stage_durations: Длительности этапов в секундах
+    :type stage_durations: dict[str, float]
+    """
+    for stage, seconds in stage_durations.items():
+        stage_seconds.labels(stage=stage).observe(seconds)
+
+
+def instrument_pool(engine: Engine) -> None:
+    """
+    Подписывает метрики пула соединений на события sqlalchemy.
+
+    :param engine: sqlalchemy engine с пулом соединений
+    :type engine: Engine
+    """
+    event.listen(engine, 'checkout', _on_checkout)
+    event.listen(engine, 'checkin', _on_checkin)
+
+
+class Stopwatch:
+    """Секундомер для измерения этапов в процессе раннера."""
+
+    def __init__(self) -> None:
+        """Метод инициализации."""
+        self.durations: dict[str, float] = {}
+        self._started = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        """
+        Добавляет к этапу время с прошлой отметки.
+
+        :param stage: Этап конвейера
+        :type stage: str
+        """
+        now = time.perf_counter()
+        self.durations[stage] = (
+            self.durations.get(stage, 0) + now - self._started
+        )
+        self._started = now
+
+
+def _on_checkout(*args) -> None:
+    db_pool_checkouts.inc()
+    db_pool_checked_out.inc()
+
+
+def _on_checkin(*args) -> None:
+    db_pool_checked_out.dec()
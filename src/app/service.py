@@ -1,44 +1,206 @@
+import asyncio
 import logging
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
+from typing import Any, Coroutine
 
 from fastapi import FastAPI
 
 from app.api.handlers import router
 from app.api.healthz.handlers_healthz import router as healthz_router
-from app.core.face_verification import FaceVerificationService
+from app.api.metrics.handlers_metrics import router as metrics_router
+from app.core.cache import LRUCache, RepresentationCache
+from app.core.config import get_settings
+from app.core.face_verification import (
+    DetectionOptions,
+    FaceVerificationService,
+    SearchIndex,
+    preload_model,
+)
+from app.core.preprocessing import ImageLoader
+from app.external.index.exact import ExactIndex
+from app.external.index.ivf import IVFIndex
 from app.external.kafka import KafkaConsumer
 from app.external.postgres.storage import DBStorage
-from app.system.runner import AsyncMultiProcessRunner
+from app.metrics import pipeline as metrics
+from app.system.runner import (
+    AsyncMultiProcessRunner,
+    AsyncThreadRunner,
+    ModelRunners,
+)
 
 logger = logging.getLogger(__name__)
 
 
+def init_index() -> SearchIndex:
+    """Инициализирует индекс поиска пользователей."""
+    settings = get_settings().index
+    if settings.kind == 'ivf':
+        return IVFIndex(
+            nlist=settings.nlist,
+            nprobe=settings.nprobe,
+            train_iterations=settings.train_iterations,
+            dtype=settings.dtype,
+        )
+    return ExactIndex(dtype=settings.dtype)
+
+
+def init_runners() -> ModelRunners:
+    """Инициализирует отдельный пул раннера для каждой модели."""
+    settings = get_settings()
+    runner_settings = settings.runner
+    models_settings = settings.models
+    model_names = dict.fromkeys(
+        [*models_settings.enabled, *models_settings.shadow],
+    )
+    runner_class = (
+        AsyncThreadRunner if runner_settings.kind == 'thread'
+        else AsyncMultiProcessRunner
+    )
+    return ModelRunners({
+        model_name: runner_class(
+            settings=runner_settings.model_copy(update={
+                'max_workers': models_settings.workers.get(
+                    model_name, runner_settings.max_workers,
+                ),
+            }),
+            initializer=preload_model,
+            initargs=(
+                model_name,
+                runner_settings.intra_op_threads,
+                runner_settings.inter_op_threads,
+            ),
+            name=model_name,
+        )
+        for model_name in model_names
+    })
+
+
 def init_kafka() -> KafkaConsumer:
     """Инициализирует KafkaConsumer."""
     logger.info('Starting up storage...')
     storage = DBStorage()
     logger.info('Starting up service...')
-    runner = AsyncMultiProcessRunner()
+    runner = init_runners()
     logger.info('Starting up kafka consumer...')
-    service = FaceVerificationService(storage=storage, runner=runner)
+    cache_settings = get_settings().cache
+    preprocessing_settings = get_settings().preprocessing
+    detection_settings = get_settings().detection
+    detection_options = DetectionOptions(
+        detector_backend=detection_settings.detector_backend,
+        enforce_detection=detection_settings.enforce_detection,
+        align=detection_settings.align,
+    )
+    service = FaceVerificationService(
+        storage=storage,
+        runner=runner,
+        index=init_index(),
+        embeddings_cache=LRUCache(cache_settings.embeddings_size),
+        index_snapshot_path=get_settings().index.snapshot_path,
+        representation_cache=RepresentationCache(
+            maxsize=cache_settings.representations_size,
+            path=cache_settings.representations_path,
+            disk_maxsize=cache_settings.representations_disk_size,
+        ),
+        image_loader=ImageLoader(
+            max_side=preprocessing_settings.max_side,
+            exif_orientation=preprocessing_settings.exif_orientation,
+        ),
+        detection_options=detection_options,
+        batch_detection_options=detection_options._replace(
+            detector_backend=(
+                detection_settings.batch_detector_backend
+                or detection_settings.detector_backend
+            ),
+        ),
+        shadow_models=tuple(get_settings().models.shadow),
+    )
     logger.info('Starting up runner...')
     return KafkaConsumer(service=service)
 
 
+def create_background_task(
+    app: FastAPI, name: str, coro: Coroutine[Any, Any, Any],
+) -> asyncio.Task:
+    """
+    Запускает фоновую задачу приложения и следит за ее ошибками.
+
+    Ошибка задачи логируется, считается в метриках, а название
+    задачи сохраняется в app.state.failed_tasks, после чего сервис
+    перестает быть готовым.
+
+    :param app: Приложение
+    :type app: FastAPI
+    :param name: Название задачи
+    :type name: str
+    :param coro: Корутина задачи
+    :type coro: Coroutine[Any, Any, Any]
+    :return: Запущенная задача
+    :rtype: asyncio.Task
+    """
+    if not hasattr(app.state, 'failed_tasks'):
+        app.state.failed_tasks = set()
+
+    def on_done(task: asyncio.Task) -> None:  # noqa: WPS430 task callback
+        if task.cancelled() or task.exception() is None:
+            return
+        logger.error(
+            f'background task {name} failed', exc_info=task.exception(),
+        )
+        metrics.background_task_failures.labels(name).inc()
+        app.state.failed_tasks.add(name)
+
+    task = asyncio.create_task(coro, name=name)
+    task.add_done_callback(on_done)
+    return task
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Метод для lifespan events приложения."""
     kafka = init_kafka()
-    await kafka.start()
-    await kafka.consume()
-    yield
-    logger.info('Shutting down kafka storage...')
-    await kafka.stop()
+    runner = kafka.service.runner
+    app.state.runner = runner
+    app.state.service = kafka.service
+    index_settings = get_settings().index
+    tasks = [
+        create_background_task(app, 'start_runner', runner.start()),
+        create_background_task(
+            app, 'load_index', kafka.service.load_index(),
+        ),
+        create_background_task(
+            app,
+            'maintain_index',
+            kafka.service.maintain_index(
+                index_settings.compact_interval_s,
+                index_settings.snapshot_interval_s,
+            ),
+        ),
+    ]
+    try:
+        await kafka.start()
+        tasks.append(create_background_task(app, 'consume', kafka.consume()))
+        yield
+    finally:
+        logger.info('Shutting down kafka storage...')
+        try:
+            for task in tasks:
+                task.cancel()
+                with suppress(asyncio.CancelledError, Exception):
+                    await task
+            await kafka.stop()
+        finally:
+            try:
+                logger.info('Shutting down runner...')
+                await runner.stop()
+            finally:
+                logger.info('Shutting down storage...')
+                await kafka.service.storage.close()
 
 app = FastAPI(lifespan=lifespan)
 
 app.include_router(router=router)
 app.include_router(router=healthz_router)
+app.include_router(router=metrics_router)
 
 
 if __name__ == '__main__':
@@ -1,31 +1,364 @@
 import asyncio
-from concurrent.futures import Executor, ProcessPoolExecutor
+import logging
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from concurrent.futures.process import BrokenProcessPool
 from functools import partial
 from typing import Any, Callable
 
+from app.core.config import RunnerSettings, get_settings
+from app.core.errors import ModelNotEnabledError
+from app.core.face_verification import Runner
+from app.metrics import pipeline as metrics
+from app.system import shared_memory
 
-class AsyncMultiProcessRunner:
-    """Раннер для запуска а асинхронной функции в новом процессе."""
+logger = logging.getLogger(__name__)
 
-    async def run(self, func: Callable[[str, str], Any], **kwargs) -> Any:
+warm_up_seconds = 0.1
+
+
+def _get_pid(delay: float = 0) -> int:
+    time.sleep(delay)
+    return os.getpid()
+
+
+class _ExecutorRunner:
+    """
+    Основа раннеров, запускающих синхронную функцию в пуле executor.
+
+    Количество выполняемых задач и задач, ожидающих свободного
+    исполнителя, публикуется в метриках с меткой названия раннера.
+    """
+
+    pool_kind = 'executor'
+
+    def __init__(
+        self,
+        settings: RunnerSettings | None = None,
+        initializer: Callable[..., None] | None = None,
+        initargs: tuple[Any, ...] = (),
+        name: str = 'default',
+    ) -> None:
+        """
+        Метод инициализации.
+
+        :param settings: Конфигурация раннера, defaults to None.
+        :type settings: RunnerSettings | None
+        :param initializer: Функция инициализации, defaults to None.
+        :type initializer: Callable[..., None] | None
+        :param initargs: Аргументы функции инициализации, defaults to ().
+        :type initargs: tuple[Any, ...]
+        :param name: Название раннера в логах и метриках, defaults to default.
+        :type name: str
+        """
+        self.settings = settings or get_settings().runner
+        self.initializer = initializer
+        self.initargs = initargs
+        self.name = name
+        self.is_ready = False
+        self._executor: Executor | None = None
+        self._in_flight = 0
+
+    async def stop(self) -> None:
+        """Останавливает пул."""
+        self.is_ready = False
+        executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        await asyncio.to_thread(
+            executor.shutdown, wait=True, cancel_futures=True,
+        )
+        logger.info(f'{self.pool_kind} {self.name} stopped')
+
+    async def _run(
+        self, executor: Executor, func: Callable[..., Any], **kwargs,
+    ) -> Any:
+        return await self._wait(executor.submit(partial(func, **kwargs)))
+
+    async def _wait(self, future: Future) -> Any:
+        self._track_in_flight(1)
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            self._track_in_flight(-1)
+
+    def _track_in_flight(self, change: int) -> None:
+        self._in_flight += change
+        metrics.runner_in_flight.labels(self.name).set(self._in_flight)
+        metrics.runner_queue_depth.labels(self.name).set(
+            max(self._in_flight - self.settings.max_workers, 0),
+        )
+
+
+class AsyncMultiProcessRunner(_ExecutorRunner):
+    """
+    Раннер для запуска синхронной функции в пуле процессов.
+
+    Пул процессов создается один раз и переиспользуется между вызовами.
+    Процесс пула перезапускается после выполнения max_tasks_per_child
+    задач, пул с упавшим процессом пересоздается.
+    Каждый новый процесс пула выполняет initializer перед первой задачей.
+    Процессы запускаются методом spawn: форк процесса сервиса
+    с запущенными потоками и TensorFlow небезопасен.
+    Если задано shared_memory_slots, массивы результатов, записанные
+    функцией через share_array, возвращаются через кольцо слотов
+    разделяемой памяти, общее для всех процессов пула.
+    """
+
+    pool_kind = 'process pool'
+    _executor: ProcessPoolExecutor | None
+    _ring: shared_memory.SlotRing | None = None
+
+    async def start(self) -> None:
+        """
+        Запускает пул процессов.
+
+        Запускает все процессы пула и дожидается их инициализации,
+        после чего раннер считается готовым к работе. Задача прогрева
+        занимает процесс на warm_up_seconds, чтобы ее не выполнил
+        уже инициализированный процесс, и прогрев повторяется,
+        пока задачи не выполнят max_workers работающих процессов.
+        Задачи прогрева расходуют max_tasks_per_child, поэтому процесс,
+        выполнивший max_tasks_per_child задач прогрева, завершился
+        и не считается. При max_tasks_per_child равном 1 каждый процесс
+        завершается после первой задачи, и прогрев выполняется один раз.
+        """
+        executor = self._get_executor()
+        max_tasks = self.settings.max_tasks_per_child
+        warm_ups: Counter[int] = Counter()
+        live_pids: set[int] = set()
+        while len(live_pids) < self.settings.max_workers:
+            warm_ups.update(await asyncio.gather(*[
+                self._run(executor, _get_pid, delay=warm_up_seconds)
+                for _ in range(self.settings.max_workers)
+            ]))
+            if max_tasks == 1:
+                break
+            live_pids = {
+                pid for pid, tasks in warm_ups.items()
+                if max_tasks is None or tasks < max_tasks
+            }
+        self.is_ready = True
+        logger.info(
+            f'process pool {self.name} started with workers {live_pids}',
+        )
+
+    async def run(self, func: Callable[..., Any], **kwargs) -> Any:
         """
         Метод запуска функции.
 
+        Если процесс пула упал во время выполнения,
+        пул пересоздается и функция запускается повторно.
+
         :param func: Запускаемая синхронная функция
         :type func: Callable
         :param kwargs: Атрибуты функции
         :type kwargs: key-value pairs
         :return: Результат выполнения
+        :raises BrokenProcessPool: Если процесс пула упал повторно
         """
-        with ProcessPoolExecutor() as pool:
-            return await self._run(pool, func, **kwargs)
+        executor = self._get_executor()
+        try:
+            return await self._run_in_slot(executor, func, **kwargs)
+        except BrokenProcessPool:
+            logger.error('process pool is broken, restarting')
+            self._restart(executor)
+            executor = self._get_executor()
+            return await self._retry(executor, func, **kwargs)
 
-    async def _run(
-        self, executor: Executor, func: Callable[[str, str], Any], **kwargs,
-    ) -> None:
-        represent_image_on_path = partial(func, **kwargs)
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            executor,
-            represent_image_on_path,
+    async def stop(self) -> None:
+        """Останавливает пул процессов и удаляет разделяемую память."""
+        await super().stop()
+        ring, self._ring = self._ring, None
+        if ring is not None:
+            ring.close()
+
+    async def _retry(
+        self, executor: Executor, func: Callable[..., Any], **kwargs,
+    ) -> Any:
+        try:
+            return await self._run_in_slot(executor, func, **kwargs)
+        except BrokenProcessPool:
+            logger.error('process pool is broken again, giving up')
+            self._restart(executor)
+            raise
+
+    async def _run_in_slot(
+        self, executor: Executor, func: Callable[..., Any], **kwargs,
+    ) -> Any:
+        ring = self._ring
+        slot = ring.acquire() if ring else None
+        if ring is None or slot is None:
+            return await self._run(executor, func, **kwargs)
+        try:
+            future = executor.submit(partial(
+                shared_memory.call_with_slot, func, slot, **kwargs,
+            ))
+        except BaseException:
+            ring.release(slot)
+            raise
+        try:
+            result = await self._wait(future)
+        except BaseException:
+            # Отмененный вызов может еще выполняться в процессе пула
+            # и записать массив в слот, поэтому слот возвращается
+            # только после завершения задачи.
+            future.add_done_callback(lambda _: ring.release(slot))
+            raise
+        try:
+            return ring.load(result)
+        finally:
+            ring.release(slot)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is not None:
+            return self._executor
+        initializer, initargs = self.initializer, self.initargs
+        if self.settings.shared_memory_slots:
+            if self._ring is None:
+                self._ring = shared_memory.SlotRing(
+                    self.settings.shared_memory_slots,
+                    self.settings.shared_memory_slot_size,
+                )
+            initializer = shared_memory.attach_worker
+            initargs = (
+                self._ring.name,
+                self._ring.slots,
+                self._ring.slot_size,
+                self.initializer,
+                self.initargs,
+            )
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.settings.max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            max_tasks_per_child=self.settings.max_tasks_per_child,
+            initializer=initializer,
+            initargs=initargs,
+        )
+        return self._executor
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        if self._executor is not broken:
+            return
+        self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncThreadRunner(_ExecutorRunner):
+    """
+    Раннер для запуска синхронной функции в пуле потоков.
+
+    Потоки пула используют одну загруженную модель в процессе сервиса,
+    поэтому среда TensorFlow и веса модели не копируются в каждый
+    процесс. TensorFlow отпускает GIL при выполнении ядер, и вычисления
+    потоков выполняются параллельно.
+    initializer выполняется один раз при запуске раннера.
+    """
+
+    pool_kind = 'thread pool'
+    _executor: ThreadPoolExecutor | None
+
+    async def start(self) -> None:
+        """
+        Запускает пул потоков.
+
+        Выполняет initializer в потоке пула, после чего раннер
+        считается готовым к работе.
+        """
+        executor = self._get_executor()
+        if self.initializer is not None:
+            await self._run(
+                executor, partial(self.initializer, *self.initargs),
+            )
+        self.is_ready = True
+        logger.info(
+            f'thread pool {self.name} started '
+            f'with {self.settings.max_workers} threads',
         )
+
+    async def run(self, func: Callable[..., Any], **kwargs) -> Any:
+        """
+        Метод запуска функции.
+
+        :param func: Запускаемая синхронная функция
+        :type func: Callable
+        :param kwargs: Атрибуты функции
+        :type kwargs: key-value pairs
+        :return: Результат выполнения
+        """
+        return await self._run(self._get_executor(), func, **kwargs)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.settings.max_workers,
+                thread_name_prefix=f'runner-{self.name}',
+            )
+        return self._executor
+
+
+class ModelRunners:
+    """
+    Раннеры моделей распознавания лиц.
+
+    Веса каждой модели загружаются в отдельном пуле процессов или
+    потоков, поэтому тяжелая модель не занимает исполнителей легкой.
+    Функция запускается в раннере модели из аргумента model_name.
+    """
+
+    def __init__(self, runners: dict[str, Runner]) -> None:
+        """
+        Метод инициализации.
+
+        :param runners: Раннеры по названию модели
+        :type runners: dict[str, Runner]
+        """
+        self.runners = runners
+
+    @property
+    def is_ready(self) -> bool:
+        """
+        Готовы ли раннеры всех моделей.
+
+        :return: Все раннеры готовы
+        :rtype: bool
+        """
+        return all(runner.is_ready for runner in self.runners.values())
+
+    async def start(self) -> None:
+        """Запускает раннеры всех моделей."""
+        await asyncio.gather(*[
+            runner.start() for runner in self.runners.values()
+        ])
+
+    async def stop(self) -> None:
+        """Останавливает раннеры всех моделей."""
+        await asyncio.gather(*[
+            runner.stop() for runner in self.runners.values()
+        ])
+
+    async def run(self, func: Callable[..., Any], **kwargs) -> Any:
+        """
+        Запускает функцию в раннере модели из аргумента model_name.
+
+        :param func: Запускаемая синхронная функция
+        :type func: Callable
+        :param kwargs: Атрибуты функции, включая model_name
+        :type kwargs: key-value pairs
+        :return: Результат выполнения
+        :raises ModelNotEnabledError: Если для модели нет раннера
+        """
+        model_name = kwargs.get('model_name')
+        runner = self.runners.get(str(model_name))
+        if runner is None:
+            logger.error(f"model {model_name} isn't enabled")
+            raise ModelNotEnabledError(str(model_name))
+        return await runner.run(func, **kwargs)
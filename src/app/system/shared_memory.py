@@ -0,0 +1,244 @@
+"""
+Передача массивов NumPy из процессов раннера через разделяемую память.
+
+Результат функции в процессе раннера сериализуется pickle и передается
+в основной процесс через pipe. Большой массив, например матрица векторов
+пакета изображений, вместо этого записывается в слот кольца
+разделяемой памяти, а через pipe передаются только номер слота, форма
+и тип массива. Основной процесс создает кольцо и выдает слот на время
+одного вызова, процесс раннера подключается к кольцу при инициализации.
+Слот отмененного вызова возвращается только после завершения задачи
+в процессе раннера.
+Если свободного слота нет или массив в него не помещается, массив
+передается через pipe как раньше.
+"""
+import logging
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Any, Callable, NamedTuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SharedArray(NamedTuple):
+    """Массив, записанный в слот кольца разделяемой памяти."""
+
+    slot: int
+    shape: tuple[int, ...]
+    dtype: str
+
+
+class SlotRing:
+    """
+    Кольцо слотов одинакового размера в разделяемой памяти.
+
+    Кольцо без имени создается основным процессом, который выдает
+    и освобождает слоты и удаляет память при закрытии. Кольцо с именем
+    подключается к уже созданной памяти в процессе раннера.
+
+    Attributes:
+        slots: int - количество слотов.
+        slot_size: int - размер слота в байтах.
+        name: str - имя блока разделяемой памяти.
+    """
+
+    def __init__(
+        self, slots: int, slot_size: int, name: str | None = None,
+    ) -> None:
+        """
+        Метод инициализации.
+
+        :param slots: Количество слотов
+        :type slots: int
+        :param slot_size: Размер слота в байтах
+        :type slot_size: int
+        :param name: Имя созданной памяти, defaults to None.
+        :type name: str | None
+        """
+        self._is_owner = name is None
+        if name is None:
+            self._memory = shared_memory.SharedMemory(
+                create=True, size=slots * slot_size,
+            )
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+        self.slots = slots
+        self.slot_size = slot_size
+        self.name = self._memory.name
+        self._free = deque(range(slots)) if self._is_owner else deque()
+
+    def acquire(self) -> int | None:
+        """
+        Выдает свободный слот.
+
+        :return: Номер слота или None, если свободных слотов нет
+        :rtype: int | None
+        """
+        if not self._free:
+            return None
+        return self._free.popleft()
+
+    def release(self, slot: int) -> None:
+        """
+        Возвращает слот в кольцо.
+
+        Слот можно вернуть из любого потока, например из callback
+        завершения задачи пула процессов.
+
+        :param slot: Номер слота
+        :type slot: int
+        """
+        self._free.append(slot)
+
+    def write(self, slot: int, array: np.ndarray) -> SharedArray | None:
+        """
+        Записывает массив в слот.
+
+        :param slot: Номер слота
+        :type slot: int
+        :param array: Массив
+        :type array: np.ndarray
+        :return: Описание записанного массива или None,
+            если массив не помещается в слот
+        :rtype: SharedArray | None
+        """
+        if array.nbytes > self.slot_size:
+            return None
+        self._view(slot, array.shape, array.dtype)[...] = array
+        return SharedArray(slot, array.shape, array.dtype.str)
+
+    def read(self, shared: SharedArray) -> np.ndarray:
+        """
+        Копирует массив из слота.
+
+        :param shared: Описание записанного массива
+        :type shared: SharedArray
+        :return: Копия массива
+        :rtype: np.ndarray
+        """
+        return self._view(
+            shared.slot, shared.shape, np.dtype(shared.dtype),
+        ).copy()
+
+    def load(self, result: Any) -> Any:
+        """
+        Заменяет массивы из слотов в результате функции на их копии.
+
+        Массив из слота возвращается функцией напрямую
+        или полем NamedTuple.
+
+        :param result: Результат функции
+        :type result: Any
+        :return: Результат функции с массивами
+        :rtype: Any
+        """
+        if isinstance(result, SharedArray):
+            return self.read(result)
+        if isinstance(result, tuple) and hasattr(result, '_fields'):
+            arrays = {
+                field: self.read(value)
+                for field, value in zip(result._fields, result)
+                if isinstance(value, SharedArray)
+            }
+            if arrays:
+                return result._replace(**arrays)
+        return result
+
+    def close(self) -> None:
+        """Отключается от памяти и удаляет ее, если кольцо ее создало."""
+        self._memory.close()
+        if self._is_owner:
+            self._memory.unlink()
+
+    def _view(
+        self, slot: int, shape: tuple[int, ...], dtype: np.dtype,
+    ) -> np.ndarray:
+        return np.ndarray(
+            shape,
+            dtype=dtype,
+            buffer=self._memory.buf,
+            offset=slot * self.slot_size,
+        )
+
+
+class _WorkerState:
+    """Кольцо процесса раннера и слот выполняемого вызова."""
+
+    ring: SlotRing | None = None
+    slot: int | None = None
+
+
+_worker = _WorkerState()
+
+
+def attach_worker(
+    name: str,
+    slots: int,
+    slot_size: int,
+    initializer: Callable[..., None] | None = None,
+    initargs: tuple[Any, ...] = (),
+) -> None:
+    """
+    Подключает процесс раннера к кольцу и выполняет его initializer.
+
+    :param name: Имя блока разделяемой памяти
+    :type name: str
+    :param slots: Количество слотов
+    :type slots: int
+    :param slot_size: Размер слота в байтах
+    :type slot_size: int
+    :param initializer: Функция инициализации процесса, defaults to None.
+    :type initializer: Callable[..., None] | None
+    :param initargs: Аргументы функции инициализации, defaults to ().
+    :type initargs: tuple[Any, ...]
+    """
+    _worker.ring = SlotRing(slots, slot_size, name=name)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def call_with_slot(func: Callable[..., Any], slot: int, **kwargs) -> Any:
+    """
+    Выполняет функцию в процессе раннера со слотом для результата.
+
+    :param func: Запускаемая функция
+    :type func: Callable
+    :param slot: Номер выданного слота
+    :type slot: int
+    :param kwargs: Атрибуты функции
+    :type kwargs: key-value pairs
+    :return: Результат функции
+    """
+    _worker.slot = slot
+    try:
+        return func(**kwargs)
+    finally:
+        _worker.slot = None
+
+
+def share_array(array: np.ndarray) -> np.ndarray | SharedArray:
+    """
+    Записывает массив результата в слот текущего вызова.
+
+    Вне процесса раннера с кольцом, после записи другого массива
+    в слот или если массив не помещается в слот, массив
+    возвращается без изменений и передается через pipe.
+
+    :param array: Массив
+    :type array: np.ndarray
+    :return: Описание записанного массива или исходный массив
+    :rtype: np.ndarray | SharedArray
+    """
+    if _worker.ring is None or _worker.slot is None:
+        return array
+    shared = _worker.ring.write(_worker.slot, array)
+    if shared is None:
+        logger.debug(
+            f'array of {array.nbytes} bytes does not fit '
+            f'into slot of {_worker.ring.slot_size} bytes',
+        )
+        return array
+    _worker.slot = None
+    return shared
@@ -0,0 +1,6 @@
+"""
+Пакет бенчмарков горячих путей сервиса.
+
+Каждый модуль запускается как ``python -m benchmarks.<module>``
+из директории ``src`` и выводит результаты в формате JSON.
+"""
@@ -0,0 +1,97 @@
+"""
+Набор бенчмарков горячих путей сервиса.
+
+Запускается как ``python -m benchmarks`` из директории ``src``.
+Результаты всех бенчмарков и окружение запуска выводятся в формате
+JSON и, если задан ``--output``, сохраняются в файл, чтобы сравнивать
+результаты между релизами.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import tomllib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from benchmarks import (
+    ann,
+    inference,
+    quantization,
+    represent,
+    runner,
+    storage,
+    vector_format,
+)
+from benchmarks.timing import report
+
+pyproject_path = Path(__file__).parents[2] / 'pyproject.toml'
+
+
+def get_environment() -> dict[str, Any]:
+    """
+    Описывает окружение запуска бенчмарков.
+
+    :return: Версии сервиса, python, numpy и время запуска
+    :rtype: dict[str, Any]
+    """
+    with open(pyproject_path, 'rb') as pyproject_file:
+        version = tomllib.load(pyproject_file)['tool']['poetry']['version']
+    return {
+        'version': version,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'started_at': datetime.now(timezone.utc).isoformat(),
+    }
+
+
+async def run_suite(
+    quick: bool = False, postgres: bool = False, models: bool = False,
+) -> dict[str, Any]:
+    """
+    Запускает все бенчмарки.
+
+    :param quick: Уменьшить размеры данных для быстрой проверки
+    :type quick: bool
+    :param postgres: Измерить DBStorage на базе данных из конфигурации
+    :type postgres: bool
+    :param models: Измерить получение представлений моделью DeepFace
+        и раннеры пула процессов и пула потоков
+    :type models: bool
+    :return: Окружение и результаты бенчмарков
+    :rtype: dict[str, Any]
+    """
+    scale = 10 if quick else 1
+    results: dict[str, Any] = {
+        'environment': get_environment(),
+        'vector_format': vector_format.run(number=1000 // scale),
+        'search': ann.run(
+            users=100000 // scale, nlist=1024 // scale, queries=100 // scale,
+        ),
+        'quantization': quantization.run(
+            users=100000 // scale, queries=100 // scale,
+        ),
+        'runner': await runner.run(number=200 // scale),
+        'storage': await storage.run(users=1000 // scale, postgres=postgres),
+    }
+    if models:
+        results['represent'] = await represent.run()
+        results['inference'] = await inference.run()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=run_suite.__doc__)
+    parser.add_argument('--quick', action='store_true')
+    parser.add_argument('--postgres', action='store_true')
+    parser.add_argument('--models', action='store_true')
+    parser.add_argument('--output', type=Path)
+    args = parser.parse_args()
+    results = asyncio.run(run_suite(args.quick, args.postgres, args.models))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    report(results)
@@ -0,0 +1,139 @@
+import argparse
+import statistics
+import time
+from typing import Any
+
+import numpy as np
+
+from app.core.face_verification import SearchIndex
+from app.external.index.exact import ExactIndex
+from app.external.index.ivf import IVFIndex
+from benchmarks.timing import report
+
+
+def make_embeddings(
+    users: int, dim: int, clusters: int, seed: int = 0,
+) -> list[tuple[str, np.ndarray]]:
+    """
+    Создает вектора пользователей, сгруппированные вокруг центров.
+
+    :param users: Количество пользователей
+    :type users: int
+    :param dim: Размерность вектора
+    :type dim: int
+    :param clusters: Количество центров
+    :type clusters: int
+    :param seed: Начальное значение генератора случайных чисел
+    :type seed: int
+    :return: Имена пользователей и вектора их лиц
+    :rtype: list[tuple[str, np.ndarray]]
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=users)] + rng.normal(
+        0, 1, (users, dim),
+    ).astype(np.float32)
+    return [(f'user{index}', vector) for index, vector in enumerate(vectors)]
+
+
+def search_all(
+    index: SearchIndex,
+    queries: np.ndarray,
+    top_k: int,
+    approximate: bool,
+) -> tuple[list[set[str]], float]:
+    """
+    Ищет ближайших пользователей для всех запросов.
+
+    :param index: Индекс поиска
+    :type index: SearchIndex
+    :param queries: Вектора запросов
+    :type queries: np.ndarray
+    :param top_k: Количество ближайших пользователей
+    :type top_k: int
+    :param approximate: Разрешить приближенный поиск
+    :type approximate: bool
+    :return: Найденные имена и медианная задержка в миллисекундах
+    :rtype: tuple[list[set[str]], float]
+    """
+    results: list[set[str]] = []
+    latencies: list[float] = []
+    for query in queries:
+        start = time.perf_counter()
+        matches = index.search(query, top_k, approximate=approximate)
+        latencies.append((time.perf_counter() - start) * 1e3)
+        results.append({match.username for match in matches})
+    return results, round(statistics.median(latencies), 3)
+
+
+def run(  # noqa: WPS210 benchmark locals
+    users: int = 100000,
+    dim: int = 128,
+    nlist: int = 1024,
+    queries: int = 100,
+    top_k: int = 10,
+) -> dict[str, Any]:
+    """
+    Сравнивает полноту и задержку IVF и точного поиска.
+
+    :param users: Количество пользователей
+    :type users: int
+    :param dim: Размерность вектора
+    :type dim: int
+    :param nlist: Количество списков IVF
+    :type nlist: int
+    :param queries: Количество запросов
+    :type queries: int
+    :param top_k: Количество ближайших пользователей
+    :type top_k: int
+    :return: Полнота и задержка для разных nprobe
+    :rtype: dict[str, Any]
+    """
+    embeddings = make_embeddings(users, dim, clusters=nlist // 4)
+    rng = np.random.default_rng(1)
+    query_vectors = np.stack([
+        embeddings[index][1] for index in rng.integers(users, size=queries)
+    ]) + rng.normal(0, 0.5, (queries, dim)).astype(np.float32)
+    exact_index = ExactIndex()
+    exact_index.build(embeddings)
+    expected, exact_latency = search_all(
+        exact_index, query_vectors, top_k, approximate=False,
+    )
+    ivf_index = IVFIndex(nlist=nlist)
+    start = time.perf_counter()
+    ivf_index.build(embeddings)
+    build_seconds = round(time.perf_counter() - start, 3)
+    nprobe_results = []
+    for nprobe in (1, 2, 4, 8, 16, 32, 64):
+        ivf_index.nprobe = nprobe
+        found, latency = search_all(
+            ivf_index, query_vectors, top_k, approximate=True,
+        )
+        recall = statistics.mean(
+            len(found_names & expected_names) / top_k
+            for found_names, expected_names in zip(found, expected)
+        )
+        nprobe_results.append({
+            'nprobe': nprobe,
+            'recall': round(recall, 4),
+            'median_ms': latency,
+        })
+    return {
+        'users': users,
+        'dim': dim,
+        'nlist': nlist,
+        'top_k': top_k,
+        'exact': {'median_ms': exact_latency},
+        'ivf': {'build_s': build_seconds, 'nprobe': nprobe_results},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=run.__doc__)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=128)
+    parser.add_argument('--nlist', type=int, default=1024)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--top-k', type=int, default=10)
+    args = parser.parse_args()
+    report(run(args.users, args.dim, args.nlist, args.queries, args.top_k))
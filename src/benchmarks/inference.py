@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+from app.core.config import RunnerSettings
+from app.core.face_verification import (
+    FaceVerificationService,
+    ModelName,
+    preload_model,
+)
+from app.external.in_memory_storage import InMemoryStorage
+from app.system.runner import AsyncMultiProcessRunner, AsyncThreadRunner
+from benchmarks.represent import default_image
+from benchmarks.timing import report
+
+proc_path = Path('/proc')
+runner_classes = (
+    ('process', AsyncMultiProcessRunner),
+    ('thread', AsyncThreadRunner),
+)
+
+
+def get_rss_mb() -> float:
+    """
+    Считает резидентную память процесса и его дочерних процессов.
+
+    Память читается из /proc, поэтому замер работает только в Linux.
+
+    :return: Резидентная память в мегабайтах
+    :rtype: float
+    """
+    pids = [os.getpid()]
+    for stat_path in proc_path.glob('[0-9]*/stat'):
+        try:
+            stat = stat_path.read_text()
+        except OSError:
+            continue
+        parent_pid = int(stat.rsplit(')', 1)[1].split()[1])
+        if parent_pid == os.getpid():
+            pids.append(int(stat_path.parent.name))
+    rss_kb = 0
+    for pid in pids:
+        try:
+            status = (proc_path / str(pid) / 'status').read_text()
+        except OSError:
+            continue
+        for line in status.splitlines():
+            if line.startswith('VmRSS:'):
+                rss_kb += int(line.split()[1])
+    return round(rss_kb / 1024, 1)
+
+
+async def run_kind(  # noqa: WPS211 benchmark parameters
+    kind: str,
+    img_path: str | Path,
+    model_name: str,
+    workers: int,
+    intra_op_threads: int,
+    inter_op_threads: int,
+    tasks: int,
+    rounds: int,
+) -> dict[str, float]:
+    """
+    Измеряет память и пропускную способность раннера одного вида.
+
+    :param kind: Вид раннера, process или thread
+    :type kind: str
+    :param img_path: Путь к изображению с лицом
+    :type img_path: str | Path
+    :param model_name: Название модели
+    :type model_name: str
+    :param workers: Количество процессов или потоков раннера
+    :type workers: int
+    :param intra_op_threads: Потоки TensorFlow внутри одной операции
+    :type intra_op_threads: int
+    :param inter_op_threads: Потоки TensorFlow для независимых операций
+    :type inter_op_threads: int
+    :param tasks: Количество одновременных изображений
+    :type tasks: int
+    :param rounds: Количество замеров
+    :type rounds: int
+    :return: Изображений в секунду и память раннера
+    :rtype: dict[str, float]
+    """
+    runner_class = dict(runner_classes)[kind]
+    runner = runner_class(
+        RunnerSettings(
+            kind=kind,
+            max_workers=workers,
+            max_tasks_per_child=None,
+            intra_op_threads=intra_op_threads,
+            inter_op_threads=inter_op_threads,
+        ),
+        initializer=preload_model,
+        initargs=(model_name, intra_op_threads, inter_op_threads),
+        name=kind,
+    )
+    service = FaceVerificationService(InMemoryStorage(), runner)
+    rss_before = get_rss_mb()
+    await runner.start()
+    try:
+        await service.represent(img_path, model_name)
+        timings: list[float] = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            await asyncio.gather(*[
+                service.represent(img_path, model_name) for _ in range(tasks)
+            ])
+            timings.append(time.perf_counter() - start)
+        rss = get_rss_mb()
+    finally:
+        await runner.stop()
+    return {
+        'images_per_s': round(tasks / min(timings), 2),
+        'rss_mb': rss,
+        'runner_rss_mb': round(rss - rss_before, 1),
+    }
+
+
+async def run(  # noqa: WPS211 benchmark parameters
+    img_path: str | Path = default_image,
+    model_name: str = ModelName.facenet,
+    workers: int = 2,
+    intra_op_threads: int = 1,
+    inter_op_threads: int = 1,
+    tasks: int = 16,
+    rounds: int = 3,
+) -> dict[str, Any]:
+    """
+    Сравнивает пул процессов и пул потоков раннера на одной модели.
+
+    Оба раннера получают одинаковое количество исполнителей и потоков
+    TensorFlow, то есть одинаковое количество ядер. Пул процессов
+    измеряется первым, потому что модель пула потоков остается
+    загруженной в процессе бенчмарка после остановки раннера.
+    Кэш представлений не используется.
+
+    :param img_path: Путь к изображению с лицом
+    :type img_path: str | Path
+    :param model_name: Название модели
+    :type model_name: str
+    :param workers: Количество процессов или потоков раннера
+    :type workers: int
+    :param intra_op_threads: Потоки TensorFlow внутри одной операции
+    :type intra_op_threads: int
+    :param inter_op_threads: Потоки TensorFlow для независимых операций
+    :type inter_op_threads: int
+    :param tasks: Количество одновременных изображений
+    :type tasks: int
+    :param rounds: Количество замеров
+    :type rounds: int
+    :return: Изображений в секунду и память для каждого вида раннера
+    :rtype: dict[str, Any]
+    """
+    results: dict[str, Any] = {
+        'model_name': str(model_name),
+        'workers': workers,
+        'intra_op_threads': intra_op_threads,
+        'inter_op_threads': inter_op_threads,
+        'tasks': tasks,
+    }
+    for kind, _ in runner_classes:
+        results[kind] = await run_kind(
+            kind,
+            img_path,
+            model_name,
+            workers,
+            intra_op_threads,
+            inter_op_threads,
+            tasks,
+            rounds,
+        )
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=run.__doc__)
+    parser.add_argument('--img-path', default=str(default_image))
+    parser.add_argument('--model-name', default=ModelName.facenet.value)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--intra-op-threads', type=int, default=1)
+    parser.add_argument('--inter-op-threads', type=int, default=1)
+    parser.add_argument('--tasks', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+    report(asyncio.run(run(
+        args.img_path,
+        args.model_name,
+        args.workers,
+        args.intra_op_threads,
+        args.inter_op_threads,
+        args.tasks,
+        args.rounds,
+    )))
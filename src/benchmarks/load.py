@@ -0,0 +1,562 @@
+"""
+Нагрузочный тест обработки сообщений kafka.
+
+Генератор публикует сообщения ``{username, file_path}`` с заданной
+частотой в брокер внутри процесса ``FakeBroker``, который заменяет
+клиент ``AIOKafkaConsumer``, и сохраняет для каждого сообщения
+синтетическое изображение лица в ``kafka.storage_path``.
+``KafkaConsumer`` обрабатывает сообщения с настройками параллельности
+из конфигурации или аргументов командной строки. Задержка сообщения
+считается от публикации до коммита его смещения.
+
+Запускается как ``python -m benchmarks.load`` из директории ``src``.
+С ``--model-ms`` модель заменяется задержкой на изображение, чтобы
+измерить пропускную способность без весов DeepFace.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import shutil
+import statistics
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Callable
+
+import cv2
+import numpy as np
+from aiokafka import ConsumerRecord, TopicPartition
+
+from app.core.config import RunnerSettings, get_settings
+from app.core.face_verification import (
+    FaceVerificationService,
+    ModelName,
+    RepresentedImages,
+    Runner,
+    _represent,
+    _represent_many,
+    preload_model,
+)
+from app.external.in_memory_storage import InMemoryStorage
+from app.external.kafka import KafkaConsumer
+from app.system.runner import AsyncMultiProcessRunner
+from benchmarks.timing import report
+from benchmarks.vector_format import make_vector
+
+image_size = 256
+
+
+class FakeBroker:
+    """
+    Брокер kafka внутри процесса.
+
+    Хранит журналы партиций одного топика и реализует методы
+    ``AIOKafkaConsumer``, которые использует ``KafkaConsumer``.
+    Сообщения распределяются по партициям по ключу, как в kafka.
+    """
+
+    def __init__(
+        self,
+        topic: str,
+        partitions: int = 1,
+        value_deserializer: Callable[[bytes], Any] = json.loads,
+    ) -> None:
+        """
+        Метод инициализации.
+
+        :param topic: Топик
+        :type topic: str
+        :param partitions: Количество партиций
+        :type partitions: int
+        :param value_deserializer: Десериализатор значений сообщений
+        :type value_deserializer: Callable[[bytes], Any]
+        """
+        self.topic = topic
+        self.value_deserializer = value_deserializer
+        self.latencies: list[float] = []
+        self._logs: list[list[ConsumerRecord]] = [
+            [] for _ in range(partitions)
+        ]
+        self._positions = [0] * partitions
+        self._committed = [0] * partitions
+        self._produced_at: list[list[float]] = [[] for _ in range(partitions)]
+        self._next_partition = 0
+        self._available = asyncio.Event()
+
+    @property
+    def produced(self) -> int:
+        """
+        Количество опубликованных сообщений.
+
+        :return: Количество сообщений во всех партициях
+        :rtype: int
+        """
+        return sum(len(log) for log in self._logs)
+
+    @property
+    def committed(self) -> int:
+        """
+        Количество закоммиченных сообщений.
+
+        :return: Сумма закоммиченных смещений партиций
+        :rtype: int
+        """
+        return sum(self._committed)
+
+    def produce(self, key: str, value: dict[str, str]) -> None:
+        """
+        Публикует сообщение.
+
+        :param key: Ключ сообщения
+        :type key: str
+        :param value: Значение сообщения
+        :type value: dict[str, str]
+        """
+        serialized_key = key.encode()
+        serialized_value = json.dumps(value).encode()
+        partition = zlib.crc32(serialized_key) % len(self._logs)
+        log = self._logs[partition]
+        log.append(ConsumerRecord(
+            topic=self.topic,
+            partition=partition,
+            offset=len(log),
+            timestamp=int(time.time() * 1000),
+            timestamp_type=0,
+            key=serialized_key,
+            value=self.value_deserializer(serialized_value),
+            checksum=None,
+            serialized_key_size=len(serialized_key),
+            serialized_value_size=len(serialized_value),
+            headers=[],
+        ))
+        self._produced_at[partition].append(time.perf_counter())
+        self._available.set()
+
+    async def start(self) -> None:
+        """Запускает клиент, брокеру в процессе запуск не нужен."""
+
+    async def stop(self) -> None:
+        """Останавливает клиент, брокеру в процессе остановка не нужна."""
+
+    def __aiter__(self) -> 'FakeBroker':
+        """
+        Возвращает итератор сообщений.
+
+        :return: Брокер
+        :rtype: FakeBroker
+        """
+        return self
+
+    async def __anext__(self) -> ConsumerRecord:
+        """
+        Ждет и возвращает следующее сообщение.
+
+        :return: Сообщение
+        :rtype: ConsumerRecord
+        """
+        while True:  # noqa: WPS457 wait for messages
+            records = self._fetch(1)
+            if records:
+                return records[0]
+            self._available.clear()
+            await self._available.wait()
+
+    async def getmany(
+        self, timeout_ms: int = 0, max_records: int | None = None,
+    ) -> dict[TopicPartition, list[ConsumerRecord]]:
+        """
+        Возвращает накопленные сообщения по партициям.
+
+        :param timeout_ms: Время ожидания сообщений в миллисекундах
+        :type timeout_ms: int
+        :param max_records: Максимальное количество сообщений
+        :type max_records: int | None
+        :return: Сообщения по партициям
+        :rtype: dict[TopicPartition, list[ConsumerRecord]]
+        """
+        if not self._has_records():
+            self._available.clear()
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(
+                    self._available.wait(), timeout_ms / 1000,
+                )
+        records: dict[TopicPartition, list[ConsumerRecord]] = {}
+        for record in self._fetch(max_records or self.produced):
+            partition = TopicPartition(record.topic, record.partition)
+            records.setdefault(partition, []).append(record)
+        return records
+
+    async def commit(self, offsets: dict[TopicPartition, int]) -> None:
+        """
+        Коммитит смещения и сохраняет задержки сообщений.
+
+        :param offsets: Следующие смещения для чтения по партициям
+        :type offsets: dict[TopicPartition, int]
+        """
+        now = time.perf_counter()
+        for partition, offset in offsets.items():
+            committed = self._committed[partition.partition]
+            self.latencies.extend(
+                now - produced_at
+                for produced_at in (
+                    self._produced_at[partition.partition][committed:offset]
+                )
+            )
+            self._committed[partition.partition] = max(committed, offset)
+
+    def assignment(self) -> set[TopicPartition]:
+        """
+        Возвращает партиции, назначенные клиенту.
+
+        :return: Все партиции топика
+        :rtype: set[TopicPartition]
+        """
+        return {
+            TopicPartition(self.topic, partition)
+            for partition in range(len(self._logs))
+        }
+
+    def seek(self, partition: TopicPartition, offset: int) -> None:
+        """
+        Переносит чтение партиции на смещение.
+
+        :param partition: Партиция
+        :type partition: TopicPartition
+        :param offset: Смещение
+        :type offset: int
+        """
+        self._positions[partition.partition] = offset
+        self._available.set()
+
+    def highwater(self, partition: TopicPartition) -> int:
+        """
+        Возвращает смещение следующего сообщения партиции.
+
+        :param partition: Партиция
+        :type partition: TopicPartition
+        :return: Количество сообщений в партиции
+        :rtype: int
+        """
+        return len(self._logs[partition.partition])
+
+    def _has_records(self) -> bool:
+        return any(
+            position < len(log)
+            for position, log in zip(self._positions, self._logs)
+        )
+
+    def _fetch(self, max_records: int) -> list[ConsumerRecord]:
+        records: list[ConsumerRecord] = []
+        for _ in range(len(self._logs)):
+            partition = self._next_partition
+            self._next_partition = (partition + 1) % len(self._logs)
+            position = self._positions[partition]
+            fetched = self._logs[partition][
+                position:position + max_records - len(records)
+            ]
+            self._positions[partition] += len(fetched)
+            records.extend(fetched)
+            if len(records) == max_records:
+                break
+        return records
+
+
+class SimulatedRunner:
+    """
+    Раннер, заменяющий модель задержкой на изображение.
+
+    Одновременно выполняется не более workers задач,
+    как в пуле процессов раннера.
+    """
+
+    def __init__(self, workers: int, image_ms: float, dim: int = 128) -> None:
+        """
+        Метод инициализации.
+
+        :param workers: Количество одновременных задач
+        :type workers: int
+        :param image_ms: Время обработки изображения в миллисекундах
+        :type image_ms: float
+        :param dim: Размерность вектора лица
+        :type dim: int
+        """
+        self.image_ms = image_ms
+        self.dim = dim
+        self._workers = asyncio.Semaphore(workers)
+
+    async def start(self) -> None:
+        """Запускает раннер, процессы не создаются."""
+
+    async def stop(self) -> None:
+        """Останавливает раннер, процессы не создаются."""
+
+    async def run(self, func: Callable[..., Any], **kwargs) -> Any:
+        """
+        Имитирует вычисление представлений изображений.
+
+        :param func: Функция получения представлений
+        :type func: Callable[..., Any]
+        :param kwargs: Аргументы функции
+        :type kwargs: Any
+        :return: Представления в формате результата функции
+        :rtype: Any
+        """
+        images = len(kwargs.get('img_paths', [kwargs.get('img_path')]))
+        async with self._workers:
+            await asyncio.sleep(self.image_ms * images / 1000)
+        if func in (_represent, _represent_many):
+            return RepresentedImages(
+                [(make_vector(1, self.dim), None) for _ in range(images)], {},
+            )
+        return make_vector(1, self.dim)
+
+
+def make_face_image(path: Path, rng: np.random.Generator) -> None:
+    """
+    Рисует синтетическое изображение лица.
+
+    :param path: Путь к файлу изображения
+    :type path: Path
+    :param rng: Генератор случайных чисел
+    :type rng: np.random.Generator
+    """
+    image = rng.integers(
+        0, 256, (image_size, image_size, 3), dtype=np.uint8,
+    )
+    center = image_size // 2
+    skin = tuple(int(channel) for channel in rng.integers(120, 220, 3))
+    cv2.ellipse(image, (center, center), (70, 90), 0, 0, 360, skin, -1)
+    for eye_x in (center - 28, center + 28):
+        cv2.circle(image, (eye_x, center - 20), 9, (40, 40, 40), -1)
+    cv2.ellipse(
+        image, (center, center + 40), (26, 10), 0, 0, 180, (60, 40, 150), 3,
+    )
+    cv2.imwrite(str(path), image)
+
+
+def make_templates(directory: Path, images: int) -> list[Path]:
+    """
+    Создает шаблоны изображений лиц.
+
+    :param directory: Директория шаблонов
+    :type directory: Path
+    :param images: Количество шаблонов
+    :type images: int
+    :return: Пути к шаблонам
+    :rtype: list[Path]
+    """
+    rng = np.random.default_rng(0)
+    templates = [directory / f'face{index}.jpg' for index in range(images)]
+    for template in templates:
+        make_face_image(template, rng)
+    return templates
+
+
+async def produce(
+    broker: FakeBroker,
+    templates: list[Path],
+    rate: float,
+    duration: float,
+    users: int,
+) -> None:
+    """
+    Публикует сообщения с постоянной частотой.
+
+    Изображение сообщения копируется из шаблона, потому что
+    сервис удаляет изображение после обработки.
+
+    :param broker: Брокер
+    :type broker: FakeBroker
+    :param templates: Шаблоны изображений
+    :type templates: list[Path]
+    :param rate: Сообщений в секунду
+    :type rate: float
+    :param duration: Длительность публикации в секундах
+    :type duration: float
+    :param users: Количество пользователей
+    :type users: int
+    """
+    storage_path = Path(get_settings().kafka.storage_path)
+    rng = np.random.default_rng(1)
+    started = time.perf_counter()
+    for index in range(int(rate * duration)):
+        delay = started + index / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        username = f'load{rng.integers(users)}'
+        img_path = storage_path / f'{username}-{index}.jpg'
+        shutil.copyfile(templates[index % len(templates)], img_path)
+        broker.produce(
+            username, {'username': username, 'file_path': str(img_path)},
+        )
+
+
+async def sample_backlog(
+    broker: FakeBroker, interval: float, timeline: list[dict[str, Any]],
+) -> None:
+    """
+    Периодически сохраняет количество необработанных сообщений.
+
+    :param broker: Брокер
+    :type broker: FakeBroker
+    :param interval: Интервал в секундах
+    :type interval: float
+    :param timeline: Список замеров
+    :type timeline: list[dict[str, Any]]
+    """
+    started = time.perf_counter()
+    while True:  # noqa: WPS457 sample until cancelled
+        await asyncio.sleep(interval)
+        timeline.append({
+            'time_s': round(time.perf_counter() - started, 3),
+            'produced': broker.produced,
+            'committed': broker.committed,
+            'backlog': broker.produced - broker.committed,
+        })
+
+
+async def run(  # noqa: WPS210, WPS211 load test parameters
+    rate: float = 50,
+    duration: float = 30,
+    users: int = 1000,
+    partitions: int = 4,
+    images: int = 16,
+    workers: int = 2,
+    model_ms: float | None = None,
+    sample_interval: float = 1,
+    drain_timeout: float = 60,
+) -> dict[str, Any]:
+    """
+    Нагружает KafkaConsumer сообщениями с постоянной частотой.
+
+    :param rate: Сообщений в секунду
+    :type rate: float
+    :param duration: Длительность публикации в секундах
+    :type duration: float
+    :param users: Количество пользователей
+    :type users: int
+    :param partitions: Количество партиций топика
+    :type partitions: int
+    :param images: Количество шаблонов изображений
+    :type images: int
+    :param workers: Количество процессов раннера
+    :type workers: int
+    :param model_ms: Время обработки изображения вместо модели
+    :type model_ms: float | None
+    :param sample_interval: Интервал замеров очереди в секундах
+    :type sample_interval: float
+    :param drain_timeout: Время ожидания обработки после публикации
+    :type drain_timeout: float
+    :return: Пропускная способность, задержки и очередь по времени
+    :rtype: dict[str, Any]
+    """
+    settings = get_settings().kafka
+    runner: Runner = (
+        SimulatedRunner(workers, model_ms) if model_ms is not None
+        else AsyncMultiProcessRunner(
+            RunnerSettings(max_workers=workers, max_tasks_per_child=None),
+            initializer=preload_model,
+            initargs=(ModelName.facenet.value,),
+        )
+    )
+    broker = FakeBroker(settings.topics, partitions)
+    consumer = KafkaConsumer(
+        FaceVerificationService(InMemoryStorage(), runner), broker,
+    )
+    timeline: list[dict[str, Any]] = []
+    await runner.start()
+    with tempfile.TemporaryDirectory() as templates_path:
+        templates = make_templates(Path(templates_path), images)
+        consume_task = asyncio.create_task(consumer.consume())
+        sample_task = asyncio.create_task(
+            sample_backlog(broker, sample_interval, timeline),
+        )
+        started = time.perf_counter()
+        try:
+            await produce(broker, templates, rate, duration, users)
+            drain_deadline = time.perf_counter() + drain_timeout
+            while broker.committed < broker.produced and (
+                time.perf_counter() < drain_deadline
+            ):
+                await asyncio.sleep(sample_interval / 10)
+            elapsed = time.perf_counter() - started
+        finally:
+            consume_task.cancel()
+            sample_task.cancel()
+            await asyncio.gather(
+                consume_task, sample_task, return_exceptions=True,
+            )
+            await runner.stop()
+    return {
+        'config': {
+            'rate': rate,
+            'duration_s': duration,
+            'partitions': partitions,
+            'workers': workers,
+            'model_ms': model_ms,
+            'batch_size': settings.batch_size,
+            'micro_batch_size': settings.micro_batch_size,
+            'max_in_flight': settings.max_in_flight,
+            'linger_ms': settings.linger_ms,
+        },
+        'produced': broker.produced,
+        'committed': broker.committed,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_per_s': round(broker.committed / elapsed, 1),
+        'latency_ms': get_percentiles(broker.latencies),
+        'backlog': timeline,
+    }
+
+
+def get_percentiles(latencies: list[float]) -> dict[str, float]:
+    """
+    Считает перцентили задержек.
+
+    :param latencies: Задержки в секундах
+    :type latencies: list[float]
+    :return: Перцентили задержек в миллисекундах
+    :rtype: dict[str, float]
+    """
+    if len(latencies) < 2:
+        return {}
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        'p50': round(quantiles[49] * 1e3, 3),
+        'p90': round(quantiles[89] * 1e3, 3),
+        'p99': round(quantiles[98] * 1e3, 3),
+        'max': round(max(latencies) * 1e3, 3),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=run.__doc__)
+    parser.add_argument('--rate', type=float, default=50)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--partitions', type=int, default=4)
+    parser.add_argument('--images', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--model-ms', type=float)
+    parser.add_argument('--batch-size', type=int)
+    parser.add_argument('--micro-batch-size', type=int)
+    parser.add_argument('--max-in-flight', type=int)
+    parser.add_argument('--linger-ms', type=int)
+    args = parser.parse_args()
+    kafka_settings = get_settings().kafka
+    concurrency = (
+        'batch_size', 'micro_batch_size', 'max_in_flight', 'linger_ms',
+    )
+    for name in concurrency:
+        if getattr(args, name) is not None:
+            setattr(kafka_settings, name, getattr(args, name))
+    report(asyncio.run(run(
+        args.rate,
+        args.duration,
+        args.users,
+        args.partitions,
+        args.images,
+        args.workers,
+        args.model_ms,
+    )))
@@ -0,0 +1,87 @@
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Any
+
+import cv2
+import numpy as np
+
+from app.core.preprocessing import ImageLoader
+from benchmarks.timing import measure, report
+
+
+def detect_faces(pixels: np.ndarray) -> Any:
+    """
+    Ищет лица каскадом Хаара, как детектор opencv в DeepFace.
+
+    :param pixels: Изображение BGR
+    :type pixels: np.ndarray
+    :return: Области лиц
+    :rtype: Any
+    """
+    cascade = cv2.CascadeClassifier(
+        f'{cv2.data.haarcascades}haarcascade_frontalface_default.xml',
+    )
+    return cascade.detectMultiScale(
+        cv2.cvtColor(pixels, cv2.COLOR_BGR2GRAY), 1.1, 10,
+    )
+
+
+def run(
+    width: int = 4000,
+    height: int = 3000,
+    max_side: int = 1280,
+    number: int = 5,
+) -> dict[str, Any]:
+    """
+    Сравнивает полное декодирование фотографии и ImageLoader.
+
+    Поиск лиц на полном изображении медленный,
+    поэтому он измеряется одним вызовом.
+
+    :param width: Ширина фотографии
+    :type width: int
+    :param height: Высота фотографии
+    :type height: int
+    :param max_side: Наибольшая сторона изображения после загрузки
+    :type max_side: int
+    :param number: Количество вызовов в одном замере
+    :type number: int
+    :return: Время декодирования и поиска лиц в микросекундах
+    :rtype: dict[str, Any]
+    """
+    rng = np.random.default_rng(0)
+    photo = cv2.resize(
+        rng.integers(0, 256, (height // 10, width // 10, 3), dtype=np.uint8),
+        (width, height),
+        interpolation=cv2.INTER_CUBIC,
+    )
+    loader = ImageLoader(max_side=max_side)
+    with tempfile.TemporaryDirectory() as directory:
+        img_path = str(Path(directory) / 'photo.jpg')
+        cv2.imwrite(img_path, photo)
+        full_image = cv2.imread(img_path)
+        loaded_image = loader.load(img_path).pixels
+        return {
+            'width': width,
+            'height': height,
+            'max_side': max_side,
+            'full_decode': measure(lambda: cv2.imread(img_path), number),
+            'image_loader': measure(lambda: loader.load(img_path), number),
+            'full_detect': measure(
+                lambda: detect_faces(full_image), number=1, repeat=1,
+            ),
+            'loaded_detect': measure(
+                lambda: detect_faces(loaded_image), number=1, repeat=1,
+            ),
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=run.__doc__)
+    parser.add_argument('--width', type=int, default=4000)
+    parser.add_argument('--height', type=int, default=3000)
+    parser.add_argument('--max-side', type=int, default=1280)
+    parser.add_argument('--number', type=int, default=5)
+    args = parser.parse_args()
+    report(run(args.width, args.height, args.max_side, args.number))
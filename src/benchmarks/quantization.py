@@ -0,0 +1,104 @@
+import argparse
+import statistics
+from typing import Any
+
+import numpy as np
+
+from app.core.embedding import VectorDtype, encode_vector
+from app.core.face_verification import ModelName
+from app.external.index.exact import ExactIndex
+from benchmarks.ann import make_embeddings, search_all
+from benchmarks.timing import report
+from benchmarks.vector_format import make_vector
+
+
+def get_top_distances(index: ExactIndex, queries: np.ndarray) -> np.ndarray:
+    """
+    Находит расстояние до ближайшего пользователя для каждого запроса.
+
+    :param index: Индекс поиска
+    :type index: ExactIndex
+    :param queries: Вектора запросов
+    :type queries: np.ndarray
+    :return: Косинусные расстояния до ближайших пользователей
+    :rtype: np.ndarray
+    """
+    return np.array([
+        index.search(query, top_k=1)[0].distance for query in queries
+    ])
+
+
+def run(  # noqa: WPS210 benchmark locals
+    users: int = 100000,
+    dim: int = 128,
+    queries: int = 100,
+    top_k: int = 10,
+) -> dict[str, Any]:
+    """
+    Сравнивает точный поиск по векторам float32, float16 и int8.
+
+    Для каждого типа выводятся память сегмента индекса, размер
+    закодированного вектора в базе данных, полнота top_k
+    относительно float32, ошибка расстояния до ближайшего
+    пользователя и медианная задержка поиска.
+
+    :param users: Количество пользователей
+    :type users: int
+    :param dim: Размерность вектора
+    :type dim: int
+    :param queries: Количество запросов
+    :type queries: int
+    :param top_k: Количество ближайших пользователей
+    :type top_k: int
+    :return: Память, полнота и задержка для каждого типа
+    :rtype: dict[str, Any]
+    """
+    embeddings = make_embeddings(users, dim, clusters=max(users // 400, 1))
+    rng = np.random.default_rng(1)
+    query_vectors = np.stack([
+        embeddings[index][1] for index in rng.integers(users, size=queries)
+    ]) + rng.normal(0, 0.5, (queries, dim)).astype(np.float32)
+    vector = make_vector(1, dim)
+    expected: list[set[str]] = []
+    expected_distances = np.empty(0)
+    float32_bytes = 0
+    results: dict[str, Any] = {'users': users, 'dim': dim, 'top_k': top_k}
+    for dtype in VectorDtype:
+        index = ExactIndex(dtype=dtype)
+        index.build(embeddings)
+        segment = index._segment  # noqa: WPS437 measured memory
+        index_bytes = segment.vectors.nbytes + segment.scales.nbytes
+        found, latency = search_all(
+            index, query_vectors, top_k, approximate=False,
+        )
+        distances = get_top_distances(index, query_vectors)
+        if dtype == VectorDtype.float32:
+            expected, expected_distances = found, distances
+            float32_bytes = index_bytes
+        recall = statistics.mean(
+            len(found_names & expected_names) / top_k
+            for found_names, expected_names in zip(found, expected)
+        )
+        results[dtype.value] = {
+            'index_mb': round(index_bytes / 2 ** 20, 2),
+            'memory_saved': round(1 - index_bytes / float32_bytes, 3),
+            'encoded_bytes': len(
+                encode_vector(vector, ModelName.facenet, dtype),
+            ),
+            'recall': round(recall, 4),
+            'max_distance_error': float(
+                np.max(np.abs(distances - expected_distances)),
+            ),
+            'median_ms': latency,
+        }
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=run.__doc__)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=128)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--top-k', type=int, default=10)
+    args = parser.parse_args()
+    report(run(args.users, args.dim, args.queries, args.top_k))
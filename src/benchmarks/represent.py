@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import time
+from pathlib import Path
+from typing import Any
+
+from app.core.config import RunnerSettings
+from app.core.face_verification import (
+    FaceVerificationService,
+    ModelName,
+    preload_model,
+)
+from app.external.in_memory_storage import InMemoryStorage
+from app.system.runner import AsyncMultiProcessRunner
+from benchmarks.timing import report
+
+default_image = Path(__file__).parents[1] / 'tests' / 'test_data' / 'me.jpg'
+
+
+async def run(
+    img_path: str | Path = default_image,
+    model_name: str = ModelName.facenet,
+    batch_size: int = 8,
+    rounds: int = 5,
+    workers: int = 1,
+) -> dict[str, Any]:
+    """
+    Сравнивает одиночное и пакетное получение представлений.
+
+    Модель загружается в процессах раннера до замеров, кэш
+    представлений не используется.
+
+    :param img_path: Путь к изображению с лицом
+    :type img_path: str | Path
+    :param model_name: Название модели
+    :type model_name: str
+    :param batch_size: Количество изображений в пакете
+    :type batch_size: int
+    :param rounds: Количество замеров
+    :type rounds: int
+    :param workers: Количество процессов раннера
+    :type workers: int
+    :return: Время обработки одного изображения в миллисекундах
+    :rtype: dict[str, Any]
+    """
+    runner = AsyncMultiProcessRunner(
+        RunnerSettings(max_workers=workers, max_tasks_per_child=None),
+        initializer=preload_model,
+        initargs=(model_name,),
+    )
+    service = FaceVerificationService(InMemoryStorage(), runner)
+    img_paths = [img_path] * batch_size
+    await runner.start()
+    try:
+        await service.represent(img_path, model_name)
+        single: list[float] = []
+        batch: list[float] = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for path in img_paths:
+                await service.represent(path, model_name)
+            single.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            await service.represent_many(img_paths, model_name)
+            batch.append(time.perf_counter() - start)
+    finally:
+        await runner.stop()
+    return {
+        'model_name': str(model_name),
+        'batch_size': batch_size,
+        'single_ms_per_image': round(min(single) / batch_size * 1e3, 3),
+        'batch_ms_per_image': round(min(batch) / batch_size * 1e3, 3),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=run.__doc__)
+    parser.add_argument('--img-path', default=str(default_image))
+    parser.add_argument('--model-name', default=ModelName.facenet.value)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+    report(asyncio.run(run(
+        args.img_path,
+        args.model_name,
+        args.batch_size,
+        args.rounds,
+        args.workers,
+    )))
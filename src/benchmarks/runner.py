@@ -0,0 +1,171 @@
+import argparse
+import asyncio
+from typing import Any
+
+import numpy as np
+
+from app.core.config import RunnerSettings
+from app.system.runner import AsyncMultiProcessRunner
+from app.system.shared_memory import share_array
+from benchmarks.timing import measure, measure_async, report
+
+
+def echo(payload: bytes) -> int:
+    """
+    Возвращает размер данных, имитируя задачу без вычислений.
+
+    :param payload: Данные задачи
+    :type payload: bytes
+    :return: Размер данных
+    :rtype: int
+    """
+    return len(payload)
+
+
+def embed_batch(
+    rows: int, dim: int, result_format: str,
+) -> list[list[float]] | Any:
+    """
+    Возвращает матрицу векторов пакета, имитируя вычисление векторов.
+
+    :param rows: Количество лиц в пакете
+    :type rows: int
+    :param dim: Размерность вектора
+    :type dim: int
+    :param result_format: Формат результата: list - списки чисел,
+        array - массив через pipe, shared - массив через разделяемую память
+    :type result_format: str
+    :return: Вектора лиц
+    :rtype: list[list[float]] | Any
+    """
+    embeddings = np.ones((rows, dim), dtype=np.float32)
+    if result_format == 'list':
+        return embeddings.tolist()
+    if result_format == 'shared':
+        return share_array(embeddings)
+    return embeddings
+
+
+async def measure_batch_results(
+    workers: int, rows: int, dim: int, number: int,
+) -> dict[str, Any]:
+    """
+    Сравнивает форматы возврата матрицы векторов из процесса раннера.
+
+    :param workers: Количество процессов раннера
+    :type workers: int
+    :param rows: Количество лиц в пакете
+    :type rows: int
+    :param dim: Размерность вектора
+    :type dim: int
+    :param number: Количество вызовов в одном замере
+    :type number: int
+    :return: Время вызова для каждого формата результата
+    :rtype: dict[str, Any]
+    """
+    runner = AsyncMultiProcessRunner(RunnerSettings(
+        max_workers=workers,
+        max_tasks_per_child=None,
+        shared_memory_slots=workers * 2,
+        shared_memory_slot_size=rows * dim * 4,
+    ))
+    await runner.start()
+    results: dict[str, Any] = {'rows': rows, 'dim': dim}
+    try:
+        for result_format in ('list', 'array', 'shared'):
+            results[result_format] = await measure_async(
+                lambda: runner.run(
+                    embed_batch, rows=rows, dim=dim,
+                    result_format=result_format,  # noqa: B023 awaited here
+                ),
+                number,
+            )
+    finally:
+        await runner.stop()
+    return results
+
+
+async def run_concurrent(
+    runner: AsyncMultiProcessRunner, payload: bytes, tasks: int,
+) -> None:
+    """
+    Запускает несколько задач в раннере одновременно.
+
+    :param runner: Раннер
+    :type runner: AsyncMultiProcessRunner
+    :param payload: Данные задачи
+    :type payload: bytes
+    :param tasks: Количество одновременных задач
+    :type tasks: int
+    """
+    await asyncio.gather(*[
+        runner.run(echo, payload=payload) for _ in range(tasks)
+    ])
+
+
+async def run(
+    workers: int = 2,
+    payload_size: int = 1024,
+    number: int = 200,
+    rows: int = 256,
+    dim: int = 512,
+) -> dict[str, Any]:
+    """
+    Измеряет накладные расходы раннера на один вызов.
+
+    Отдельно сравнивается возврат матрицы векторов пакета
+    списками чисел, массивом через pipe и через разделяемую память.
+
+    :param workers: Количество процессов раннера
+    :type workers: int
+    :param payload_size: Размер передаваемых данных в байтах
+    :type payload_size: int
+    :param number: Количество вызовов в одном замере
+    :type number: int
+    :param rows: Количество лиц в пакете
+    :type rows: int
+    :param dim: Размерность вектора
+    :type dim: int
+    :return: Время прямого вызова и вызовов через раннер
+    :rtype: dict[str, Any]
+    """
+    payload = bytes(payload_size)
+    runner = AsyncMultiProcessRunner(
+        RunnerSettings(max_workers=workers, max_tasks_per_child=None),
+    )
+    await runner.start()
+    try:
+        sequential = await measure_async(
+            lambda: runner.run(echo, payload=payload), number,
+        )
+        concurrent = await measure_async(
+            lambda: run_concurrent(runner, payload, workers * 4), number // 10,
+        )
+    finally:
+        await runner.stop()
+    return {
+        'workers': workers,
+        'payload_bytes': payload_size,
+        'direct': measure(lambda: echo(payload), number),
+        'sequential': sequential,
+        'concurrent': {
+            'tasks': workers * 4,
+            **concurrent,
+        },
+        'batch_result': await measure_batch_results(
+            workers, rows, dim, number // 10,
+        ),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=run.__doc__)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--payload-size', type=int, default=1024)
+    parser.add_argument('--number', type=int, default=200)
+    parser.add_argument('--rows', type=int, default=256)
+    parser.add_argument('--dim', type=int, default=512)
+    args = parser.parse_args()
+    report(asyncio.run(run(
+        args.workers, args.payload_size, args.number, args.rows, args.dim,
+    )))
@@ -0,0 +1,188 @@
+import argparse
+import asyncio
+import time
+from typing import Any
+
+from sqlalchemy import Engine, delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.embedding import encode_vector
+from app.core.face_verification import ModelName, Storage
+from app.external.in_memory_storage import InMemoryStorage
+from app.external.postgres import models as db
+from app.external.postgres.storage import DBStorage
+from benchmarks.timing import measure, report
+from benchmarks.vector_format import make_vector
+
+username_prefix = 'benchmark-'
+
+
+def orm_update_user(
+    pool: Engine, vector: list[dict[str, Any]], username: str,
+) -> None:
+    """
+    Обновляет пользователя через ORM сессию, как DBStorage до 0.8.0.
+
+    :param pool: sqlalchemy engine
+    :type pool: Engine
+    :param vector: Вектор лица пользователя
+    :type vector: list[dict[str, Any]]
+    :param username: Имя пользователя
+    :type username: str
+    """
+    with Session(pool) as session:
+        user = session.scalars(
+            select(db.User).where(db.User.username == username),
+        ).first()
+        if not user or user.is_deleted is True:
+            return
+        user.is_verified = True
+        user.vector = encode_vector(vector, ModelName.facenet)
+        user.vector_updated_at = func.now()
+        session.commit()
+
+
+async def update_throughput(
+    storage: Storage, usernames: list[str], dim: int, batch_size: int,
+) -> dict[str, float]:
+    """
+    Измеряет скорость одиночного и пакетного обновления пользователей.
+
+    :param storage: Хранилище
+    :type storage: Storage
+    :param usernames: Имена существующих пользователей
+    :type usernames: list[str]
+    :param dim: Размерность вектора лица
+    :type dim: int
+    :param batch_size: Размер пакета обновления
+    :type batch_size: int
+    :return: Количество обновленных пользователей в секунду
+    :rtype: dict[str, float]
+    """
+    vectors = [(username, make_vector(1, dim)) for username in usernames]
+    start = time.perf_counter()
+    for username, vector in vectors:
+        await storage.update_user(vector, username)
+    single = len(vectors) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), batch_size):
+        await storage.update_users_bulk(vectors[offset:offset + batch_size])
+    bulk = len(vectors) / (time.perf_counter() - start)
+    return {
+        'single_users_per_s': round(single, 1),
+        'bulk_users_per_s': round(bulk, 1),
+    }
+
+
+async def run_in_memory(
+    users: int, dim: int, batch_size: int,
+) -> dict[str, float]:
+    """
+    Измеряет скорость обновления InMemoryStorage.
+
+    :param users: Количество пользователей
+    :type users: int
+    :param dim: Размерность вектора лица
+    :type dim: int
+    :param batch_size: Размер пакета обновления
+    :type batch_size: int
+    :return: Количество обновленных пользователей в секунду
+    :rtype: dict[str, float]
+    """
+    usernames = [f'{username_prefix}{index}' for index in range(users)]
+    return await update_throughput(
+        InMemoryStorage(), usernames, dim, batch_size,
+    )
+
+
+async def run_postgres(
+    users: int, dim: int, batch_size: int,
+) -> dict[str, Any]:
+    """
+    Измеряет скорость обновления DBStorage.
+
+    Пользователи бенчмарка создаются в базе данных из конфигурации
+    и удаляются после замера.
+
+    :param users: Количество пользователей
+    :type users: int
+    :param dim: Размерность вектора лица
+    :type dim: int
+    :param batch_size: Размер пакета обновления
+    :type batch_size: int
+    :return: Количество обновленных пользователей в секунду и время
+        одного обновления через ORM сессию и через DBStorage
+    :rtype: dict[str, Any]
+    """
+    storage = DBStorage()
+    usernames = [f'{username_prefix}{index}' for index in range(users)]
+    remove_users = delete(db.User).where(
+        db.User.username.startswith(username_prefix),
+    )
+    with storage.pool.begin() as connection:
+        connection.execute(remove_users)
+        connection.execute(insert(db.User), [
+            {'username': username, 'hashed_password': ''}
+            for username in usernames
+        ])
+    vector = make_vector(1, dim)
+    number = max(len(usernames) // 10, 1)
+    try:
+        return {
+            **await update_throughput(storage, usernames, dim, batch_size),
+            'orm_update_user': measure(
+                lambda: orm_update_user(storage.pool, vector, usernames[0]),
+                number,
+            ),
+            'core_update_user': measure(
+                lambda: storage._update_user(vector, usernames[0]),  # noqa: WPS437, E501
+                number,
+            ),
+        }
+    finally:
+        with storage.pool.begin() as connection:
+            connection.execute(remove_users)
+        await storage.close()
+
+
+async def run(
+    users: int = 1000,
+    dim: int = 128,
+    batch_size: int = 100,
+    postgres: bool = False,
+) -> dict[str, Any]:
+    """
+    Измеряет скорость обновления пользователей в хранилищах.
+
+    :param users: Количество пользователей
+    :type users: int
+    :param dim: Размерность вектора лица
+    :type dim: int
+    :param batch_size: Размер пакета обновления
+    :type batch_size: int
+    :param postgres: Измерить DBStorage на базе данных из конфигурации
+    :type postgres: bool
+    :return: Количество обновленных пользователей в секунду
+    :rtype: dict[str, Any]
+    """
+    results: dict[str, Any] = {
+        'users': users,
+        'dim': dim,
+        'batch_size': batch_size,
+        'in_memory': await run_in_memory(users, dim, batch_size),
+    }
+    if postgres:
+        results['postgres'] = await run_postgres(users, dim, batch_size)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=run.__doc__)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--dim', type=int, default=128)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--postgres', action='store_true')
+    args = parser.parse_args()
+    report(asyncio.run(
+        run(args.users, args.dim, args.batch_size, args.postgres),
+    ))
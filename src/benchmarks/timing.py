@@ -0,0 +1,70 @@
+import json
+import statistics
+import sys
+import time
+import timeit
+from typing import Any, Awaitable, Callable
+
+
+def measure(
+    func: Callable[[], Any], number: int = 1000, repeat: int = 5,
+) -> dict[str, float]:
+    """
+    Измеряет время выполнения функции.
+
+    :param func: Измеряемая функция без аргументов
+    :type func: Callable[[], Any]
+    :param number: Количество вызовов в одном замере
+    :type number: int
+    :param repeat: Количество замеров
+    :type repeat: int
+    :return: Минимальное и медианное время одного вызова в микросекундах
+    :rtype: dict[str, float]
+    """
+    timings = [
+        total / number * 1e6
+        for total in timeit.repeat(func, number=number, repeat=repeat)
+    ]
+    return _summarize(timings)
+
+
+async def measure_async(
+    func: Callable[[], Awaitable[Any]], number: int = 100, repeat: int = 5,
+) -> dict[str, float]:
+    """
+    Измеряет время выполнения асинхронной функции.
+
+    :param func: Измеряемая асинхронная функция без аргументов
+    :type func: Callable[[], Awaitable[Any]]
+    :param number: Количество вызовов в одном замере
+    :type number: int
+    :param repeat: Количество замеров
+    :type repeat: int
+    :return: Минимальное и медианное время одного вызова в микросекундах
+    :rtype: dict[str, float]
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):  # noqa: WPS440 nested timing loop
+            await func()
+        timings.append((time.perf_counter() - start) / number * 1e6)
+    return _summarize(timings)
+
+
+def report(results: dict[str, Any]) -> None:
+    """
+    Выводит результаты бенчмарка в формате JSON.
+
+    :param results: Результаты бенчмарка
+    :type results: dict[str, Any]
+    """
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+def _summarize(timings: list[float]) -> dict[str, float]:
+    return {
+        'min_us': round(min(timings), 3),
+        'median_us': round(statistics.median(timings), 3),
+    }
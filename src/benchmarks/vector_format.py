@@ -0,0 +1,82 @@
+import argparse
+import pickle  # noqa: S403 compared format
+import random
+from typing import Any
+
+from app.core.embedding import decode_vector, encode_vector
+from app.core.face_verification import ModelName
+from benchmarks.timing import measure, report
+
+
+def make_vector(faces: int, dim: int) -> list[dict[str, Any]]:
+    """
+    Создает вектор в формате результата DeepFace.represent.
+
+    :param faces: Количество лиц
+    :type faces: int
+    :param dim: Размерность вектора лица
+    :type dim: int
+    :return: Список вложенных векторов
+    :rtype: list[dict[str, Any]]
+    """
+    return [
+        {
+            'embedding': [random.gauss(0, 1) for _ in range(dim)],  # noqa: S311, E501
+            'facial_area': {
+                'x': 10,
+                'y': 20,
+                'w': 160,
+                'h': 160,
+                'left_eye': (50, 60),
+                'right_eye': (110, 60),
+            },
+            'face_confidence': 0.98,
+        }
+        for _ in range(faces)
+    ]
+
+
+def run(faces: int = 1, dim: int = 128, number: int = 1000) -> dict[str, Any]:
+    """
+    Сравнивает pickle и компактный формат векторов.
+
+    :param faces: Количество лиц
+    :type faces: int
+    :param dim: Размерность вектора лица
+    :type dim: int
+    :param number: Количество вызовов в одном замере
+    :type number: int
+    :return: Размеры и время кодирования и декодирования
+    :rtype: dict[str, Any]
+    """
+    vector = make_vector(faces, dim)
+    pickled = pickle.dumps(vector)
+    encoded = encode_vector(vector, ModelName.facenet)
+    return {
+        'faces': faces,
+        'dim': dim,
+        'pickle': {
+            'size_bytes': len(pickled),
+            'encode': measure(lambda: pickle.dumps(vector), number),
+            'decode': measure(lambda: pickle.loads(pickled), number),  # noqa: S301, E501
+        },
+        'compact': {
+            'size_bytes': len(encoded),
+            'encode': measure(
+                lambda: encode_vector(vector, ModelName.facenet), number,
+            ),
+            'decode': measure(lambda: decode_vector(encoded), number),
+            'decode_to_vector': measure(
+                lambda: decode_vector(encoded).to_vector(), number,
+            ),
+        },
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=run.__doc__)
+    parser.add_argument('--faces', type=int, default=1)
+    parser.add_argument('--dim', type=int, default=128)
+    parser.add_argument('--number', type=int, default=1000)
+    args = parser.parse_args()
+    report(run(args.faces, args.dim, args.number))
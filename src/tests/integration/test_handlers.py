@@ -2,6 +2,9 @@ import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
 
+from app.core.config import get_settings
+from app.core.errors import ModelNotEnabledError, NotFoundError
+from app.core.models import Match, Verification
 from app.service import app
 
 
@@ -16,3 +19,215 @@ def test_root(client):
     response = client.get('/')
     assert response.status_code == status.HTTP_200_OK
     assert response.json() == {'message': 'server is running'}
+
+
+class StubRunner:
+    """Заглушка раннера."""
+
+    def __init__(self, is_ready: bool) -> None:
+        """Метод инициализации."""
+        self.is_ready = is_ready
+
+
+@pytest.mark.parametrize(
+    'runner, expected_status', (
+        pytest.param(
+            StubRunner(is_ready=True),
+            status.HTTP_200_OK,
+            id='runner is ready',
+        ),
+        pytest.param(
+            StubRunner(is_ready=False),
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            id='runner is not ready',
+        ),
+    ),
+)
+def test_ready(runner, expected_status, client):
+    """Тестирует проверку готовности сервиса."""
+    app.state.runner = runner
+    try:
+        response = client.get('/healthz/ready')
+    finally:
+        del app.state.runner  # noqa: WPS420 cleanup app state
+
+    assert response.status_code == expected_status
+
+
+def test_ready_with_failed_task(client):
+    """Тестирует что сервис не готов после ошибки фоновой задачи."""
+    app.state.runner = StubRunner(is_ready=True)
+    app.state.failed_tasks = {'consume'}
+    try:
+        response = client.get('/healthz/ready')
+    finally:
+        del app.state.runner  # noqa: WPS420 cleanup app state
+        del app.state.failed_tasks  # noqa: WPS420 cleanup app state
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert 'consume' in response.json()['detail']
+
+
+def test_ready_without_runner(client):
+    """Тестирует что сервис не готов без раннера."""
+    response = client.get('/healthz/ready')
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+def test_metrics(client):
+    """Тестирует что метрики отдаются в формате prometheus."""
+    response = client.get('/metrics')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers['content-type'].startswith('text/plain')
+    assert 'face_verification_stage_seconds' in response.text
+
+
+class StubService:
+    """Заглушка сервиса верификации."""
+
+    matches = [Match(username='george', distance=0.1)]
+
+    def __init__(self, error: Exception | None = None) -> None:
+        """Метод инициализации."""
+        self.error = error
+
+    async def identify(
+        self, img_path, top_k, metric, approximate,
+    ) -> list[Match]:
+        """Возвращает найденных пользователей или вызывает ошибку."""
+        if self.error is not None:
+            raise self.error
+        return self.matches[:top_k]
+
+    async def verify_against(
+        self, username, img_path, metric, model_name,
+    ) -> Verification:
+        """Возвращает результат сравнения или вызывает ошибку."""
+        if self.error is not None:
+            raise self.error
+        return Verification(
+            username=username,
+            verified=True,
+            distance=0.1,
+            threshold=0.4,
+            model_name=model_name,
+            metric=metric,
+        )
+
+
+@pytest.mark.parametrize(
+    'service, expected_status', (
+        pytest.param(StubService(), status.HTTP_200_OK, id='face found'),
+        pytest.param(
+            StubService(error=ValueError('Face could not be detected')),
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+            id='face not found',
+        ),
+    ),
+)
+def test_identify(service, expected_status, client):
+    """Тестирует поиск пользователей по изображению."""
+    app.state.service = service
+    try:
+        response = client.post(
+            '/identify',
+            params={'top_k': 1},
+            files={'image': ('me.jpg', b'image', 'image/jpeg')},
+        )
+    finally:
+        del app.state.service  # noqa: WPS420 cleanup app state
+
+    assert response.status_code == expected_status
+    if expected_status == status.HTTP_200_OK:
+        assert response.json() == [{'username': 'george', 'distance': 0.1}]
+
+
+def test_identify_too_large(client, monkeypatch):
+    """Тестирует что изображение больше допустимого размера отклоняется."""
+    settings = get_settings().api
+    monkeypatch.setattr(settings, 'max_upload_size', 8)
+    monkeypatch.setattr(settings, 'upload_chunk_size', 4)
+    app.state.service = StubService()
+    try:
+        response = client.post(
+            '/identify',
+            files={'image': ('me.jpg', b'large image', 'image/jpeg')},
+        )
+    finally:
+        del app.state.service  # noqa: WPS420 cleanup app state
+
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+def test_identify_without_service(client):
+    """Тестирует что поиск недоступен без сервиса."""
+    response = client.post(
+        '/identify', files={'image': ('me.jpg', b'image', 'image/jpeg')},
+    )
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+@pytest.mark.parametrize(
+    'service, expected_status', (
+        pytest.param(StubService(), status.HTTP_200_OK, id='verified'),
+        pytest.param(
+            StubService(error=NotFoundError()),
+            status.HTTP_404_NOT_FOUND,
+            id='user without vector',
+        ),
+        pytest.param(
+            StubService(error=ValueError('Face could not be detected')),
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+            id='face not found',
+        ),
+        pytest.param(
+            StubService(error=ModelNotEnabledError('SFace')),
+            status.HTTP_400_BAD_REQUEST,
+            id='model not enabled',
+        ),
+    ),
+)
+def test_verify(service, expected_status, client):
+    """Тестирует сравнение изображения с вектором пользователя."""
+    app.state.service = service
+    try:
+        response = client.post(
+            '/verify/george',
+            files={'image': ('me.jpg', b'image', 'image/jpeg')},
+        )
+    finally:
+        del app.state.service  # noqa: WPS420 cleanup app state
+
+    assert response.status_code == expected_status
+    if expected_status == status.HTTP_200_OK:
+        assert response.json()['verified'] is True
+
+
+@pytest.mark.parametrize(
+    'model_name, expected_status', (
+        pytest.param('ArcFace', status.HTTP_200_OK, id='enabled model'),
+        pytest.param(
+            'VGG-Face',
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+            id='unsupported model',
+        ),
+    ),
+)
+def test_verify_model_name(model_name, expected_status, client):
+    """Тестирует выбор модели сравнения в запросе."""
+    app.state.service = StubService()
+    try:
+        response = client.post(
+            '/verify/george',
+            params={'model_name': model_name},
+            files={'image': ('me.jpg', b'image', 'image/jpeg')},
+        )
+    finally:
+        del app.state.service  # noqa: WPS420 cleanup app state
+
+    assert response.status_code == expected_status
+    if expected_status == status.HTTP_200_OK:
+        assert response.json()['model_name'] == model_name
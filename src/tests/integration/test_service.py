@@ -1,7 +1,14 @@
+import asyncio
+from contextlib import suppress
+from unittest.mock import AsyncMock, MagicMock
+
 import pytest
+from fastapi import FastAPI
 
 from app.external.kafka import KafkaConsumer
-from app.service import init_kafka
+from app.metrics import pipeline as metrics
+from app import service
+from app.service import create_background_task, init_kafka, lifespan
 
 
 @pytest.mark.asyncio
@@ -11,3 +18,69 @@ async def test_init_kafka():
     kafka = init_kafka()
 
     assert isinstance(kafka, KafkaConsumer)
+
+
+async def fail() -> None:
+    """Фоновая задача с ошибкой."""
+    raise OSError('kafka is down')
+
+
+async def succeed() -> None:
+    """Фоновая задача без ошибки."""
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('coro_func, expected_failed', (
+    pytest.param(fail, {'consume'}, id='failed'),
+    pytest.param(succeed, set(), id='succeeded'),
+))
+async def test_create_background_task(coro_func, expected_failed):
+    """Тестирует что ошибка фоновой задачи сохраняется и считается."""
+    app = FastAPI()
+    failures = metrics.background_task_failures.labels('consume')
+    failures_before = failures._value.get()
+
+    task = create_background_task(app, 'consume', coro_func())
+    with suppress(OSError):
+        await task
+    await asyncio.sleep(0)
+
+    assert app.state.failed_tasks == expected_failed
+    assert failures._value.get() - failures_before == len(expected_failed)
+
+
+@pytest.mark.asyncio
+async def test_create_background_task_cancelled():
+    """Тестирует что отмена задачи не считается ошибкой."""
+    app = FastAPI()
+    task = create_background_task(app, 'consume', asyncio.sleep(10))
+
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+    await asyncio.sleep(0)
+
+    assert not app.state.failed_tasks
+
+
+@pytest.mark.asyncio
+async def test_lifespan_kafka_start_failure(monkeypatch):
+    """Тестирует что при ошибке запуска kafka все останавливается."""
+    kafka = MagicMock()
+    kafka.start = AsyncMock(side_effect=OSError('kafka is down'))
+    kafka.stop = AsyncMock()
+    kafka.service.runner = AsyncMock()
+    kafka.service.storage = AsyncMock()
+    kafka.service.load_index = AsyncMock()
+    kafka.service.maintain_index = MagicMock(
+        side_effect=lambda *args: asyncio.sleep(10),
+    )
+    monkeypatch.setattr(service, 'init_kafka', lambda: kafka)
+
+    with pytest.raises(OSError):
+        async with lifespan(FastAPI()):
+            pytest.fail('lifespan must not start')  # pragma: no cover
+
+    kafka.stop.assert_awaited_once()
+    kafka.service.runner.stop.assert_awaited_once()
+    kafka.service.storage.close.assert_awaited_once()
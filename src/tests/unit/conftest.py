@@ -1,7 +1,7 @@
 import os
 import random
 from pathlib import Path
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import AsyncMock
 
 import pytest
 
@@ -45,7 +45,7 @@ def service():
     :return: экземпляр сервиса
     :rtype: AuthService
     """
-    storage = MagicMock()
+    storage = AsyncMock()
     runner = AsyncMock()
     return FaceVerificationService(storage=storage, runner=runner)
 
@@ -0,0 +1,158 @@
+import os
+
+import pytest
+
+from app.core.cache import (
+    DiskStore,
+    LRUCache,
+    RepresentationCache,
+    hash_image,
+)
+
+vector = [{
+    'embedding': [0.5, 0.25],
+    'facial_area': {
+        'x': 1, 'y': 2, 'w': 3, 'h': 4, 'left_eye': None, 'right_eye': None,
+    },
+    'face_confidence': 0.5,
+}]
+
+
+@pytest.fixture
+def image(tmp_path):
+    """Файл изображения."""
+    image_path = tmp_path / 'image.jpg'
+    image_path.write_bytes(b'image')
+    return image_path
+
+
+class TestLRUCache:
+    """Тестирует класс LRUCache."""
+
+    def test_get_counts_hits_and_misses(self):
+        """Тестирует подсчет попаданий и промахов."""
+        cache: LRUCache[str, int] = LRUCache(maxsize=2)
+        cache.put('george', 1)
+
+        assert cache.get('george') == 1
+        assert cache.get('peter') is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_put_evicts_least_recently_used(self):
+        """Тестирует что вытесняется давно не использованное значение."""
+        cache: LRUCache[str, int] = LRUCache(maxsize=2)
+        cache.put('george', 1)
+        cache.put('peter', 2)
+        cache.get('george')
+
+        cache.put('anna', 3)
+
+        assert len(cache) == 2
+        assert cache.get('peter') is None
+        assert cache.get('george') == 1
+
+    def test_invalidate(self):
+        """Тестирует удаление значения из кэша."""
+        cache: LRUCache[str, int] = LRUCache()
+        cache.put('george', 1)
+
+        cache.invalidate('george')
+        cache.invalidate('peter')
+
+        assert cache.get('george') is None
+
+    def test_zero_maxsize_disables_cache(self):
+        """Тестирует что кэш нулевого размера ничего не хранит."""
+        cache: LRUCache[str, int] = LRUCache(maxsize=0)
+        cache.put('george', 1)
+
+        assert len(cache) == 0
+
+
+class TestHashImage:
+    """Тестирует функцию hash_image."""
+
+    def test_hash_depends_on_content_and_model(self, tmp_path, image):
+        """Тестирует что хэш зависит только от содержимого и модели."""
+        copy_path = tmp_path / 'copy.jpg'
+        copy_path.write_bytes(image.read_bytes())
+
+        key = hash_image(image, 'Facenet')
+
+        assert hash_image(copy_path, 'Facenet') == key
+        assert hash_image(image, 'Facenet512') != key
+        assert hash_image(image, 'Facenet', 'ssd:1:1') != key
+        assert hash_image(image, 'Facenet', '') == key
+        assert len(key) == 32
+
+
+class TestDiskStore:
+    """Тестирует класс DiskStore."""
+
+    def test_put_and_get(self, tmp_path):
+        """Тестирует что значение читается другим экземпляром."""
+        DiskStore(tmp_path).put('ab01', b'value')
+
+        store = DiskStore(tmp_path)
+
+        assert store.get('ab01') == b'value'
+        assert store.get('ab02') is None
+        assert len(store) == 1
+
+    def test_trim_removes_least_recently_used(self, tmp_path):
+        """Тестирует что удаляются давно использованные файлы."""
+        store = DiskStore(tmp_path, maxsize=3)
+        for index, key in enumerate(('aa', 'bb', 'cc')):
+            store.put(key, b'value')
+            os.utime(tmp_path / key[:2] / key, (index, index))
+        store.get('aa')
+
+        store.put('dd', b'value')
+
+        assert store.get('bb') is None
+        assert store.get('cc') is None
+        assert store.get('aa') == b'value'
+        assert len(store) == 2
+
+
+class TestRepresentationCache:
+    """Тестирует класс RepresentationCache."""
+
+    def test_lookup_after_put(self, image):
+        """Тестирует попадание после сохранения представления."""
+        cache = RepresentationCache()
+        key, cached = cache.lookup(image, 'Facenet')
+        cache.put(key, vector, 'Facenet')
+
+        assert cached is None
+        assert cache.lookup(image, 'Facenet') == (key, vector)
+        assert cache.lookup(image, 'Facenet512')[1] is None
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_disk_cache_survives_restart(self, tmp_path, image):
+        """Тестирует что представление читается с диска."""
+        key, _ = RepresentationCache().lookup(image, 'Facenet')
+        RepresentationCache(path=tmp_path / 'cache').put(
+            key, vector, 'Facenet',
+        )
+
+        cache = RepresentationCache(path=tmp_path / 'cache')
+
+        assert cache.lookup(image, 'Facenet') == (key, vector)
+
+    def test_empty_representation_is_not_cached(self, image):
+        """Тестирует что пустое представление не сохраняется."""
+        cache = RepresentationCache()
+        key, _ = cache.lookup(image, 'Facenet')
+
+        cache.put(key, [], 'Facenet')
+
+        assert cache.lookup(image, 'Facenet')[1] is None
+
+    def test_missing_file_is_not_hashed(self, tmp_path):
+        """Тестирует что отсутствующий файл не вызывает ошибку."""
+        cache = RepresentationCache()
+
+        assert cache.lookup(tmp_path / 'missing.jpg', 'Facenet') == (
+            None, None,
+        )
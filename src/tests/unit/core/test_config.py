@@ -1,16 +1,21 @@
 import os
 from enum import StrEnum
+from typing import get_args
 
 import pytest
 from pydantic import ValidationError
 
 from app.core.config import (
     KafkaSettings,
+    ModelNameValue,
+    ModelsSettings,
     PostgresSettings,
+    RunnerSettings,
     Settings,
     get_settings,
 )
 from app.core.errors import ConfigError
+from app.core.face_verification import ModelName
 
 
 class Key(StrEnum):
@@ -27,6 +32,8 @@ class Key(StrEnum):
     pg_dns = 'pg_dns'
     pool_size = 'pool_size'
     max_overflow = 'max_overflow'
+    max_workers = 'max_workers'
+    max_tasks_per_child = 'max_tasks_per_child'
 
 
 kafka_valid_input = {
@@ -56,6 +63,14 @@ postgres_invalid_input = {
     Key.pool_size: 10,
     Key.max_overflow: 20,
 }
+runner_valid_input = {
+    Key.max_workers: 4,
+    Key.max_tasks_per_child: 100,
+}
+runner_invalid_input = {
+    Key.max_workers: 'not_int',
+    Key.max_tasks_per_child: 100,
+}
 
 valid_input = {
     Key.kafka: kafka_valid_input,
@@ -125,6 +140,53 @@ class TestPostgresSettings:
         assert str(settings.pg_dns) == str(expected_pg_dns)
 
 
+class TestRunnerSettings:
+    """Тестирует класс RunnerSettings."""
+
+    @pytest.mark.parametrize(
+        'input_values', (
+            pytest.param(
+                runner_valid_input,
+                id='valid input parameters',
+            ),
+            pytest.param(
+                runner_invalid_input,
+                id='invalid input parameters',
+                marks=pytest.mark.xfail(raises=ValidationError),
+            ),
+        ),
+    )
+    def test_init(self, input_values: dict):
+        """Тестирует инициализацию класса."""
+        settings = RunnerSettings(**input_values)
+
+        assert settings.max_workers == input_values[Key.max_workers]
+        assert (
+            settings.max_tasks_per_child ==
+            input_values[Key.max_tasks_per_child]
+        )
+
+
+class TestModelsSettings:
+    """Тестирует класс ModelsSettings."""
+
+    def test_model_names(self):
+        """Тестирует что названия моделей совпадают с ModelName."""
+        assert set(get_args(ModelNameValue)) == set(ModelName)
+
+    @pytest.mark.parametrize(
+        'input_values', (
+            pytest.param({'enabled': ['Facenot']}, id='enabled'),
+            pytest.param({'shadow': ['arcface']}, id='shadow'),
+            pytest.param({'workers': {'SFac': 1}}, id='workers'),
+        ),
+    )
+    def test_unknown_model(self, input_values: dict):
+        """Тестирует что неизвестная модель не проходит валидацию."""
+        with pytest.raises(ValidationError):
+            ModelsSettings(**input_values)
+
+
 class TestSettings:
     """Тестирует класс Settings."""
 
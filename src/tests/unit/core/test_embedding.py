@@ -0,0 +1,132 @@
+import numpy as np
+import pytest
+
+from app.core.embedding import (
+    VectorDtype,
+    decode_vector,
+    encode_vector,
+    is_encoded,
+    quantize,
+)
+from app.core.face_verification import ModelName
+
+embedding_dim = 128
+vector = [
+    {
+        'embedding': [index / embedding_dim for index in range(embedding_dim)],
+        'facial_area': {
+            'x': 10,
+            'y': 20,
+            'w': 30,
+            'h': 40,
+            'left_eye': (15, 25),
+            'right_eye': None,
+        },
+        'face_confidence': 0.5,
+    },
+    {
+        'embedding': [1.0] * embedding_dim,
+        'facial_area': {'x': 1, 'y': 2, 'w': 3, 'h': 4},
+        'face_confidence': 1,
+    },
+]
+
+
+class TestEncodeVector:
+    """Тестирует функции encode_vector и decode_vector."""
+
+    def test_round_trip(self):
+        """Тестирует что вектор восстанавливается после кодирования."""
+        encoded = encode_vector(vector, ModelName.facenet)
+
+        embeddings = decode_vector(encoded)
+
+        assert embeddings.model_name == ModelName.facenet
+        assert embeddings.dim == embedding_dim
+        assert embeddings.vectors.dtype == np.float32
+        decoded = embeddings.to_vector()
+        assert decoded[0]['facial_area'] == vector[0]['facial_area']
+        assert decoded[1]['facial_area']['left_eye'] is None
+        assert decoded[1]['face_confidence'] == vector[1]['face_confidence']
+        np.testing.assert_allclose(
+            decoded[0]['embedding'], vector[0]['embedding'], rtol=1e-6,
+        )
+
+    def test_decode_is_zero_copy(self):
+        """Тестирует что вектора читаются поверх исходного буфера."""
+        encoded = encode_vector(vector, ModelName.facenet)
+
+        embeddings = decode_vector(encoded)
+
+        assert not embeddings.vectors.flags.owndata
+        assert not embeddings.vectors.flags.writeable
+
+    @pytest.mark.parametrize('dtype, atol, value_size', (
+        pytest.param(VectorDtype.float16, 1e-3, 2, id='float16'),
+        pytest.param(VectorDtype.int8, 1 / 254, 1, id='int8'),
+    ))
+    def test_quantized_round_trip(self, dtype, atol, value_size):
+        """Тестирует что квантованный вектор восстанавливается с потерей."""
+        encoded = encode_vector(vector, ModelName.facenet, dtype)
+        float32_encoded = encode_vector(vector, ModelName.facenet)
+
+        embeddings = decode_vector(encoded)
+
+        assert embeddings.vectors.dtype.itemsize == value_size
+        assert not embeddings.vectors.flags.owndata
+        assert len(encoded) < len(float32_encoded)
+        np.testing.assert_allclose(
+            embeddings.to_float32(),
+            [face['embedding'] for face in vector],
+            atol=atol,
+        )
+        assert embeddings.to_vector()[0]['facial_area'] == (
+            vector[0]['facial_area']
+        )
+
+    def test_quantize_zero_vector(self):
+        """Тестирует что нулевой вектор квантуется с единичным масштабом."""
+        values, scales = quantize(np.zeros((1, 4)), VectorDtype.int8)
+
+        assert values.tolist() == [[0, 0, 0, 0]]
+        assert scales.tolist() == [1]
+
+    def test_encoded_is_compact(self):
+        """Тестирует размер закодированного вектора."""
+        encoded = encode_vector(vector[:1], ModelName.facenet)
+
+        assert len(encoded) < embedding_dim * 4 + 64
+
+    @pytest.mark.parametrize(
+        'invalid_vector', (
+            pytest.param([], id='no faces'),
+            pytest.param(
+                [vector[0], {'embedding': [1.0]}],
+                id='different dimensions',
+            ),
+        ),
+    )
+    def test_encode_raises(self, invalid_vector):
+        """Тестирует что неверный вектор вызывает ValueError."""
+        with pytest.raises(ValueError):
+            encode_vector(invalid_vector, ModelName.facenet)
+
+    @pytest.mark.parametrize(
+        'data', (
+            pytest.param(b'', id='empty'),
+            pytest.param(b'\x80\x04' + bytes(30), id='pickle'),
+        ),
+    )
+    def test_decode_raises(self, data):
+        """Тестирует что данные не в формате вызывают ValueError."""
+        assert not is_encoded(data)
+        with pytest.raises(ValueError):
+            decode_vector(data)
+
+    @pytest.mark.parametrize('dtype', list(VectorDtype))
+    def test_decode_truncated_raises(self, dtype):
+        """Тестирует что обрезанные данные вызывают ValueError."""
+        data = encode_vector(vector, ModelName.facenet, dtype)
+
+        with pytest.raises(ValueError):
+            decode_vector(data[:-1])
@@ -1,11 +1,43 @@
+from datetime import datetime, timezone
 from enum import StrEnum
 from pathlib import Path
+from unittest.mock import AsyncMock
 
+import cv2
+import numpy as np
 import pytest
+from deepface.models.FacialRecognition import FacialRecognition
 
-from app.core.errors import StorageError
-from app.core.face_verification import FaceVerificationService, ModelName
-from app.core.models import User
+from app.core.cache import RepresentationCache
+from app.core.errors import (
+    ModelNotEnabledError,
+    NotFoundError,
+    ServerError,
+    StorageError,
+)
+from app.core.face_verification import (
+    DetectionOptions,
+    DetectorBackend,
+    DistanceMetric,
+    EmbeddingChanges,
+    FaceVerificationService,
+    ModelName,
+    RepresentedImages,
+    _embed_facial_areas,
+    _represent,
+    _represent_many,
+    catch_up_overlap,
+    preload_model,
+    set_inference_threads,
+)
+from app.core.models import Message, Representation, User
+from app.core.preprocessing import ImageLoader
+from app.external.index.exact import ExactIndex
+
+
+def represented(vector: list[dict]) -> RepresentedImages:
+    """Результат _represent для одного изображения."""
+    return RepresentedImages([(vector, None)], {})
 
 
 class Fixtures(StrEnum):
@@ -54,6 +86,32 @@ class TestPathValidation:
         validator.validate_path(path)
 
 
+class TestDetectorBackendValidation:
+    """Тестирует валидацию названия детектора лиц."""
+
+    @pytest.mark.parametrize('detector_backend', (
+        pytest.param(DetectorBackend.opencv, id='enum'),
+        pytest.param('ssd', id='str'),
+    ))
+    def test_validate_detector_backend(self, detector_backend, validator):
+        """Тестирует что поддерживаемый детектор проходит валидацию."""
+        validator.validate_detector_backend(detector_backend)
+
+    def test_validate_detector_backend_raises(self, validator):
+        """Тестирует что неизвестный детектор вызывает ValueError."""
+        with pytest.raises(ValueError):
+            validator.validate_detector_backend('haar')
+
+    def test_service_validates_detector_backend(self):
+        """Тестирует что сервис не создается с неизвестным детектором."""
+        with pytest.raises(ValueError):
+            FaceVerificationService(
+                storage=AsyncMock(),
+                runner=AsyncMock(),
+                batch_detection_options=DetectionOptions('haar'),
+            )
+
+
 class InvalidModel(StrEnum):
     """Неверная модель."""
 
@@ -185,7 +243,7 @@ class TestRepresent:
         :type service: FaceVerificationService
         """
         path = request.getfixturevalue(path)
-        service.runner.run.return_value = expected
+        service.runner.run.return_value = represented(expected)
 
         vector = await service.represent(path, model_name)
 
@@ -213,6 +271,527 @@ class TestRepresent:
                 valid_tmp_file, ModelName.facenet,
             )
 
+    @pytest.mark.asyncio
+    async def test_represent_uses_cache(self, valid_tmp_file, service):
+        """Тестирует что одинаковое изображение обрабатывается один раз."""
+        vector = [{'embedding': [0.5], 'facial_area': {}, 'face_confidence': 1}]
+        service.representation_cache = RepresentationCache()
+        service.runner.run.return_value = represented(vector)
+
+        for _ in range(2):
+            cached_vector = await service.represent(valid_tmp_file)
+
+        service.runner.run.assert_awaited_once()
+        assert cached_vector[0]['embedding'] == vector[0]['embedding']
+        assert service.representation_cache.hits == 1
+
+    @pytest.mark.asyncio
+    async def test_represent_cache_depends_on_loader(
+        self, valid_tmp_file, service,
+    ):
+        """Тестирует что смена настроек загрузки не берет старый кэш."""
+        vector = [{'embedding': [0.5], 'facial_area': {}, 'face_confidence': 1}]
+        service.representation_cache = RepresentationCache()
+        service.runner.run.return_value = represented(vector)
+
+        await service.represent(valid_tmp_file)
+        service.image_loader = ImageLoader(max_side=640)
+        await service.represent(valid_tmp_file)
+
+        assert service.runner.run.await_count == 2
+        assert service.representation_cache.hits == 0
+
+
+class StubModel:
+    """Заглушка модели DeepFace."""
+
+    input_shape = (160, 120)
+
+    def __init__(self) -> None:
+        """Метод инициализации."""
+        self.forward_shapes: list[tuple[int, ...]] = []
+
+    def forward(self, img):
+        """Сохраняет размер входного изображения."""
+        self.forward_shapes.append(img.shape)
+        return [0.0]
+
+
+def test_preload_model(monkeypatch):
+    """Тестирует что модель строится и прогревается."""
+    model = StubModel()
+    monkeypatch.setattr(
+        'app.core.face_verification.DeepFace.build_model',
+        lambda model_name: model,
+    )
+
+    preload_model(ModelName.facenet)
+
+    assert model.forward_shapes == [(1, 120, 160, 3)]
+
+
+@pytest.mark.parametrize('intra_op_threads, inter_op_threads, expected', (
+    pytest.param(2, 1, [('intra', 2), ('inter', 1)], id='both'),
+    pytest.param(0, 0, [], id='default'),
+))
+def test_set_inference_threads(
+    monkeypatch, intra_op_threads, inter_op_threads, expected,
+):
+    """Тестирует что потоки TensorFlow задаются только ненулевые."""
+    calls = []
+    threading = 'app.core.face_verification.tf.config.threading'
+    monkeypatch.setattr(
+        f'{threading}.set_intra_op_parallelism_threads',
+        lambda threads: calls.append(('intra', threads)),
+    )
+    monkeypatch.setattr(
+        f'{threading}.set_inter_op_parallelism_threads',
+        lambda threads: calls.append(('inter', threads)),
+    )
+
+    set_inference_threads(intra_op_threads, inter_op_threads)
+
+    assert calls == expected
+
+
+def test_set_inference_threads_initialized(monkeypatch, caplog):
+    """Тестирует что поздняя настройка потоков не вызывает ошибку."""
+    def set_threads(threads):
+        raise RuntimeError('cannot be modified after initialization')
+
+    monkeypatch.setattr(
+        'app.core.face_verification.tf.config.threading.'
+        'set_intra_op_parallelism_threads',
+        set_threads,
+    )
+
+    set_inference_threads(intra_op_threads=2)
+
+    assert 'already initialized' in caplog.text
+
+
+class TestRepresentMany:
+    """Тестирует метод FaceVerificationService.represent_many."""
+
+    vector = [{'embedding': [0.1], 'facial_area': {}, 'face_confidence': 1}]
+    error = 'Face could not be detected'
+
+    @pytest.mark.asyncio
+    async def test_represent_many(
+        self, valid_tmp_file, invalid_tmp_file, service,
+    ):
+        """Тестирует что результаты и ошибки сохраняются по изображениям."""
+        service.runner.run.return_value = RepresentedImages(
+            [(self.vector, None), (None, self.error)], {},
+        )
+
+        representations = await service.represent_many(
+            [valid_tmp_file, invalid_tmp_file, valid_tmp_file],
+        )
+
+        assert representations[0].vector == self.vector
+        assert representations[0].error is None
+        assert representations[1].vector is None
+        assert representations[1].error is not None
+        assert representations[2].error == self.error
+        service.runner.run.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_represent_many_uses_cache(self, valid_tmp_file, service):
+        """Тестирует что изображение из кэша не передается в модель."""
+        service.representation_cache = RepresentationCache()
+        service.runner.run.return_value = RepresentedImages(
+            [(self.vector, None)], {},
+        )
+        await service.represent_many([valid_tmp_file])
+
+        representations = await service.represent_many([valid_tmp_file])
+
+        assert representations[0].vector[0]['embedding'] == pytest.approx(
+            self.vector[0]['embedding'],
+        )
+        service.runner.run.assert_awaited_once()
+        assert service.representation_cache.hits == 1
+
+    @pytest.mark.asyncio
+    async def test_represent_many_without_valid_paths(
+        self, invalid_tmp_file, service,
+    ):
+        """Тестирует что раннер не вызывается без валидных путей."""
+        representations = await service.represent_many([invalid_tmp_file])
+
+        assert representations[0].error is not None
+        service.runner.run.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_represent_many_raises_on_invalid_model(
+        self, valid_tmp_file, service,
+    ):
+        """Тестирует что неверное имя модели вызывает ValueError."""
+        with pytest.raises(ValueError):
+            await service.represent_many(
+                [valid_tmp_file], InvalidModel.invalid_model,
+            )
+
+
+class TestVerifyMany:
+    """Тестирует метод FaceVerificationService.verify_many."""
+
+    vector = [{'embedding': [0.1]}]
+
+    @pytest.mark.asyncio
+    async def test_verify_many(self, tmp_path, service, monkeypatch):
+        """Тестирует что пользователи с вектором обновляются."""
+        valid_tmp_file = tmp_path / 'george.jpg'
+        valid_tmp_file.touch()
+        messages = [
+            Message(username='george', path=valid_tmp_file),
+            Message(username='peter', path='/invalid_tmp_file_path'),
+        ]
+        monkeypatch.setattr(
+            service,
+            'represent_many',
+            AsyncMock(return_value=[
+                Representation(path=valid_tmp_file, vector=self.vector),
+                Representation(path='/invalid_tmp_file_path', error='err'),
+            ]),
+        )
+        service.storage.update_users_bulk.return_value = []
+
+        await service.verify_many(messages)
+
+        service.storage.update_users_bulk.assert_awaited_once_with(
+            [('george', self.vector)], ModelName.facenet,
+        )
+        assert not valid_tmp_file.exists()
+
+    @pytest.mark.asyncio
+    async def test_verify_many_keeps_file_on_storage_failure(
+        self, valid_tmp_file, service, monkeypatch,
+    ):
+        """Тестирует что ошибка хранилища передается и файл сохраняется."""
+        monkeypatch.setattr(
+            service,
+            'represent_many',
+            AsyncMock(return_value=[
+                Representation(path=valid_tmp_file, vector=self.vector),
+            ]),
+        )
+        service.storage.update_users_bulk.side_effect = ConnectionError
+
+        with pytest.raises(ConnectionError):
+            await service.verify_many(
+                [Message(username='george', path=valid_tmp_file)],
+            )
+
+        assert Path(valid_tmp_file).exists()
+
+
+class StubTensor:
+    """Заглушка тензора keras."""
+
+    def __init__(self, array) -> None:
+        """Метод инициализации."""
+        self.array = array
+
+    def numpy(self):
+        """Возвращает массив numpy."""
+        return self.array
+
+
+class StubKerasModel(FacialRecognition):
+    """Заглушка модели keras, считающая среднее по изображению."""
+
+    input_shape = (4, 4)
+
+    def __init__(self) -> None:
+        """Метод инициализации."""
+        self.batch_sizes: list[int] = []
+        self.model = self._predict
+
+    def _predict(self, faces, training):
+        self.batch_sizes.append(len(faces))
+        return StubTensor(faces.mean(axis=(1, 2)))
+
+
+class TestRepresentManyWorker:
+    """Тестирует функцию _represent_many."""
+
+    no_face_error = 'no face'
+
+    @pytest.fixture
+    def model(self, monkeypatch):
+        """Заглушка модели и детектора лиц."""
+        model = StubKerasModel()
+        monkeypatch.setattr(
+            'app.core.face_verification.DeepFace.build_model',
+            lambda model_name: model,
+        )
+
+        def extract_faces(img_path, **detection_options):  # noqa: WPS430
+            assert detection_options == DetectionOptions()._asdict()
+            if not img_path.any():
+                raise ValueError(self.no_face_error)
+            face = {
+                'face': np.full((8, 8, 3), 0.5),
+                'facial_area': {'x': 0, 'y': 0, 'w': 8, 'h': 8},
+                'confidence': 0.9,
+            }
+            return [face, face]
+
+        monkeypatch.setattr(
+            'app.core.face_verification.detection.extract_faces',
+            extract_faces,
+        )
+        return model
+
+    @pytest.fixture
+    def img_paths(self, tmp_path):
+        """Изображения с лицом, без лица и с лицом."""
+        img_paths = []
+        for name, brightness in (('first', 128), ('dark', 0), ('second', 64)):
+            img_path = tmp_path / f'{name}.png'
+            cv2.imwrite(
+                str(img_path), np.full((32, 64, 3), brightness, np.uint8),
+            )
+            img_paths.append(str(img_path))
+        return img_paths
+
+    def test_represent_many_batches_faces(
+        self, model: StubKerasModel, img_paths: list[str],
+    ):
+        """Тестирует что все лица передаются в модель одним пакетом."""
+        represented = _represent_many(
+            img_paths,
+            ModelName.facenet,
+            ImageLoader(max_side=16),
+            DetectionOptions(),
+        )
+        results = represented.get_results()
+
+        assert model.batch_sizes == [4]
+        assert represented.embeddings.shape == (4, 3)
+        assert set(represented.stage_durations) == {
+            'decode', 'detect', 'embed',
+        }
+        first_vector, first_error = results[0]
+        assert first_error is None
+        assert len(first_vector) == 2
+        assert first_vector[0]['face_confidence'] == 0.9
+        assert first_vector[0]['facial_area']['w'] == 32
+        assert len(first_vector[0]['embedding']) == 3
+        assert results[1] == (None, self.no_face_error)
+        assert results[2][1] is None
+
+    def test_represent_many_not_image(
+        self, model: StubKerasModel, valid_tmp_file,
+    ):
+        """Тестирует что файл не изображения сохраняется как ошибка."""
+        represented = _represent_many(
+            [str(valid_tmp_file)],
+            ModelName.facenet,
+            ImageLoader(),
+            DetectionOptions(),
+        )
+
+        assert represented.get_results()[0][0] is None
+        assert represented.embeddings is None
+        assert model.batch_sizes == []
+
+    def test_represent_many_unexpected_error(
+        self, model: StubKerasModel, img_paths: list[str], monkeypatch,
+    ):
+        """Тестирует что любая ошибка изображения не прерывает пакет."""
+        load = ImageLoader.load
+
+        def load_or_fail(loader, img_path):  # noqa: WPS430 closure
+            if img_path == img_paths[1]:
+                raise OSError('disk error')
+            return load(loader, img_path)
+
+        monkeypatch.setattr(ImageLoader, 'load', load_or_fail)
+
+        represented = _represent_many(
+            img_paths,
+            ModelName.facenet,
+            ImageLoader(max_side=16),
+            DetectionOptions(),
+        )
+        results = represented.get_results()
+
+        assert results[1] == (None, "OSError('disk error')")
+        assert results[0][1] is None
+        assert results[2][1] is None
+        assert model.batch_sizes == [4]
+
+    def test_represent_records_stages(
+        self, model: StubKerasModel, img_paths: list[str],
+    ):
+        """Тестирует что одно изображение замеряет этапы обработки."""
+        represented = _represent(
+            img_paths[0],
+            ModelName.facenet,
+            ImageLoader(max_side=16),
+            DetectionOptions(),
+        )
+        vector, error = represented.get_results()[0]
+
+        assert error is None
+        assert model.batch_sizes == [2]
+        assert set(represented.stage_durations) == {
+            'decode', 'detect', 'embed',
+        }
+        assert vector[0]['facial_area']['w'] == 32
+        assert len(vector[1]['embedding']) == 3
+
+
+class TestReembed:
+    """Тестирует метод FaceVerificationService.reembed."""
+
+    facial_area = {
+        'x': 8, 'y': 4, 'w': 16, 'h': 16, 'left_eye': None, 'right_eye': None,
+    }
+    source_vector = [{
+        'embedding': [0.1], 'facial_area': facial_area, 'face_confidence': 0.9,
+    }]
+    embedded = [{'embedding': [0.7, 0.3], 'facial_area': facial_area}]
+    model_name = ModelName.facenet512
+
+    @pytest.mark.asyncio
+    async def test_reembed(self, valid_tmp_file, service):
+        """Тестирует что вторая модель получает сохраненные области лиц."""
+        service.representation_cache = RepresentationCache()
+        service.runner.run.side_effect = [
+            represented(self.source_vector), self.embedded,
+        ]
+
+        vector = await service.reembed(valid_tmp_file, self.model_name)
+        cached_vector = await service.reembed(valid_tmp_file, self.model_name)
+
+        assert service.runner.run.await_count == 2
+        kwargs = service.runner.run.await_args.kwargs
+        assert kwargs['facial_areas'] == [self.facial_area]
+        assert vector[0]['embedding'] == self.embedded[0]['embedding']
+        assert vector[0]['face_confidence'] == 0.9
+        assert cached_vector[0]['embedding'] == pytest.approx(
+            self.embedded[0]['embedding'],
+        )
+
+    @pytest.mark.asyncio
+    async def test_reembed_same_model(self, valid_tmp_file, service):
+        """Тестирует что для той же модели возвращается ее представление."""
+        service.runner.run.return_value = represented(self.source_vector)
+
+        vector = await service.reembed(valid_tmp_file, ModelName.facenet)
+
+        assert vector == self.source_vector
+        service.runner.run.assert_awaited_once()
+
+
+class TestShadowModels:
+    """Тестирует сохранение векторов теневых моделей при верификации."""
+
+    source_vector = TestReembed.source_vector
+    embedded = TestReembed.embedded
+
+    @pytest.mark.asyncio
+    async def test_verify_saves_shadow_vectors(self, tmp_path, service):
+        """Тестирует что вектор теневой модели сохраняется отдельно."""
+        valid_tmp_file = tmp_path / 'george.jpg'
+        valid_tmp_file.touch()
+        service.shadow_models = (ModelName.arcface,)
+        service.runner.run.side_effect = [
+            represented(self.source_vector), self.embedded,
+        ]
+        service.storage.update_users_bulk.return_value = []
+
+        await service.verify('george', str(valid_tmp_file))
+
+        service.storage.update_user.assert_awaited_once_with(
+            self.source_vector, 'george', ModelName.facenet,
+        )
+        users, model_name = service.storage.update_users_bulk.await_args.args
+        assert model_name == ModelName.arcface
+        assert users[0][1][0]['embedding'] == self.embedded[0]['embedding']
+        assert service.runner.run.await_args.kwargs['model_name'] == (
+            ModelName.arcface
+        )
+        assert not valid_tmp_file.exists()
+
+    @pytest.mark.asyncio
+    async def test_shadow_model_error_is_not_fatal(self, tmp_path, service):
+        """Тестирует что ошибка теневой модели не прерывает верификацию."""
+        valid_tmp_file = tmp_path / 'george.jpg'
+        valid_tmp_file.touch()
+        service.shadow_models = (ModelName.arcface,)
+        service.runner.run.side_effect = [
+            represented(self.source_vector),
+            ModelNotEnabledError(ModelName.arcface),
+        ]
+
+        await service.verify('george', str(valid_tmp_file))
+
+        service.storage.update_user.assert_awaited_once()
+        service.storage.update_users_bulk.assert_not_awaited()
+        assert not valid_tmp_file.exists()
+
+    @pytest.mark.asyncio
+    async def test_verify_keeps_file_without_model(self, tmp_path, service):
+        """Тестирует что без раннера модели изображение не удаляется."""
+        valid_tmp_file = tmp_path / 'george.jpg'
+        valid_tmp_file.touch()
+        service.runner.run.side_effect = ModelNotEnabledError(
+            ModelName.facenet,
+        )
+
+        with pytest.raises(ModelNotEnabledError):
+            await service.verify('george', str(valid_tmp_file))
+
+        assert valid_tmp_file.exists()
+
+    def test_invalid_shadow_model(self):
+        """Тестирует что неизвестная теневая модель вызывает ValueError."""
+        with pytest.raises(ValueError):
+            FaceVerificationService(
+                storage=AsyncMock(),
+                runner=AsyncMock(),
+                shadow_models=('VGG-Face',),
+            )
+
+
+def test_embed_facial_areas(monkeypatch, tmp_path):
+    """Тестирует что лица вырезаются по областям без поиска лиц."""
+    model = StubKerasModel()
+    monkeypatch.setattr(
+        'app.core.face_verification.DeepFace.build_model',
+        lambda model_name: model,
+    )
+    img_path = tmp_path / 'face.png'
+    cv2.imwrite(str(img_path), np.full((32, 64, 3), 255, np.uint8))
+    facial_areas = [
+        {'x': 8, 'y': 8, 'w': 16, 'h': 16},
+        {
+            'x': 32,
+            'y': 0,
+            'w': 32,
+            'h': 32,
+            'left_eye': (56, 12),
+            'right_eye': (40, 12),
+        },
+    ]
+
+    vector = _embed_facial_areas(
+        str(img_path),
+        facial_areas,
+        ModelName.facenet,
+        ImageLoader(max_side=32),
+        align=True,
+    )
+
+    assert model.batch_sizes == [2]
+    assert [face['facial_area'] for face in vector] == facial_areas
+    assert vector[0]['embedding'] == pytest.approx([1, 1, 1])
+
 
 class TestUpdateUser:
     """Тестирует update_user."""
@@ -250,3 +829,281 @@ class TestUpdateUser:
         """
         service.storage.update_user.return_value = stub_user
         await service.update_user(self.vector, self.username)
+
+
+class TestIdentify:
+    """Тестирует метод FaceVerificationService.identify."""
+
+    embeddings = [
+        ('george', np.array([1.0, 0.0], dtype=np.float32)),
+        ('peter', np.array([0.0, 1.0], dtype=np.float32)),
+    ]
+
+    @pytest.mark.asyncio
+    async def test_identify(self, valid_tmp_file, service, monkeypatch):
+        """Тестирует что находится ближайший пользователь из хранилища."""
+        service.index = ExactIndex()
+        service.storage.get_embeddings.return_value = EmbeddingChanges(
+            embeddings=self.embeddings,
+            removed=[],
+            watermark=datetime.now(timezone.utc),
+        )
+        monkeypatch.setattr(
+            service,
+            'represent',
+            AsyncMock(return_value=[{'embedding': [0.9, 0.1]}]),
+        )
+
+        await service.load_index()
+        matches = await service.identify(
+            valid_tmp_file, top_k=1, metric=DistanceMetric.euclidean_l2,
+        )
+
+        assert [match.username for match in matches] == ['george']
+
+    @pytest.mark.asyncio
+    async def test_identify_raises_without_index(
+        self, valid_tmp_file, service,
+    ):
+        """Тестирует что поиск без построенного индекса вызывает ошибку."""
+        service.index = ExactIndex()
+
+        with pytest.raises(ServerError):
+            await service.identify(valid_tmp_file)
+
+
+class TestVerifyAgainst:
+    """Тестирует метод FaceVerificationService.verify_against."""
+
+    username = 'george'
+    embedding = np.array([1.0, 0.0], dtype=np.float32)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        'probe, expected', (
+            pytest.param([0.9, 0.1], True, id='same person'),
+            pytest.param([0.0, 1.0], False, id='other person'),
+        ),
+    )
+    async def test_verify_against(
+        self, probe, expected, valid_tmp_file, service, monkeypatch,
+    ):
+        """Тестирует решение по порогу модели."""
+        service.storage.get_embedding.return_value = self.embedding
+        monkeypatch.setattr(
+            service,
+            'represent',
+            AsyncMock(return_value=[{'embedding': probe}]),
+        )
+
+        result = await service.verify_against(self.username, valid_tmp_file)
+
+        assert result.verified is expected
+        assert result.threshold == pytest.approx(0.4)
+
+    @pytest.mark.asyncio
+    async def test_verify_against_uses_cache(
+        self, valid_tmp_file, service, monkeypatch,
+    ):
+        """Тестирует что вектор загружается из хранилища один раз."""
+        service.storage.get_embedding.return_value = self.embedding
+        monkeypatch.setattr(
+            service,
+            'represent',
+            AsyncMock(return_value=[{'embedding': [1.0, 0.0]}]),
+        )
+
+        for _ in range(2):
+            await service.verify_against(self.username, valid_tmp_file)
+
+        service.storage.get_embedding.assert_awaited_once_with(
+            self.username, ModelName.facenet,
+        )
+        assert service.embeddings_cache.hits == 1
+
+    @pytest.mark.asyncio
+    async def test_verify_against_model(
+        self, valid_tmp_file, service, monkeypatch,
+    ):
+        """Тестирует что сравнение идет с вектором выбранной модели."""
+        service.storage.get_embedding.return_value = self.embedding
+        represent = AsyncMock(return_value=[{'embedding': [1.0, 0.0]}])
+        monkeypatch.setattr(service, 'represent', represent)
+
+        result = await service.verify_against(
+            self.username, valid_tmp_file, model_name=ModelName.arcface,
+        )
+
+        service.storage.get_embedding.assert_awaited_once_with(
+            self.username, ModelName.arcface,
+        )
+        assert represent.await_args.kwargs['model_name'] == ModelName.arcface
+        assert result.model_name == ModelName.arcface
+        assert result.threshold == pytest.approx(0.68)
+
+    @pytest.mark.asyncio
+    async def test_update_user_invalidates_cache(self, service):
+        """Тестирует что обновление пользователя сбрасывает кэш."""
+        service.storage.get_embedding.return_value = self.embedding
+        await service.get_embedding(self.username)
+        service.storage.update_user.return_value = User(
+            username=self.username, is_verified=True,
+        )
+
+        await service.update_user([{'embedding': [0.0, 1.0]}], self.username)
+        await service.get_embedding(self.username)
+
+        assert service.storage.get_embedding.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_verify_against_raises_without_vector(
+        self, valid_tmp_file, service,
+    ):
+        """Тестирует что пользователь без вектора вызывает NotFoundError."""
+        service.storage.get_embedding.return_value = None
+
+        with pytest.raises(NotFoundError):
+            await service.verify_against(self.username, valid_tmp_file)
+
+
+class TestIndexUpdates:
+    """Тестирует обновление индекса поиска при верификации."""
+
+    vector = [{'embedding': [0.0, 1.0]}]
+
+    @pytest.mark.asyncio
+    async def test_update_user_updates_index(self, service):
+        """Тестирует что вектор обновленного пользователя попадает в индекс."""
+        service.index = ExactIndex()
+        service.storage.update_user.return_value = User(
+            username='george', is_verified=True,
+        )
+
+        await service.update_user(self.vector, 'george')
+
+        assert service.index.search(np.array([0.0, 1.0]))[0].username == (
+            'george'
+        )
+
+    @pytest.mark.asyncio
+    async def test_update_user_other_model_skips_index(self, service):
+        """Тестирует что вектор другой модели не попадает в индекс."""
+        service.index = ExactIndex()
+        service.storage.update_user.return_value = User(
+            username='george', is_verified=True,
+        )
+
+        await service.update_user(self.vector, 'george', ModelName.sface)
+
+        assert not len(service.index)
+
+    @pytest.mark.asyncio
+    async def test_update_users_removes_missing(self, service):
+        """Тестирует что удаленные пользователи удаляются из индекса."""
+        service.index = ExactIndex()
+        service.index.build([('peter', np.array([0.0, 1.0]))])
+        service.storage.update_users_bulk.return_value = ['peter']
+
+        await service.update_users(
+            [('george', self.vector), ('peter', self.vector)],
+        )
+
+        matches = service.index.search(np.array([0.0, 1.0]))
+        assert [match.username for match in matches] == ['george']
+
+
+class TestIndexSnapshot:
+    """Тестирует загрузку индекса поиска из снимка."""
+
+    watermark = datetime(2026, 10, 17, tzinfo=timezone.utc)
+    later = datetime(2026, 10, 18, tzinfo=timezone.utc)
+    embeddings = [
+        ('george', np.array([1.0, 0.0], dtype=np.float32)),
+        ('peter', np.array([0.0, 1.0], dtype=np.float32)),
+    ]
+
+    @pytest.fixture
+    def snapshot_service(self, service, tmp_path):
+        """Сервис с точным индексом и путем к снимку."""
+        service.index = ExactIndex()
+        service.index_snapshot_path = tmp_path / 'index.fvis'
+        return service
+
+    @pytest.mark.asyncio
+    async def test_load_index_writes_snapshot(self, snapshot_service):
+        """Тестирует что индекс из хранилища сохраняется в снимок."""
+        snapshot_service.storage.get_embeddings.return_value = (
+            EmbeddingChanges(self.embeddings, [], self.watermark)
+        )
+
+        await snapshot_service.load_index()
+
+        index = ExactIndex()
+        assert index.load_snapshot(
+            snapshot_service.index_snapshot_path,
+        ) == self.watermark
+        assert len(index) == len(self.embeddings)
+
+    @pytest.mark.asyncio
+    async def test_load_index_catches_up_snapshot(self, snapshot_service):
+        """Тестирует что из хранилища читаются только изменения."""
+        index = ExactIndex()
+        index.build(self.embeddings)
+        index.save_snapshot(
+            snapshot_service.index_snapshot_path, self.watermark,
+        )
+        snapshot_service.storage.get_embedding.return_value = (
+            self.embeddings[0][1]
+        )
+        await snapshot_service.get_embedding('george')
+        snapshot_service.storage.get_embeddings.return_value = (
+            EmbeddingChanges(
+                [('ivan', np.array([1.0, 0.1]))], ['george'], self.later,
+            )
+        )
+
+        await snapshot_service.load_index()
+
+        snapshot_service.storage.get_embeddings.assert_awaited_once_with(
+            since=self.watermark - catch_up_overlap,
+        )
+        matches = snapshot_service.index.search(np.array([1.0, 0.0]))
+        assert [match.username for match in matches] == ['ivan', 'peter']
+        assert snapshot_service.index_watermark == self.later
+        await snapshot_service.get_embedding('george')
+        assert snapshot_service.storage.get_embedding.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_catch_up_invalidates_all_models(self, snapshot_service):
+        """Тестирует что изменение сбрасывает кэш теневых моделей."""
+        snapshot_service.index.build(self.embeddings)
+        snapshot_service.index_watermark = self.watermark
+        snapshot_service.storage.get_embedding.return_value = (
+            self.embeddings[0][1]
+        )
+        await snapshot_service.get_embedding('george', ModelName.arcface)
+        snapshot_service.storage.get_embeddings.return_value = (
+            EmbeddingChanges(
+                [('george', np.array([1.0, 0.1]))], [], self.later,
+            )
+        )
+
+        await snapshot_service.catch_up_index()
+        await snapshot_service.get_embedding('george', ModelName.arcface)
+
+        assert snapshot_service.storage.get_embedding.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_save_snapshot_keeps_watermark(self, snapshot_service):
+        """Тестирует что снимок сохраняется с водяным знаком до сжатия."""
+        snapshot_service.index.build(self.embeddings)
+        snapshot_service.index.remove('peter')
+        snapshot_service.index_watermark = self.watermark
+
+        await snapshot_service.save_index_snapshot()
+
+        index = ExactIndex()
+        assert index.load_snapshot(
+            snapshot_service.index_snapshot_path,
+        ) == self.watermark
+        assert len(index) == 1
@@ -0,0 +1,89 @@
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.core.preprocessing import ImageLoader, restore_facial_area
+
+exif_orientation_tag = 0x0112
+rotated_clockwise = 6
+
+
+@pytest.fixture
+def large_image(tmp_path):
+    """Изображение JPEG 800x400."""
+    path = tmp_path / 'large.jpg'
+    cv2.imwrite(str(path), np.full((400, 800, 3), 128, dtype=np.uint8))
+    return path
+
+
+@pytest.fixture
+def rotated_image(tmp_path):
+    """Изображение JPEG 200x100 с поворотом в EXIF."""
+    path = tmp_path / 'rotated.jpg'
+    exif = Image.Exif()
+    exif[exif_orientation_tag] = rotated_clockwise
+    Image.new('RGB', (200, 100)).save(path, exif=exif)
+    return path
+
+
+class TestImageLoader:
+    """Тестирует класс ImageLoader."""
+
+    @pytest.mark.parametrize('max_side, expected_shape, expected_scale', (
+        pytest.param(100, (50, 100, 3), 8, id='reduced by 8'),
+        pytest.param(300, (150, 300, 3), 800 / 300, id='reduced and resized'),
+        pytest.param(1000, (400, 800, 3), 1, id='not reduced'),
+    ))
+    def test_load(self, large_image, max_side, expected_shape, expected_scale):
+        """Тестирует что изображение уменьшается до max_side."""
+        image = ImageLoader(max_side=max_side).load(str(large_image))
+
+        assert image.pixels.shape == expected_shape
+        assert image.scale == pytest.approx(expected_scale)
+
+    @pytest.mark.parametrize('exif_orientation, expected_shape', (
+        pytest.param(True, (200, 100, 3), id='rotated'),
+        pytest.param(False, (100, 200, 3), id='not rotated'),
+    ))
+    def test_load_exif_orientation(
+        self, rotated_image, exif_orientation, expected_shape,
+    ):
+        """Тестирует что изображение поворачивается по EXIF."""
+        loader = ImageLoader(exif_orientation=exif_orientation)
+
+        image = loader.load(str(rotated_image))
+
+        assert image.pixels.shape == expected_shape
+
+    def test_cache_variant(self):
+        """Тестирует что настройки загрузки входят в ключ кэша."""
+        assert ImageLoader(640, exif_orientation=False).cache_variant == '640:0'
+
+    def test_load_not_image(self, valid_tmp_file):
+        """Тестирует что файл не изображения вызывает ValueError."""
+        with pytest.raises(ValueError):
+            ImageLoader().load(str(valid_tmp_file))
+
+
+def test_restore_facial_area():
+    """Тестирует что область лица пересчитывается в исходный масштаб."""
+    facial_area = {
+        'x': 10,
+        'y': 20,
+        'w': 30,
+        'h': 40,
+        'left_eye': (15, 25),
+        'right_eye': None,
+    }
+
+    restored = restore_facial_area(facial_area, 2)
+
+    assert restored == {
+        'x': 20,
+        'y': 40,
+        'w': 60,
+        'h': 80,
+        'left_eye': (30, 50),
+        'right_eye': None,
+    }
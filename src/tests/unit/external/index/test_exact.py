@@ -0,0 +1,245 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.core.embedding import VectorDtype
+from app.core.face_verification import DistanceMetric
+from app.external.index import search
+from app.external.index.exact import ExactIndex
+
+embeddings = [
+    ('george', np.array([1.0, 0.0], dtype=np.float32)),
+    ('peter', np.array([0.0, 2.0], dtype=np.float32)),
+    ('anna', np.array([1.0, 1.0], dtype=np.float32)),
+]
+
+
+@pytest.fixture
+def index() -> ExactIndex:
+    """Индекс с тремя пользователями."""
+    index = ExactIndex()
+    index.build(embeddings)
+    return index
+
+
+class TestSearch:
+    """Тестирует метод ExactIndex.search."""
+
+    query = np.array([2.0, 0.1], dtype=np.float32)
+
+    @pytest.mark.parametrize('metric', list(DistanceMetric))
+    def test_search_matches_brute_force(self, index: ExactIndex, metric):
+        """Тестирует что расстояния совпадают с прямым подсчетом."""
+        expected = sorted(
+            (_get_distance(vector, self.query, metric), username)
+            for username, vector in embeddings
+        )
+
+        matches = index.search(self.query, top_k=2, metric=metric)
+
+        assert [match.username for match in matches] == [
+            username for _, username in expected[:2]
+        ]
+        np.testing.assert_allclose(
+            [match.distance for match in matches],
+            [distance for distance, _ in expected[:2]],
+            rtol=1e-5,
+        )
+
+    @pytest.mark.parametrize('dtype', (VectorDtype.float16, VectorDtype.int8))
+    @pytest.mark.parametrize('metric', list(DistanceMetric))
+    def test_quantized_search(self, index: ExactIndex, dtype, metric):
+        """Тестирует что квантованный индекс близок к float32."""
+        quantized_index = ExactIndex(dtype=dtype)
+        quantized_index.build(embeddings)
+
+        matches = quantized_index.search(self.query, top_k=3, metric=metric)
+        expected = index.search(self.query, top_k=3, metric=metric)
+
+        assert quantized_index._segment.vectors.dtype == dtype
+        assert [match.username for match in matches] == [
+            match.username for match in expected
+        ]
+        np.testing.assert_allclose(
+            [match.distance for match in matches],
+            [match.distance for match in expected],
+            atol=1e-2,
+        )
+
+    def test_quantized_search_in_chunks(self, monkeypatch):
+        """Тестирует что вектора int8 переводятся во float32 частями."""
+        monkeypatch.setattr(search, 'similarity_chunk_size', 2)
+        index = ExactIndex(dtype=VectorDtype.int8)
+        index.build(embeddings)
+
+        matches = index.search(self.query, top_k=3)
+
+        assert [match.username for match in matches] == [
+            'george', 'anna', 'peter',
+        ]
+
+    def test_search_top_k_larger_than_index(self, index: ExactIndex):
+        """Тестирует что возвращаются все пользователи индекса."""
+        assert len(index.search(self.query, top_k=10)) == len(embeddings)
+
+    def test_search_empty_index(self):
+        """Тестирует что пустой индекс ничего не находит."""
+        index = ExactIndex()
+        index.build([])
+
+        assert index.is_built is True
+        assert index.search(self.query) == []
+
+
+def test_build_raises_on_different_dimensions():
+    """Тестирует что вектора разной размерности вызывают ValueError."""
+    with pytest.raises(ValueError):
+        ExactIndex().build([*embeddings, ('ivan', np.zeros(3))])
+
+
+def _get_distance(
+    vector: np.ndarray, query: np.ndarray, metric: DistanceMetric,
+) -> float:
+    if metric == DistanceMetric.euclidean:
+        return float(np.linalg.norm(vector - query))
+    vector = vector / np.linalg.norm(vector)
+    query = query / np.linalg.norm(query)
+    if metric == DistanceMetric.cosine:
+        return float(1 - vector @ query)
+    return float(np.linalg.norm(vector - query))
+
+
+class TestIncrementalUpdates:
+    """Тестирует изменения ExactIndex без полного перестроения."""
+
+    query = np.array([0.0, -1.0], dtype=np.float32)
+
+    def test_upsert_adds_and_replaces(self, index: ExactIndex):
+        """Тестирует добавление и замену вектора пользователя."""
+        index.upsert('ivan', self.query)
+        index.upsert('george', self.query * 2)
+
+        matches = index.search(self.query, top_k=2)
+
+        assert {match.username for match in matches} == {'ivan', 'george'}
+        assert len(index) == len(embeddings) + 1
+
+    def test_remove_tombstones_user(self, index: ExactIndex):
+        """Тестирует что удаленный пользователь не находится."""
+        index.remove('peter')
+
+        matches = index.search(embeddings[1][1], top_k=10)
+
+        assert 'peter' not in {match.username for match in matches}
+        assert len(index) == len(embeddings) - 1
+
+    def test_compact_keeps_results(self, index: ExactIndex):
+        """Тестирует что сжатие не меняет результаты поиска."""
+        index.upsert('ivan', self.query)
+        index.upsert('george', self.query * 2)
+        index.remove('peter')
+        expected = index.search(self.query, top_k=10)
+
+        index.compact()
+
+        assert index.needs_compaction is False
+        assert index.search(self.query, top_k=10) == expected
+
+    def test_changes_during_compaction_are_kept(self, index, monkeypatch):
+        """Тестирует что изменения во время сжатия применяются."""
+        index.upsert('ivan', self.query)
+        create_segment = index._create_segment
+
+        def create_segment_with_changes(*args):
+            index.upsert('george', self.query)
+            index.remove('ivan')
+            return create_segment(*args)
+
+        monkeypatch.setattr(
+            index, '_create_segment', create_segment_with_changes,
+        )
+        index.compact()
+
+        matches = index.search(self.query, top_k=10)
+        assert 'ivan' not in {match.username for match in matches}
+        assert matches[0].username == 'george'
+        assert len(index) == len(embeddings)
+
+    def test_changes_before_build_are_kept(self):
+        """Тестирует что изменения новее векторов из хранилища."""
+        index = ExactIndex()
+        index.upsert('george', self.query)
+        index.remove('anna')
+
+        index.build(embeddings)
+
+        matches = index.search(self.query, top_k=10)
+        assert matches[0].username == 'george'
+        assert 'anna' not in {match.username for match in matches}
+
+
+class TestSnapshot:
+    """Тестирует снимок ExactIndex."""
+
+    watermark = datetime(2026, 10, 17, tzinfo=timezone.utc)
+
+    def test_snapshot_roundtrip(self, tmp_path, index: ExactIndex):
+        """Тестирует что загруженный индекс находит тех же пользователей."""
+        path = tmp_path / 'index.fvis'
+        index.save_snapshot(path, self.watermark)
+        loaded_index = ExactIndex()
+
+        watermark = loaded_index.load_snapshot(path)
+
+        assert watermark == self.watermark
+        assert isinstance(loaded_index._segment.vectors.base, np.memmap)
+        query = embeddings[2][1]
+        assert loaded_index.search(query, top_k=3) == index.search(
+            query, top_k=3,
+        )
+
+    def test_quantized_snapshot_roundtrip(self, tmp_path):
+        """Тестирует что снимок хранит вектора int8 и их масштабы."""
+        path = tmp_path / 'index.fvis'
+        index = ExactIndex(dtype=VectorDtype.int8)
+        index.build(embeddings)
+        index.save_snapshot(path, self.watermark)
+        loaded_index = ExactIndex(dtype=VectorDtype.int8)
+
+        loaded_index.load_snapshot(path)
+
+        assert loaded_index._segment.vectors.dtype == np.int8
+        query = embeddings[2][1]
+        assert loaded_index.search(query, top_k=3) == index.search(
+            query, top_k=3,
+        )
+
+    def test_saved_segment_is_mapped(self, tmp_path, index: ExactIndex):
+        """Тестирует что после сохранения сегмент читается из файла."""
+        index.save_snapshot(tmp_path / 'index.fvis', self.watermark)
+
+        assert isinstance(index._segment.vectors.base, np.memmap)
+        assert index.search(embeddings[0][1], top_k=1)[0].username == 'george'
+
+    def test_loaded_index_accepts_changes(self, tmp_path, index: ExactIndex):
+        """Тестирует изменения и сжатие индекса из снимка."""
+        path = tmp_path / 'index.fvis'
+        index.save_snapshot(path, self.watermark)
+        loaded_index = ExactIndex()
+        loaded_index.load_snapshot(path)
+
+        loaded_index.remove('george')
+        loaded_index.upsert('ivan', embeddings[0][1])
+        loaded_index.compact()
+
+        matches = loaded_index.search(embeddings[0][1], top_k=10)
+        assert matches[0].username == 'ivan'
+        assert 'george' not in {match.username for match in matches}
+
+    def test_missing_snapshot_is_skipped(self, tmp_path):
+        """Тестирует что отсутствующий снимок не загружается."""
+        index = ExactIndex()
+
+        assert index.load_snapshot(tmp_path / 'index.fvis') is None
+        assert index.is_built is False
@@ -0,0 +1,120 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.core.embedding import VectorDtype
+from app.external.index.exact import ExactIndex
+from app.external.index.ivf import IVFIndex
+
+nlist = 8
+dim = 16
+
+
+@pytest.fixture
+def embeddings() -> list[tuple[str, np.ndarray]]:
+    """Вектора пользователей, сгруппированные вокруг nlist центров."""
+    rng = np.random.default_rng(1)
+    centers = rng.standard_normal((nlist, dim))
+    return [
+        (f'user{index}', centers[index % nlist] + rng.normal(0, 0.1, dim))
+        for index in range(nlist * 20)
+    ]
+
+
+@pytest.fixture
+def index(embeddings) -> IVFIndex:
+    """Построенный IVF индекс."""
+    index = IVFIndex(nlist=nlist, nprobe=2, train_iterations=5)
+    index.build(embeddings)
+    return index
+
+
+class TestSearch:
+    """Тестирует метод IVFIndex.search."""
+
+    def test_exact_search_matches_exact_index(self, index, embeddings):
+        """Тестирует что поиск без приближения совпадает с точным."""
+        exact_index = ExactIndex()
+        exact_index.build(embeddings)
+        query = embeddings[3][1]
+
+        assert index.search(query, top_k=10, approximate=False) == (
+            exact_index.search(query, top_k=10)
+        )
+
+    def test_approximate_search_finds_vector(self, index, embeddings):
+        """Тестирует что приближенный поиск находит вектор из индекса."""
+        for username, vector in embeddings[:nlist]:
+            matches = index.search(vector, top_k=1)
+
+            assert matches[0].username == username
+
+    def test_quantized_search_finds_vector(self, embeddings):
+        """Тестирует что индекс int8 находит вектор из индекса."""
+        index = IVFIndex(
+            nlist=nlist, nprobe=2, train_iterations=5, dtype=VectorDtype.int8,
+        )
+        index.build(embeddings)
+
+        for username, vector in embeddings[:nlist]:
+            for approximate in (True, False):
+                matches = index.search(vector, top_k=1, approximate=approximate)
+
+                assert matches[0].username == username
+
+    def test_search_empty_index(self):
+        """Тестирует что пустой индекс ничего не находит."""
+        index = IVFIndex(nlist=nlist)
+        index.build([])
+
+        assert index.is_built is True
+        assert index.search(np.ones(dim)) == []
+
+
+class TestSnapshot:
+    """Тестирует сохранение и загрузку снимка IVFIndex."""
+
+    def test_index_is_loaded_from_snapshot(self, tmp_path, index, embeddings):
+        """Тестирует что новый индекс загружается из снимка."""
+        path = tmp_path / 'index.fvis'
+        index.save_snapshot(path, datetime.now(timezone.utc))
+
+        loaded_index = IVFIndex(nlist=nlist, nprobe=2)
+        loaded_index.load_snapshot(path)
+
+        assert loaded_index.is_built is True
+        assert len(loaded_index) == len(embeddings)
+        query = embeddings[5][1]
+        assert loaded_index.search(query) == index.search(query)
+        assert loaded_index._centroids.shape == (nlist, dim)
+
+    def test_build_reuses_centroids(self, index, embeddings):
+        """Тестирует что центроиды не обучаются заново."""
+        centroids = index._segment.centroids
+
+        index.build(embeddings[:-1])
+
+        assert index._segment.centroids is centroids
+
+    def test_broken_file_is_skipped(self, tmp_path):
+        """Тестирует что поврежденный файл не загружается."""
+        path = tmp_path / 'index.fvis'
+        path.write_bytes(b'broken')
+        index = IVFIndex()
+
+        assert index.load_snapshot(path) is None
+        assert index.is_built is False
+
+
+def test_compact_keeps_lists(index, embeddings):
+    """Тестирует что сжатие переносит изменения в списки."""
+    username, vector = embeddings[0]
+    index.remove(username)
+    index.upsert('ivan', vector)
+
+    index.compact()
+
+    assert index.needs_compaction is False
+    assert index.search(vector, top_k=1)[0].username == 'ivan'
+    assert len(index) == len(embeddings)
@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.external.index.snapshot import (
+    alignment,
+    read_snapshot,
+    write_snapshot,
+)
+
+watermark = datetime(2026, 10, 17, 12, 30, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def arrays() -> dict[str, np.ndarray]:
+    """Массивы снимка разных типов."""
+    return {
+        'usernames': np.array(['george', 'peter', 'анна'], dtype=object),
+        'vectors': np.arange(9, dtype=np.float32).reshape(3, 3),
+        'offsets': np.array([0, 1, 3], dtype=np.int64),
+    }
+
+
+def test_snapshot_roundtrip(tmp_path, arrays):
+    """Тестирует что массивы и водяной знак читаются без изменений."""
+    path = tmp_path / 'index.fvis'
+    write_snapshot(path, arrays, watermark)
+
+    snapshot = read_snapshot(path)
+
+    assert snapshot.watermark == watermark
+    assert snapshot.arrays['usernames'].tolist() == ['george', 'peter', 'анна']
+    np.testing.assert_array_equal(snapshot.arrays['vectors'], arrays['vectors'])
+    np.testing.assert_array_equal(snapshot.arrays['offsets'], arrays['offsets'])
+
+
+def test_arrays_are_mapped_read_only(tmp_path, arrays):
+    """Тестирует что массивы отображают файл и не изменяются."""
+    snapshot = write_snapshot(tmp_path / 'index.fvis', arrays, watermark)
+    vectors = snapshot.arrays['vectors']
+
+    assert isinstance(vectors.base, np.memmap)
+    assert vectors.ctypes.data % alignment == 0
+    with pytest.raises(ValueError):
+        vectors[0, 0] = 1
+
+
+def test_write_replaces_snapshot(tmp_path, arrays):
+    """Тестирует что открытый снимок не меняется при записи нового."""
+    path = tmp_path / 'index.fvis'
+    old_snapshot = write_snapshot(path, arrays, watermark)
+
+    write_snapshot(path, {'vectors': np.zeros((1, 3), np.float32)}, watermark)
+
+    assert read_snapshot(path).arrays['vectors'].shape == (1, 3)
+    assert old_snapshot.arrays['vectors'].shape == (3, 3)
+    assert [file.name for file in tmp_path.iterdir()] == ['index.fvis']
+
+
+def test_empty_arrays(tmp_path):
+    """Тестирует снимок пустого индекса."""
+    path = tmp_path / 'index.fvis'
+    write_snapshot(path, {'vectors': np.empty((0, 0), np.float32)}, watermark)
+
+    assert read_snapshot(path).arrays['vectors'].shape == (0, 0)
+
+
+@pytest.mark.parametrize('content', (b'', b'FVIS', b'NOPE' + bytes(60)))
+def test_invalid_file_raises(tmp_path, content):
+    """Тестирует что файл другого формата вызывает ValueError."""
+    path = tmp_path / 'index.fvis'
+    path.write_bytes(content)
+
+    with pytest.raises(ValueError):
+        read_snapshot(path)
@@ -0,0 +1,92 @@
+import importlib.util
+import pickle
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import sqlalchemy as sa
+
+from app.core.embedding import VectorDtype, encode_vector
+from app.core.face_verification import ModelName
+
+versions_path = Path(__file__).parents[5] / 'alembic' / 'versions'
+vector = [{
+    'embedding': [0.5, -0.25, 1.0],
+    'facial_area': {
+        'x': 1, 'y': 2, 'w': 3, 'h': 4,
+        'left_eye': (5, 6), 'right_eye': None,
+    },
+    'face_confidence': 0.9,
+}]
+
+
+def load_migration(name: str):
+    """Загружает модуль миграции alembic по имени файла."""
+    spec = importlib.util.spec_from_file_location(
+        name, versions_path / f'{name}.py',
+    )
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    return migration
+
+
+class TestCompactUserVector:
+    """Тестирует миграцию a3c5e8f1b7d2 формата users.vector."""
+
+    @pytest.fixture
+    def migration(self):
+        """Модуль миграции."""
+        return load_migration('a3c5e8f1b7d2_compact_user_vector')
+
+    @pytest.fixture
+    def connection(self, migration, monkeypatch):
+        """Соединение sqlite с таблицей users, выданное миграции."""
+        engine = sa.create_engine('sqlite://')
+        metadata = sa.MetaData()
+        sa.Table(
+            'users',
+            metadata,
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('vector', sa.LargeBinary),
+        )
+        with engine.begin() as connection:
+            metadata.create_all(connection)
+            monkeypatch.setattr(
+                migration, 'op', SimpleNamespace(get_bind=lambda: connection),
+            )
+            yield connection
+
+    def test_downgrade_quantized(self, migration, connection):
+        """Тестирует что вектора float16 и int8 восстанавливаются в float32."""
+        connection.execute(migration.users.insert(), [
+            {
+                'id': index,
+                'vector': encode_vector(vector, ModelName.facenet, dtype),
+            }
+            for index, dtype in enumerate(VectorDtype, start=1)
+        ])
+
+        migration.downgrade()
+
+        rows = connection.execute(
+            sa.select(migration.users.c.vector)
+            .order_by(migration.users.c.id),
+        ).scalars()
+        for row in rows:
+            downgraded = pickle.loads(row)
+            np.testing.assert_allclose(
+                downgraded[0]['embedding'], vector[0]['embedding'], atol=0.01,
+            )
+            assert downgraded[0]['facial_area'] == vector[0]['facial_area']
+
+    def test_downgrade_unknown_dtype(self, migration, connection):
+        """Тестирует что неизвестный тип значений прерывает downgrade."""
+        data = bytearray(encode_vector(vector, ModelName.facenet))
+        data[3] = 9
+        connection.execute(
+            migration.users.insert(), {'id': 1, 'vector': bytes(data)},
+        )
+
+        with pytest.raises(ValueError):
+            migration.downgrade()
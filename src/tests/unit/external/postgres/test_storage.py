@@ -1,16 +1,27 @@
+import numpy as np
 import pytest
+from sqlalchemy import func, update
 
+from app.core.embedding import encode_vector
+from app.core.errors import StorageError
+from app.core.face_verification import ModelName
 from app.core.models import User
+from app.external.postgres import models as db
 from app.external.postgres.storage import DBStorage
 from tests.unit.external.postgres.conftest import test_user
 
-stub_vector = [{'embed': 123}]
+stub_vector = [{
+    'embedding': [0.1, 0.2],
+    'facial_area': {'x': 1, 'y': 2, 'w': 3, 'h': 4},
+    'face_confidence': 0.9,
+}]
 is_verified = True
 
 
 class TestUpdateUser:
     """Тестирует метод update_user."""
 
+    @pytest.mark.asyncio
     @pytest.mark.database
     @pytest.mark.parametrize(
         'storage_fixture, username, expected', (
@@ -28,13 +39,13 @@ class TestUpdateUser:
             ),
         ),
     )
-    def test_update_user(
+    async def test_update_user(
         self, storage_fixture, username, expected: dict, request,
     ):
         """Тестирует что метод возвращает правильный объект."""
         storage: DBStorage = request.getfixturevalue(storage_fixture)
 
-        user: User | None = storage.update_user(
+        user: User | None = await storage.update_user(
             vector=stub_vector, username=username,
         )
 
@@ -43,3 +54,208 @@ class TestUpdateUser:
         else:
             assert user.username == expected['username']
             assert user.is_verified is is_verified
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_update_deleted_user(self, storage_with_user: DBStorage):
+        """Тестирует что удаленный пользователь не обновляется."""
+        username = test_user['username']
+        with storage_with_user.pool.begin() as connection:
+            connection.execute(
+                update(db.User).where(
+                    db.User.username == username,
+                ).values(is_deleted=True),
+            )
+
+        user = await storage_with_user.update_user(
+            vector=stub_vector, username=username,
+        )
+
+        assert user is None
+
+    @pytest.mark.database
+    def test_pool(self, storage: DBStorage):
+        """Тестирует что переданный пул используется хранилищем."""
+        assert DBStorage(storage.pool).pool is storage.pool
+
+
+class TestUpdateUsersBulk:
+    """Тестирует метод update_users_bulk."""
+
+    missing_username = 'missing'
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_update_users_bulk(self, storage_with_user: DBStorage):
+        """Тестирует что возвращаются только не найденные пользователи."""
+        users = [
+            (test_user['username'], stub_vector),
+            (self.missing_username, stub_vector),
+        ]
+
+        missing_usernames = await storage_with_user.update_users_bulk(users)
+
+        assert missing_usernames == [self.missing_username]
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_update_users_bulk_empty(self, storage: DBStorage):
+        """Тестирует что пустой список не отправляет запрос."""
+        assert await storage.update_users_bulk([]) == []
+
+
+class TestGetEmbedding:
+    """Тестирует метод get_embedding."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_get_embedding(self, storage_with_user: DBStorage):
+        """Тестирует что вектор появляется после обновления пользователя."""
+        username = test_user['username']
+        assert await storage_with_user.get_embedding(username) is None
+
+        await storage_with_user.update_user(
+            vector=stub_vector, username=username,
+        )
+        embedding = await storage_with_user.get_embedding(username)
+
+        assert embedding is not None
+        assert embedding.tolist() == pytest.approx(
+            stub_vector[0]['embedding'],
+        )
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_get_embedding_other_model(
+        self, storage_with_user: DBStorage,
+    ):
+        """Тестирует что вектора моделей хранятся рядом."""
+        username = test_user['username']
+        arcface_vector = [{'embedding': [0.3, 0.2, 0.1]}]
+
+        await storage_with_user.update_user(stub_vector, username)
+        user = await storage_with_user.update_user(
+            arcface_vector, username, ModelName.arcface,
+        )
+        missing_usernames = await storage_with_user.update_users_bulk(
+            [(username, arcface_vector)], ModelName.arcface,
+        )
+
+        assert user is not None
+        assert missing_usernames == []
+        facenet_embedding = await storage_with_user.get_embedding(username)
+        arcface_embedding = await storage_with_user.get_embedding(
+            username, ModelName.arcface,
+        )
+        assert facenet_embedding.tolist() == pytest.approx(
+            stub_vector[0]['embedding'],
+        )
+        assert arcface_embedding.tolist() == pytest.approx(
+            arcface_vector[0]['embedding'],
+        )
+        assert await storage_with_user.get_embedding(
+            username, ModelName.sface,
+        ) is None
+
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_get_quantized_embedding(
+        self, storage_with_user: DBStorage,
+    ):
+        """Тестирует что вектор int8 читается во float32."""
+        storage = DBStorage(storage_with_user.pool, vector_dtype='int8')
+        username = test_user['username']
+
+        await storage.update_user(vector=stub_vector, username=username)
+        embedding = await storage.get_embedding(username)
+
+        assert embedding.dtype == np.float32
+        np.testing.assert_allclose(
+            embedding, stub_vector[0]['embedding'], atol=0.2 / 254,
+        )
+
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_get_corrupt_embedding(self, storage_with_user: DBStorage):
+        """Тестирует что нечитаемый вектор вызывает StorageError."""
+        username = test_user['username']
+        await storage_with_user.update_user(stub_vector, username)
+        corrupt_vector(storage_with_user, username)
+
+        with pytest.raises(StorageError):
+            await storage_with_user.get_embedding(username)
+
+
+def corrupt_vector(storage: DBStorage, username: str) -> None:
+    """Обрезает сохраненный вектор пользователя."""
+    with storage.pool.begin() as connection:
+        connection.execute(
+            update(db.User).where(db.User.username == username).values(
+                vector=encode_vector(stub_vector, ModelName.facenet)[:-1],
+                vector_updated_at=func.now(),
+            ),
+        )
+
+
+class TestGetEmbeddings:
+    """Тестирует метод get_embeddings."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_get_embeddings(self, storage_with_user: DBStorage):
+        """Тестирует что возвращается вектор верифицированного пользователя."""
+        await storage_with_user.update_user(
+            vector=stub_vector, username=test_user['username'],
+        )
+
+        changes = await storage_with_user.get_embeddings()
+
+        embeddings = dict(changes.embeddings)
+        assert embeddings[test_user['username']].tolist() == pytest.approx(
+            stub_vector[0]['embedding'],
+        )
+        assert changes.removed == []
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_get_embeddings_since(self, storage_with_user: DBStorage):
+        """Тестирует что возвращаются только изменения после since."""
+        username = test_user['username']
+        await storage_with_user.update_user(
+            vector=stub_vector, username=username,
+        )
+        watermark = (await storage_with_user.get_embeddings()).watermark
+
+        unchanged = await storage_with_user.get_embeddings(since=watermark)
+        with storage_with_user.pool.begin() as connection:
+            connection.execute(
+                update(db.User).where(
+                    db.User.username == username,
+                ).values(is_deleted=True),
+            )
+        changed = await storage_with_user.get_embeddings(since=watermark)
+
+        assert unchanged.embeddings == []
+        assert unchanged.removed == []
+        assert changed.removed == [username]
+        assert changed.watermark > watermark
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_get_embeddings_skips_corrupt(
+        self, storage_with_user: DBStorage,
+    ):
+        """Тестирует что нечитаемый вектор не прерывает загрузку."""
+        username = test_user['username']
+        await storage_with_user.update_user(stub_vector, username)
+        watermark = (await storage_with_user.get_embeddings()).watermark
+        corrupt_vector(storage_with_user, username)
+
+        loaded = await storage_with_user.get_embeddings()
+        changed = await storage_with_user.get_embeddings(since=watermark)
+
+        assert loaded.embeddings == []
+        assert changed.embeddings == []
+        assert changed.removed == [username]
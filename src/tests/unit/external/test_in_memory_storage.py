@@ -1,6 +1,8 @@
+import numpy as np
 import pytest
 
 from app.core.models import User
+from app.external import in_memory_storage
 from tests.unit.conftest import invalid_user, test_user, user_list2objects
 
 
@@ -101,6 +103,7 @@ class TestGetUser:
 class TestUpdateUser:
     """Тестирует update_user."""
 
+    @pytest.mark.asyncio
     @pytest.mark.parametrize(
         'user, repository_state_factory, expected_user, expected_id', (
             pytest.param(
@@ -119,7 +122,7 @@ class TestUpdateUser:
             ),
         ),
     )
-    def test_update_user(  # noqa: WPS211 need these arguments
+    async def test_update_user(  # noqa: WPS211 need these arguments
         self,
         user: User,
         repository_state_factory,
@@ -133,7 +136,7 @@ class TestUpdateUser:
         )
         representation = [{'233': 233}]
 
-        response_user: User = repository.update_user(
+        response_user: User = await repository.update_user(
             representation, user.username,
         )
 
@@ -141,3 +144,187 @@ class TestUpdateUser:
             raise AssertionError
         assert response_user.user_id == expected_id
         assert response_user.is_verified is True
+
+
+class TestUpdateUsersBulk:
+    """Тестирует update_users_bulk."""
+
+    @pytest.mark.asyncio
+    async def test_update_users_bulk(self, single_user_in_repo_factory):
+        """Тестирует что пользователи обновляются и создаются."""
+        repository, _ = single_user_in_repo_factory
+        representation = [{'233': 233}]
+        users = [
+            (user.username, representation) for user in user_list2objects
+        ]
+
+        missing_usernames = await repository.update_users_bulk(users)
+
+        assert missing_usernames == []
+        for user in user_list2objects:
+            response_user = repository.get_user(user)
+            assert response_user is not None
+            assert response_user.is_verified is True
+
+
+class TestGetEmbeddings:
+    """Тестирует get_embeddings."""
+
+    @pytest.mark.asyncio
+    async def test_get_embeddings(self, single_user_in_repo_factory):
+        """Тестирует что возвращаются только пользователи с вектором."""
+        repository, _ = single_user_in_repo_factory
+        repository.create_user(user_list2objects[1])
+        await repository.update_user(
+            [{'embedding': [0.1, 0.2]}], test_user.username,
+        )
+
+        embeddings = (await repository.get_embeddings()).embeddings
+
+        assert [username for username, _ in embeddings] == [test_user.username]
+        assert embeddings[0][1].tolist() == pytest.approx([0.1, 0.2])
+
+
+class TestGetEmbedding:
+    """Тестирует get_embedding."""
+
+    @pytest.mark.asyncio
+    async def test_get_embedding(self, single_user_in_repo_factory):
+        """Тестирует что вектор есть только у обновленного пользователя."""
+        repository, _ = single_user_in_repo_factory
+        assert await repository.get_embedding(test_user.username) is None
+
+        await repository.update_user(
+            [{'embedding': [0.1, 0.2]}], test_user.username,
+        )
+        embedding = await repository.get_embedding(test_user.username)
+
+        assert embedding is not None
+        assert embedding.tolist() == pytest.approx([0.1, 0.2])
+
+    @pytest.mark.asyncio
+    async def test_get_embedding_other_model(self, storage):
+        """Тестирует что вектор другой модели хранится отдельно."""
+        user = await storage.update_user(
+            [{'embedding': [0.1, 0.2, 0.3]}], test_user.username, 'ArcFace',
+        )
+
+        embedding = await storage.get_embedding(test_user.username, 'ArcFace')
+
+        assert user.is_verified is True
+        assert embedding.tolist() == pytest.approx([0.1, 0.2, 0.3])
+        assert await storage.get_embedding(test_user.username) is None
+        assert storage.search(np.array([0.1, 0.2, 0.3])) == []
+
+
+@pytest.mark.asyncio
+async def test_quantized_matrix():
+    """Тестирует что матрица int8 хранит вектора с потерей точности."""
+    storage = in_memory_storage.InMemoryStorage(dtype='int8')
+    await storage.update_user([{'embedding': [1.0, 0.0]}], 'george')
+    await storage.update_user([{'embedding': [0.0, 2.0]}], 'peter')
+
+    matches = storage.search(np.array([1.0, 0.1]), top_k=2)
+    embedding = await storage.get_embedding('peter')
+    changes = await storage.get_embeddings()
+
+    assert storage._vectors.dtype == np.int8
+    assert [match.username for match in matches] == ['george', 'peter']
+    np.testing.assert_allclose(embedding, [0.0, 2.0], atol=2 / 254)
+    assert [username for username, _ in changes.embeddings] == [
+        'george', 'peter',
+    ]
+
+
+class TestUserIndex:
+    """Тестирует словари пользователей InMemoryStorage."""
+
+    @pytest.mark.asyncio
+    async def test_update_new_user_is_stored_once(self, storage):
+        """Тестирует что новый пользователь сохраняется один раз."""
+        user = await storage.update_user(
+            [{'embedding': [0.1, 0.2]}], test_user.username,
+        )
+
+        assert len(storage.users) == 1
+        assert storage.users_count == 1
+        assert storage.get_user_by_id(user.user_id) == user
+        assert storage.get_user(test_user).vector == user.vector
+
+    @pytest.mark.asyncio
+    async def test_update_keeps_user_id(self, single_user_in_repo_factory):
+        """Тестирует что обновление не меняет id пользователя."""
+        repository, _ = single_user_in_repo_factory
+
+        for embedding in ([0.1, 0.2], [0.3, 0.4]):
+            user = await repository.update_user(
+                [{'embedding': embedding}], test_user.username,
+            )
+
+        assert user.user_id == 0
+        assert repository.get_user_by_id(0) == user
+        assert list(repository.users_by_id) == [0]
+
+
+class TestEmbeddingMatrix:
+    """Тестирует матрицу векторов InMemoryStorage."""
+
+    @pytest.mark.asyncio
+    async def test_search(self, storage):
+        """Тестирует что ближайшие пользователи ищутся по матрице."""
+        await storage.update_users_bulk([
+            ('george', [{'embedding': [1.0, 0.0]}]),
+            ('peter', [{'embedding': [0.0, 2.0]}]),
+            ('anna', [{'embedding': [1.0, 1.0]}]),
+        ])
+
+        matches = storage.search(np.array([2.0, 0.1]), top_k=2)
+
+        assert [match.username for match in matches] == ['george', 'anna']
+        assert storage.search(np.array([1.0, 0.0]), top_k=1)[0].distance == (
+            pytest.approx(0, abs=1e-6)
+        )
+
+    @pytest.mark.asyncio
+    async def test_search_empty_storage(self, storage):
+        """Тестирует что пустое хранилище ничего не находит."""
+        assert storage.search(np.array([1.0, 0.0])) == []
+
+    @pytest.mark.asyncio
+    async def test_matrix_grows(self, storage, monkeypatch):
+        """Тестирует что матрица расширяется без потери векторов."""
+        monkeypatch.setattr(in_memory_storage, 'initial_capacity', 2)
+        users = [
+            (f'user{index}', [{'embedding': [float(index), 1.0]}])
+            for index in range(5)
+        ]
+
+        await storage.update_users_bulk(users)
+
+        embeddings = dict((await storage.get_embeddings()).embeddings)
+        assert len(embeddings) == len(users)
+        assert embeddings['user4'].tolist() == [4.0, 1.0]
+
+    @pytest.mark.asyncio
+    async def test_vector_without_embedding_removes_row(self, storage):
+        """Тестирует что вектор без эмбеддинга убирается из матрицы."""
+        await storage.update_users_bulk([
+            ('george', [{'embedding': [1.0, 0.0]}]),
+            ('peter', [{'embedding': [0.0, 1.0]}]),
+        ])
+
+        await storage.update_user([], 'george')
+
+        assert await storage.get_embedding('george') is None
+        assert (await storage.get_embedding('peter')).tolist() == [0.0, 1.0]
+        assert storage.search(np.array([1.0, 0.0]))[0].username == 'peter'
+
+    @pytest.mark.asyncio
+    async def test_other_dimension_is_skipped(self, storage):
+        """Тестирует что вектор другой размерности не попадает в матрицу."""
+        await storage.update_user([{'embedding': [1.0, 0.0]}], 'george')
+
+        await storage.update_user([{'embedding': [1.0, 0.0, 0.0]}], 'peter')
+
+        assert await storage.get_embedding('peter') is None
+        assert storage.get_user(User(username='peter', is_verified=False))
@@ -1,12 +1,21 @@
+import asyncio
 import json
 from pathlib import Path
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, MagicMock, call
 
 import pytest
 import pytest_asyncio
+from aiokafka import TopicPartition
 
 from app.core.config import get_settings
-from app.external.kafka import KafkaConsumer
+from app.core.models import Message
+from app.external.kafka import (
+    ConsumedMessage,
+    KafkaConsumer,
+    OffsetTracker,
+    RebalanceListener,
+)
+from app.metrics import pipeline as metrics
 
 
 @pytest_asyncio.fixture
@@ -15,6 +24,19 @@ async def consumer(service):
     return KafkaConsumer(service)
 
 
+class TestInit:
+    """Тестирует метод __init__."""
+
+    @pytest.mark.asyncio
+    async def test_init_with_client(self, service):
+        """Тестирует что переданный клиент используется вместо kafka."""
+        client = MagicMock()
+
+        consumer = KafkaConsumer(service, client)
+
+        assert consumer.consumer is client
+
+
 class TestDeserializer:
     """Тестирует метод deserializer."""
 
@@ -110,3 +132,272 @@ class TestStartStop:
 
         consumer_mock.consumer.start.assert_awaited_once()
         consumer_mock.consumer.stop.assert_awaited_once()
+
+
+topic = 'faces'
+partition = TopicPartition(topic, 0)
+
+
+def make_messages(*usernames: str) -> list[ConsumedMessage]:
+    """Создает сообщения для пользователей."""
+    return [
+        ConsumedMessage(
+            partition=partition,
+            offset=offset,
+            message=Message(
+                username=username, path=f'/var/{username}-{offset}.png',
+            ),
+        )
+        for offset, username in enumerate(usernames)
+    ]
+
+
+class TestSplitByUser:
+    """Тестирует метод _split_by_user."""
+
+    def test_split_by_user(self, consumer: KafkaConsumer):
+        """Тестирует что сообщения пользователя попадают в разные волны."""
+        messages = make_messages('george', 'peter', 'george', 'george')
+
+        waves = consumer._split_by_user(messages)
+
+        assert waves == [
+            [messages[0], messages[1]], [messages[2]], [messages[3]],
+        ]
+
+    def test_split_empty(self, consumer: KafkaConsumer):
+        """Тестирует что пустой пакет не содержит волн."""
+        assert not consumer._split_by_user([])
+
+
+class TestGetBatch:
+    """Тестирует метод _get_batch."""
+
+    linger_ms = 50
+
+    @pytest.mark.asyncio
+    async def test_get_batch_until_full(self, consumer: KafkaConsumer):
+        """Тестирует что сообщения дочитываются до размера пакета."""
+        consumer.consumer.getmany = AsyncMock(side_effect=[
+            {partition: ['first', 'second']}, {partition: ['third']},
+        ])
+
+        records = await consumer._get_batch(3, self.linger_ms)
+
+        assert records == ['first', 'second', 'third']
+        assert consumer.consumer.getmany.await_args.kwargs['max_records'] == 1
+
+    @pytest.mark.asyncio
+    async def test_get_batch_until_linger(self, consumer: KafkaConsumer):
+        """Тестирует что неполный пакет возвращается через linger_ms."""
+        async def getmany(timeout_ms, max_records):  # noqa: WPS430 fake
+            await asyncio.sleep(timeout_ms / 1000)
+            return {partition: ['first']} if max_records == 3 else {}
+
+        consumer.consumer.getmany = getmany
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+
+        records = await consumer._get_batch(3, self.linger_ms)
+
+        assert records == ['first']
+        assert loop.time() - started_at >= self.linger_ms / 1000 * 0.9
+
+
+class TestProcessBatch:
+    """Тестирует метод _process_batch."""
+
+    @pytest.fixture
+    def consumer_mock(self, consumer: KafkaConsumer):
+        """Мок сервиса и метода commit у клиента AIOKafkaConsumer."""
+        consumer.service = AsyncMock()
+        consumer.consumer.commit = AsyncMock()
+        consumer.consumer.assignment = MagicMock(return_value={partition})
+        return consumer
+
+    @pytest.mark.asyncio
+    async def test_process_batch(self, consumer_mock: KafkaConsumer):
+        """Тестирует что пакет делится на микропакеты по порядку."""
+        micro_batch_size = get_settings().kafka.micro_batch_size
+        usernames = [f'user{index}' for index in range(micro_batch_size + 1)]
+        messages = make_messages(*usernames, 'user0')
+
+        await consumer_mock._process_batch(messages, asyncio.Semaphore(1))
+
+        batches = [
+            call.args[0]
+            for call in consumer_mock.service.verify_many.await_args_list
+        ]
+        assert batches == [
+            [consumed.message for consumed in messages[:micro_batch_size]],
+            [consumed.message for consumed in messages[micro_batch_size:-1]],
+            [messages[-1].message],
+        ]
+        consumer_mock.consumer.commit.assert_awaited_with(
+            {partition: len(messages)},
+        )
+
+    @pytest.mark.asyncio
+    async def test_process_batch_failed(self, consumer_mock: KafkaConsumer):
+        """Тестирует что смещение не коммитится после ошибки."""
+        messages = make_messages('george', 'george')
+        consumer_mock.service.verify_many.side_effect = [None, OSError]
+        consumer_mock.consumer.seek = MagicMock()
+
+        await consumer_mock._process_batch(messages, asyncio.Semaphore(1))
+        await consumer_mock._seek_failed()
+
+        consumer_mock.consumer.commit.assert_awaited_once_with({partition: 1})
+        consumer_mock.consumer.seek.assert_called_once_with(partition, 1)
+
+
+class TestVerify:
+    """Тестирует метод _verify."""
+
+    @pytest.mark.asyncio
+    async def test_verify_unexpected_error(
+        self, consumer: KafkaConsumer, tmp_path,
+    ):
+        """Тестирует что любая ошибка изображения не блокирует партицию."""
+        img_path = tmp_path / 'george.png'
+        img_path.touch()
+        consumed = ConsumedMessage(
+            partition=partition,
+            offset=0,
+            message=Message(username='george', path=str(img_path)),
+        )
+        consumer.service.runner.run.side_effect = RuntimeError('model crash')
+        consumer.tracker.add(partition, 0)
+
+        await consumer._verify(consumed)
+
+        assert consumer.tracker.committable() == {partition: 1}
+        assert not consumer.tracker.pop_failed()
+        assert not img_path.exists()
+
+
+class TestRebalance:
+    """Тестирует отзыв партиций при перебалансировке."""
+
+    revoked = TopicPartition(topic, 1)
+
+    @pytest.fixture
+    def consumer_mock(self, consumer: KafkaConsumer):
+        """Мок клиента с двумя назначенными партициями."""
+        consumer.consumer.commit = AsyncMock()
+        consumer.consumer.seek = MagicMock()
+        consumer.consumer.assignment = MagicMock(
+            return_value={partition, self.revoked},
+        )
+        return consumer
+
+    def test_subscribe_with_listener(self, consumer: KafkaConsumer):
+        """Тестирует что consumer подписан со слушателем перебалансировки."""
+        subscription = consumer.consumer._subscription.subscription
+
+        assert subscription.topics == {get_settings().kafka.topics}
+        assert isinstance(
+            consumer.consumer._subscription.listener, RebalanceListener,
+        )
+
+    @pytest.mark.asyncio
+    async def test_revoke_with_messages_in_flight(
+        self, consumer_mock: KafkaConsumer,
+    ):
+        """Тестирует что отозванная партиция не коммитится и не читается."""
+        for offset in range(3):
+            consumer_mock.tracker.add(partition, offset)
+            consumer_mock.tracker.add(self.revoked, offset)
+        consumer_mock.tracker.complete(self.revoked, 0)
+
+        await RebalanceListener(consumer_mock).on_partitions_revoked(
+            {self.revoked},
+        )
+        consumer_mock.consumer.assignment.return_value = {partition}
+        consumer_mock.tracker.complete(self.revoked, 1)
+        consumer_mock.tracker.fail(self.revoked, 2)
+        consumer_mock.tracker.complete(partition, 0)
+        consumer_mock.tracker.fail(partition, 1)
+        await consumer_mock._commit()
+        await consumer_mock._seek_failed()
+
+        assert consumer_mock.consumer.commit.await_args_list == [
+            call({self.revoked: 1}), call({partition: 1}),
+        ]
+        consumer_mock.consumer.seek.assert_called_once_with(partition, 1)
+
+
+class TestObserveLag:
+    """Тестирует метод _observe_lag."""
+
+    @pytest.mark.asyncio
+    async def test_observe_lag(self, consumer: KafkaConsumer):
+        """Тестирует что отставание считается от последнего смещения."""
+        consumer.consumer.highwater = MagicMock(return_value=10)
+
+        consumer._observe_lag(make_messages('george', 'george'))
+
+        consumer.consumer.highwater.assert_called_once_with(partition)
+        assert metrics.kafka_lag.labels(
+            topic=partition.topic, partition=partition.partition,
+        )._value.get() == 8
+
+    @pytest.mark.asyncio
+    async def test_observe_unknown_lag(self, consumer: KafkaConsumer):
+        """Тестирует что неизвестный highwater пропускается."""
+        consumer.consumer.highwater = MagicMock(return_value=None)
+
+        consumer._observe_lag(make_messages('george'))
+
+        consumer.consumer.highwater.assert_called_once_with(partition)
+
+
+class TestOffsetTracker:
+    """Тестирует класс OffsetTracker."""
+
+    @pytest.fixture
+    def tracker(self):
+        """Трекер с сообщениями в обработке."""
+        tracker = OffsetTracker()
+        for offset in range(5):
+            tracker.add(partition, offset)
+        return tracker
+
+    def test_out_of_order_completion(self, tracker: OffsetTracker):
+        """Тестирует что коммитится только непрерывный префикс."""
+        tracker.complete(partition, 0)
+        tracker.complete(partition, 2)
+
+        assert tracker.committable() == {partition: 1}
+
+        tracker.complete(partition, 1)
+
+        assert tracker.committable() == {partition: 3}
+
+    def test_committed_offsets_are_skipped(self, tracker: OffsetTracker):
+        """Тестирует что закоммиченное смещение не коммитится повторно."""
+        tracker.complete(partition, 0)
+        tracker.commit(tracker.committable())
+
+        assert not tracker.committable()
+
+    def test_failed_offset_blocks_commit(self, tracker: OffsetTracker):
+        """Тестирует что ошибка останавливает смещение для коммита."""
+        tracker.complete(partition, 0)
+        tracker.fail(partition, 1)
+        for offset in range(2, 5):
+            tracker.complete(partition, offset)
+
+        assert tracker.committable() == {partition: 1}
+        assert tracker.pop_failed() == {partition: 1}
+        assert not tracker.pop_failed()
+
+    def test_revoke(self, tracker: OffsetTracker):
+        """Тестирует что состояние отозванной партиции удаляется."""
+        tracker.complete(partition, 0)
+        tracker.fail(partition, 1)
+
+        tracker.revoke({partition})
+
+        assert not tracker.committable()
+        assert not tracker.pop_failed()
@@ -0,0 +1,56 @@
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+
+from app.metrics import pipeline as metrics
+
+
+def get_value(name: str, **labels: str) -> float:
+    """Текущее значение метрики или 0, если его нет."""
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_count_error():
+    """Тестирует что ошибки считаются по этапу и типу."""
+    before = get_value(
+        'face_verification_errors_total', stage='test', error='ValueError',
+    )
+
+    metrics.count_error('test', ValueError('no face'))
+    metrics.count_error('test', 'ValueError')
+
+    assert get_value(
+        'face_verification_errors_total', stage='test', error='ValueError',
+    ) == before + 2
+
+
+def test_stopwatch_observes_stages():
+    """Тестирует что длительности этапов суммируются и сохраняются."""
+    stopwatch = metrics.Stopwatch()
+    for stage in ('test_detect', 'test_embed', 'test_detect'):
+        stopwatch.lap(stage)
+
+    metrics.observe_stages(stopwatch.durations)
+
+    assert list(stopwatch.durations) == ['test_detect', 'test_embed']
+    assert get_value(
+        'face_verification_stage_seconds_count', stage='test_detect',
+    ) == 1
+
+
+def test_instrument_pool():
+    """Тестирует что выдача соединений пула считается."""
+    engine = create_engine('sqlite://')
+    metrics.instrument_pool(engine)
+    checkouts = get_value('face_verification_db_pool_checkouts_total')
+    checked_out = get_value('face_verification_db_pool_checked_out')
+
+    with engine.connect() as connection:
+        connection.execute(text('select 1'))
+        assert get_value(
+            'face_verification_db_pool_checked_out',
+        ) == checked_out + 1
+
+    assert get_value(
+        'face_verification_db_pool_checkouts_total',
+    ) == checkouts + 1
+    assert get_value('face_verification_db_pool_checked_out') == checked_out
@@ -0,0 +1 @@
+"""Пакет тестов модулей выполнения программы."""
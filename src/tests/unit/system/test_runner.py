@@ -0,0 +1,254 @@
+import asyncio
+import os
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import AsyncMock
+
+import pytest
+import pytest_asyncio
+
+from app.core.config import RunnerSettings
+from app.core.errors import ModelNotEnabledError
+from app.system.runner import (
+    AsyncMultiProcessRunner,
+    AsyncThreadRunner,
+    ModelRunners,
+)
+
+
+def get_pid() -> int:
+    """Возвращает идентификатор процесса."""
+    return os.getpid()
+
+
+def get_model_pid(model_name: str) -> int:
+    """Возвращает идентификатор процесса раннера модели."""
+    return os.getpid()
+
+
+def crash() -> None:
+    """Аварийно завершает процесс."""
+    os._exit(1)  # noqa: WPS437 emulates worker crash
+
+
+worker_env_key = 'RUNNER_TEST_WORKER'
+
+
+def init_worker(value: str) -> None:
+    """Инициализирует процесс пула."""
+    os.environ[worker_env_key] = value
+
+
+def get_worker_value() -> str | None:
+    """Возвращает значение установленное при инициализации процесса."""
+    return os.environ.get(worker_env_key)
+
+
+@pytest_asyncio.fixture
+async def runner():
+    """Раннер с одним процессом в пуле."""
+    runner = AsyncMultiProcessRunner(
+        RunnerSettings(max_workers=1, max_tasks_per_child=None),
+    )
+    await runner.start()
+    yield runner
+    await runner.stop()
+
+
+class TestStart:
+    """Тестирует метод start."""
+
+    worker_value = 'preloaded'
+
+    @pytest.mark.asyncio
+    async def test_start_initializes_workers(self):
+        """Тестирует что процессы инициализированы после запуска."""
+        runner = AsyncMultiProcessRunner(
+            RunnerSettings(max_workers=2, max_tasks_per_child=None),
+            initializer=init_worker,
+            initargs=(self.worker_value,),
+        )
+        assert runner.is_ready is False
+
+        await runner.start()
+        try:
+            worker_value = await runner.run(get_worker_value)
+        finally:
+            await runner.stop()
+
+        assert worker_value == self.worker_value
+        assert runner.is_ready is False
+
+    @pytest.mark.asyncio
+    async def test_start_waits_for_every_worker(self):
+        """Тестирует что запуск дожидается всех процессов пула."""
+        runner = AsyncMultiProcessRunner(
+            RunnerSettings(max_workers=3, max_tasks_per_child=None),
+            initializer=init_worker,
+            initargs=(self.worker_value,),
+        )
+
+        await runner.start()
+        try:
+            executor = runner._executor
+            processes = len(executor._processes)  # noqa: WPS437 pool state
+            start_method = executor._mp_context.get_start_method()  # noqa: WPS437, E501 pool state
+            worker_values = await asyncio.gather(*[
+                runner.run(get_worker_value) for _ in range(6)
+            ])
+        finally:
+            await runner.stop()
+
+        assert processes == 3
+        assert start_method == 'spawn'
+        assert set(worker_values) == {self.worker_value}
+
+    @pytest.mark.asyncio
+    async def test_start_with_task_budget(self):
+        """Тестирует что прогрев не оставляет пул без процессов."""
+        runner = AsyncMultiProcessRunner(
+            RunnerSettings(max_workers=2, max_tasks_per_child=2),
+            initializer=init_worker,
+            initargs=(self.worker_value,),
+        )
+
+        await runner.start()
+        try:
+            executor = runner._executor
+            alive = [
+                process.is_alive()
+                for process in executor._processes.values()  # noqa: WPS437
+            ]
+            worker_value = await runner.run(get_worker_value)
+        finally:
+            await runner.stop()
+
+        assert alive == [True, True]
+        assert worker_value == self.worker_value
+
+
+class TestRun:
+    """Тестирует метод run."""
+
+    @pytest.mark.asyncio
+    async def test_run_reuses_pool(self, runner: AsyncMultiProcessRunner):
+        """Тестирует что функции выполняются в одном процессе пула."""
+        first_pid = await runner.run(get_pid)
+        second_pid = await runner.run(get_pid)
+
+        assert first_pid == second_pid
+        assert first_pid != os.getpid()
+
+    @pytest.mark.asyncio
+    async def test_run_recovers_after_crash(
+        self, runner: AsyncMultiProcessRunner,
+    ):
+        """Тестирует что пул пересоздается после падения процесса."""
+        with pytest.raises(BrokenProcessPool):
+            await runner.run(crash)
+
+        pid = await runner.run(get_pid)
+
+        assert pid != os.getpid()
+
+    @pytest.mark.asyncio
+    async def test_stop(self, runner: AsyncMultiProcessRunner):
+        """Тестирует что пул останавливается."""
+        await runner.run(get_pid)
+        await runner.stop()
+
+        assert runner._executor is None
+        assert runner.is_ready is False
+
+
+def get_thread_name() -> str:
+    """Возвращает название текущего потока."""
+    return threading.current_thread().name
+
+
+class TestAsyncThreadRunner:
+    """Тестирует раннер пула потоков."""
+
+    @pytest.mark.asyncio
+    async def test_start_runs_initializer_once(self):
+        """Тестирует что initializer выполняется один раз при запуске."""
+        initialized: list[str] = []
+        runner = AsyncThreadRunner(
+            RunnerSettings(max_workers=2),
+            initializer=initialized.append,
+            initargs=('Facenet',),
+            name='Facenet',
+        )
+
+        await runner.start()
+        try:
+            assert runner.is_ready is True
+            await asyncio.gather(*[runner.run(get_pid) for _ in range(4)])
+        finally:
+            await runner.stop()
+
+        assert initialized == ['Facenet']
+        assert runner.is_ready is False
+        assert runner._executor is None
+
+    @pytest.mark.asyncio
+    async def test_run_in_service_process(self):
+        """Тестирует что функция выполняется в потоке процесса сервиса."""
+        runner = AsyncThreadRunner(RunnerSettings(max_workers=1))
+        await runner.start()
+        try:
+            pid = await runner.run(get_pid)
+            thread_name = await runner.run(get_thread_name)
+        finally:
+            await runner.stop()
+
+        assert pid == os.getpid()
+        assert thread_name.startswith('runner-default')
+
+
+class TestModelRunners:
+    """Тестирует раннеры моделей."""
+
+    @pytest.mark.asyncio
+    async def test_run_uses_model_runner(self):
+        """Тестирует что функция запускается в раннере своей модели."""
+        facenet, arcface = AsyncMock(), AsyncMock()
+        runners = ModelRunners({'Facenet': facenet, 'ArcFace': arcface})
+
+        await runners.run(get_pid, model_name='ArcFace')
+
+        arcface.run.assert_awaited_once_with(get_pid, model_name='ArcFace')
+        facenet.run.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_run_disabled_model(self):
+        """Тестирует что модель без раннера не считается ошибкой данных."""
+        runners = ModelRunners({'Facenet': AsyncMock()})
+
+        with pytest.raises(ModelNotEnabledError):
+            await runners.run(get_pid, model_name='ArcFace')
+
+    @pytest.mark.asyncio
+    async def test_start_stop(self):
+        """Тестирует что раннеры всех моделей запускаются и готовы."""
+        runners = ModelRunners({
+            'Facenet': AsyncMultiProcessRunner(
+                RunnerSettings(max_workers=1), name='Facenet',
+            ),
+            'ArcFace': AsyncMultiProcessRunner(
+                RunnerSettings(max_workers=1), name='ArcFace',
+            ),
+        })
+
+        await runners.start()
+        try:
+            assert runners.is_ready is True
+            pids = {
+                await runners.run(get_model_pid, model_name=model_name)
+                for model_name in ('Facenet', 'ArcFace')
+            }
+        finally:
+            await runners.stop()
+
+        assert len(pids) == 2
+        assert runners.is_ready is False
@@ -0,0 +1,162 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import pytest
+
+from app.core.config import RunnerSettings
+from app.system import shared_memory
+from app.system.runner import AsyncMultiProcessRunner
+from app.system.shared_memory import SharedArray, SlotRing, share_array
+
+
+class Batch(NamedTuple):
+    """Результат функции с матрицей."""
+
+    size: int
+    matrix: np.ndarray | SharedArray
+
+
+def make_batch(rows: int) -> Batch:
+    """Возвращает матрицу через слот разделяемой памяти."""
+    matrix = np.arange(rows * 4, dtype=np.float32).reshape(rows, 4)
+    return Batch(rows, share_array(matrix))
+
+
+def make_batch_slowly(rows: int, started: str) -> Batch:
+    """Отмечает начало вызова и возвращает матрицу с задержкой."""
+    Path(started).touch()
+    time.sleep(0.5)
+    return make_batch(rows)
+
+
+def is_shared(rows: int) -> bool:
+    """Проверяет что матрица записана в слот."""
+    return isinstance(make_batch(rows).matrix, SharedArray)
+
+
+@pytest.fixture
+def ring():
+    """Кольцо из двух слотов по 64 байта."""
+    ring = SlotRing(slots=2, slot_size=64)
+    yield ring
+    ring.close()
+
+
+class TestSlotRing:
+    """Тестирует класс SlotRing."""
+
+    def test_write_read(self, ring: SlotRing):
+        """Тестирует что массив читается из слота копией."""
+        array = np.arange(8, dtype=np.float32).reshape(2, 4)
+
+        shared = ring.write(1, array)
+        copy = ring.read(shared)
+        ring.write(1, np.zeros_like(array))
+
+        assert shared == SharedArray(1, (2, 4), '<f4')
+        np.testing.assert_array_equal(copy, array)
+
+    def test_write_too_large(self, ring: SlotRing):
+        """Тестирует что массив больше слота не записывается."""
+        assert ring.write(0, np.zeros(17, dtype=np.float32)) is None
+
+    def test_acquire_release(self, ring: SlotRing):
+        """Тестирует что слоты выдаются пока есть свободные."""
+        slots = [ring.acquire(), ring.acquire(), ring.acquire()]
+        ring.release(slots[0])
+
+        assert slots == [0, 1, None]
+        assert ring.acquire() == 0
+
+    def test_load(self, ring: SlotRing):
+        """Тестирует что поля NamedTuple из слотов заменяются массивами."""
+        array = np.ones((2, 2))
+        batch = Batch(2, ring.write(0, array))
+
+        loaded = ring.load(batch)
+
+        assert loaded.size == 2
+        np.testing.assert_array_equal(loaded.matrix, array)
+        assert ring.load([1]) == [1]
+
+
+def test_share_array_without_ring():
+    """Тестирует что вне процесса раннера массив не изменяется."""
+    array = np.ones(3)
+
+    assert share_array(array) is array
+
+
+def test_share_array_in_slot(ring: SlotRing, monkeypatch):
+    """Тестирует что в слот записывается только один массив вызова."""
+    monkeypatch.setattr(shared_memory._worker, 'ring', ring)
+
+    first, second = shared_memory.call_with_slot(
+        lambda: (share_array(np.ones(2)), share_array(np.ones(2))), slot=1,
+    )
+
+    assert first == SharedArray(1, (2,), '<f8')
+    assert isinstance(second, np.ndarray)
+    assert shared_memory._worker.slot is None
+
+
+class TestRunner:
+    """Тестирует передачу результатов раннера через разделяемую память."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('rows, expected_shared', (
+        pytest.param(2, True, id='fits slot'),
+        pytest.param(64, False, id='larger than slot'),
+    ))
+    async def test_run_returns_shared_array(self, rows, expected_shared):
+        """Тестирует что матрица результата возвращается из слота."""
+        runner = AsyncMultiProcessRunner(RunnerSettings(
+            max_workers=1,
+            shared_memory_slots=2,
+            shared_memory_slot_size=64,
+        ))
+        await runner.start()
+        try:
+            batch = await runner.run(make_batch, rows=rows)
+            shared = await runner.run(is_shared, rows=rows)
+            free_slots = [runner._ring.acquire() for _ in range(3)]
+        finally:
+            await runner.stop()
+
+        np.testing.assert_array_equal(
+            batch.matrix, np.arange(rows * 4).reshape(rows, 4),
+        )
+        assert shared is expected_shared
+        assert free_slots == [0, 1, None]
+        assert runner._ring is None
+
+    @pytest.mark.asyncio
+    async def test_cancelled_run_keeps_slot(self, tmp_path):
+        """Тестирует что слот отмененного вызова занят до его завершения."""
+        started = tmp_path / 'started'
+        runner = AsyncMultiProcessRunner(RunnerSettings(
+            max_workers=1,
+            shared_memory_slots=1,
+            shared_memory_slot_size=64,
+        ))
+        await runner.start()
+        try:
+            task = asyncio.create_task(runner.run(
+                make_batch_slowly, rows=2, started=str(started),
+            ))
+            while not started.exists():
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            busy_slot = runner._ring.acquire()
+            await asyncio.sleep(1)
+            free_slot = runner._ring.acquire()
+        finally:
+            await runner.stop()
+
+        assert busy_slot is None
+        assert free_slot == 0